@@ -0,0 +1,73 @@
+# ai_client/backends.py
+import typing
+from config import settings
+
+
+@typing.runtime_checkable
+class ModelBackend(typing.Protocol):
+    """
+    What the rest of the assistant needs from a model. GeminiClient, FakeBackend, HttpBackend
+    and the wrappers around them (ResilientClient, CachedClient) all provide it.
+
+    Failures are raised as ai_client.errors.ModelError subclasses. `overrides` replace generation
+    settings for one call; `deadline` (an ai_client.errors.Deadline) bounds it.
+    """
+    model_name: str
+
+    def config_fingerprint(self, overrides: typing.Mapping | None = None) -> dict:
+        """The generation settings that influence the response (used for cache keys)."""
+        ...
+
+    def generate_response(self, prompt: str, schema: typing.Type, overrides: typing.Mapping | None = None,
+                          deadline=None) -> str:
+        ...
+
+    def generate_response_stream(self, prompt: str, schema: typing.Type, overrides: typing.Mapping | None = None,
+                                 deadline=None) -> typing.Iterator[str]:
+        ...
+
+    async def agenerate_response(self, prompt: str, schema: typing.Type, overrides: typing.Mapping | None = None,
+                                 deadline=None) -> str:
+        ...
+
+
+class AsyncFromSync:
+    """Mixin for backends without a native async call: runs `generate_response` on a worker thread."""
+
+    async def agenerate_response(self, prompt: str, schema: typing.Type, overrides: typing.Mapping | None = None,
+                                 deadline=None) -> str:
+        import asyncio  # only async callers pay for importing it
+        return await asyncio.to_thread(self.generate_response, prompt, schema, overrides=overrides, deadline=deadline)
+
+
+def create_backend(name: str | None = None) -> ModelBackend:
+    """
+    Builds the backend named by `name` (default: settings.MODEL_BACKEND):
+
+    - "gemini": the Google Gemini API (needs GOOGLE_API_KEY),
+    - "replay": recorded responses from MODEL_REPLAY_FILE, served in-process,
+    - "http": a model server at MODEL_HTTP_URL, e.g. the fake one from `python -m ai_client.http_backend`.
+
+    With MODEL_RECORD_RESPONSES, the responses of a "gemini" or "http" backend are recorded for replay.
+    Modules are imported here, on demand, so that e.g. google.generativeai is only loaded when used.
+    """
+    name = name or settings.MODEL_BACKEND
+    if name in ("gemini", "http") and settings.MODEL_RECORD_RESPONSES:
+        from ai_client.fake_backend import RecordingBackend, Recordings
+        return RecordingBackend(_create(name), Recordings(settings.MODEL_REPLAY_FILE))
+    return _create(name)
+
+
+def _create(name: str) -> ModelBackend:
+    if name == "gemini":
+        from ai_client.gemini_client import GeminiClient
+        return GeminiClient()
+    if name == "replay":
+        from ai_client.fake_backend import FakeBackend, Recordings
+        return FakeBackend(response=Recordings(settings.MODEL_REPLAY_FILE).lookup,
+                           latency=settings.FAKE_BACKEND_LATENCY,
+                           chars_per_second=settings.FAKE_BACKEND_CHARS_PER_SECOND)
+    if name == "http":
+        from ai_client.http_backend import HttpBackend
+        return HttpBackend(settings.MODEL_HTTP_URL)
+    raise ValueError(f"Unknown model backend: {name!r} (expected 'gemini', 'replay' or 'http').")
@@ -0,0 +1,194 @@
+# ai_client/context_compressor.py
+import ast
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from config import settings
+from core.retrieval_index import query_terms, tokenize
+
+_OUTLINE_RE = re.compile(r"^\s*(@|def |async def |class |import |from \S+ import |export |function |interface |type )")
+# Single-line string literals (no triple quotes); only long ones are shortened.
+_STRING_RE = re.compile(r"""(?<!["'])(["'])((?:\\.|(?!\1)[^\\\n])*)\1(?!["'])""")
+_OMITTED = "…[+{} chars]"
+
+
+def _digest(content: str) -> str:
+    return hashlib.blake2b(content.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def compact_line(line: str) -> str:
+    """Strips trailing whitespace and shortens long string literals and overlong lines."""
+    line = line.rstrip()
+    limit = settings.CONTEXT_LONG_LITERAL_CHARS
+    if len(line) > limit:
+        def shorten(match):
+            quote, body = match.group(1), match.group(2)
+            if len(body) <= limit:
+                return match.group(0)
+            return f"{quote}{body[:limit // 2]}{_OMITTED.format(len(body) - limit // 2)}{quote}"
+        line = _STRING_RE.sub(shorten, line)
+    max_line = settings.CONTEXT_LONG_LINE_CHARS
+    if len(line) > max_line:
+        line = line[:max_line] + _OMITTED.format(len(line) - max_line)
+    return line
+
+
+def _python_outline(content: str) -> set[int] | None:
+    """0-based numbers of the lines a Python skeleton keeps, or None if the file doesn't parse."""
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return None
+    keep: set[int] = set()
+
+    def span(first: int, last: int):
+        keep.update(range(first - 1, last))
+
+    def docstring(body):
+        if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+                and isinstance(body[0].value.value, str):
+            span(body[0].lineno, body[0].end_lineno)
+
+    def first_line(node) -> int:
+        return min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+
+    def visit(body):
+        for node in body:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                span(node.lineno, node.end_lineno)
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)) and node.end_lineno - node.lineno < 2:
+                span(node.lineno, node.end_lineno)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                # Decorators and the (possibly multi-line) signature, up to the first statement.
+                span(first_line(node), max(first_line(node.body[0]) - 1, node.lineno))
+                docstring(node.body)
+                if isinstance(node, ast.ClassDef):
+                    visit(node.body)
+
+    docstring(tree.body)
+    visit(tree.body)
+    return keep
+
+
+class ContextCompressor:
+    """
+    Smaller views of files for the prompt, for when a file doesn't fit whole:
+
+    - `compact`: the whole file, without trailing whitespace or runs of blank lines, and with
+      long string literals and overlong lines shortened.
+    - `skeleton`: only the imports, constants, class outlines, signatures and docstrings (parsed
+      with `ast` for Python, by pattern for other languages); every left-out region becomes one
+      "... (N lines)" line.
+    - `focus`: the skeleton plus the lines that mention the request's terms, with
+      CONTEXT_FOCUS_LINES lines around them; the unchanged regions between them are collapsed.
+
+    Outlines and skeletons are memoized by content hash (at most CONTEXT_CACHE_ENTRIES), so a file
+    is only parsed again once it changes, whichever request or path it comes from.
+    """
+
+    def __init__(self, max_entries: int | None = None):
+        self.max_entries = settings.CONTEXT_CACHE_ENTRIES if max_entries is None else max_entries
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _memo(self, key, compute):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._cache[key] = value
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return value
+
+    def _outline(self, path: str, content: str, digest: str) -> frozenset[int]:
+        def compute():
+            keep = _python_outline(content) if path.endswith((".py", ".pyi")) else None
+            if keep is None:
+                keep = {n for n, line in enumerate(content.splitlines()) if _OUTLINE_RE.match(line)}
+            return frozenset(keep)
+        return self._memo(("outline", path.endswith((".py", ".pyi")), digest), compute)
+
+    @staticmethod
+    def _render(lines: list[str], keep) -> str:
+        out, skipped = [], []
+        for number, line in enumerate(lines):
+            if number in keep:
+                if skipped:
+                    out.append(ContextCompressor._collapsed(skipped))
+                    skipped = []
+                out.append(compact_line(line))
+            else:
+                skipped.append(line)
+        if skipped:
+            out.append(ContextCompressor._collapsed(skipped))
+        return "\n".join(line for line in out if line is not None)
+
+    @staticmethod
+    def _collapsed(lines: list[str]) -> str | None:
+        code = [line for line in lines if line.strip()]
+        if not code:
+            return None
+        return f"{_indent(code[0])}... ({len(lines)} lines)"
+
+    def compact(self, content: str) -> str:
+        out, blank = [], False
+        for line in content.splitlines():
+            line = compact_line(line)
+            if not line and blank:
+                continue
+            blank = not line
+            out.append(line)
+        return "\n".join(out)
+
+    def skeleton(self, path: str, content: str) -> str:
+        """The outline of the file ("" if it has none)."""
+        digest = _digest(content)
+
+        def compute():
+            keep = self._outline(path, content, digest)
+            return self._render(content.splitlines(), keep) if keep else ""
+        return self._memo(("skeleton", path.endswith((".py", ".pyi")), digest), compute)
+
+    def focus(self, path: str, content: str, query: str, context: int | None = None) -> str | None:
+        """The outline plus the regions mentioning `query`'s terms (None if no line mentions them)."""
+        context = settings.CONTEXT_FOCUS_LINES if context is None else context
+        terms = set(query_terms(query))
+        if not terms:
+            return None
+        lines = content.splitlines()
+        matches: dict[str, list[int]] = {}
+        for number, line in enumerate(lines):
+            for term in terms.intersection(tokenize(line)):
+                matches.setdefault(term, []).append(number)
+        # A term on a large share of the lines ("self", "data") marks nothing in particular.
+        common = max(int(len(lines) * settings.CONTEXT_FOCUS_MAX_SHARE), 3)
+        interesting = {n for found in matches.values() if len(found) <= common for n in found}
+        if not interesting:
+            return None
+        keep = set(self._outline(path, content, _digest(content)))
+        for number in interesting:
+            keep.update(range(max(number - context, 0), min(number + context + 1, len(lines))))
+        return self._render(lines, keep)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+compressor = ContextCompressor()
@@ -0,0 +1,84 @@
+# ai_client/errors.py
+import time
+
+
+class ModelError(Exception):
+    """A failed model call. `retryable` tells the ResilientClient whether trying again can help."""
+    retryable = False
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        # Seconds the service asked us to wait before the next attempt, if it said.
+        self.retry_after = retry_after
+
+
+class RateLimitError(ModelError):
+    """HTTP 429 / RESOURCE_EXHAUSTED: over the requests or tokens quota."""
+    retryable = True
+
+
+class ServiceUnavailableError(ModelError):
+    """HTTP 500/503 and dropped connections: the service failed, not the request."""
+    retryable = True
+
+
+class DeadlineExceededError(ModelError):
+    """
+    A call timed out. It is retried while the request's own Deadline leaves time (a timeout of
+    the service's), and not once that Deadline has passed.
+    """
+    retryable = True
+
+
+class BlockedResponseError(ModelError):
+    """The model returned no text (blocked by safety settings, or stopped before producing any)."""
+    retryable = False
+
+
+class Deadline:
+    """
+    A point in time a whole request must finish by. It is created once per request and passed
+    down, so retries, rate-limit waits and the calls themselves all share the same budget.
+    """
+
+    def __init__(self, seconds: float | None):
+        self.expires = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self) -> float | None:
+        """Seconds left (never negative), or None for no deadline."""
+        return None if self.expires is None else max(0.0, self.expires - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def check(self, what: str = "request"):
+        if self.expired():
+            raise DeadlineExceededError(f"The {what} ran out of time.")
+
+
+# google.api_core exception class names and HTTP codes, so the module needn't be imported here.
+_RATE_LIMITED = {"ResourceExhausted", "TooManyRequests"}
+_UNAVAILABLE = {"ServiceUnavailable", "InternalServerError", "BadGateway", "Aborted",
+                "RetryError", "ConnectionError", "ConnectionResetError", "RemoteDisconnected"}
+_DEADLINE = {"DeadlineExceeded", "GatewayTimeout", "TimeoutError", "Timeout", "ReadTimeout"}
+
+
+def classify(error: Exception) -> ModelError:
+    """Turns an exception raised by a backend into the matching ModelError."""
+    if isinstance(error, ModelError):
+        return error
+    name = type(error).__name__
+    code = getattr(error, "code", None)
+    code = getattr(code, "value", code)  # grpc status codes are enums
+    message = f"{name}: {error}"
+    retry_after = getattr(error, "retry_after", None)
+    if name in _RATE_LIMITED or code == 429:
+        return RateLimitError(message, retry_after)
+    if name in _DEADLINE or code == 504:
+        return DeadlineExceededError(message)
+    if name in _UNAVAILABLE or code in (500, 502, 503):
+        return ServiceUnavailableError(message, retry_after)
+    if isinstance(error, ValueError):
+        # The SDK raises ValueError from `response.text` when the answer has no text parts.
+        return BlockedResponseError(message)
+    return ModelError(message)
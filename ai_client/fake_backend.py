@@ -0,0 +1,225 @@
+# ai_client/fake_backend.py
+import collections
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from ai_client.backends import AsyncFromSync
+from ai_client.errors import Deadline, DeadlineExceededError, RateLimitError, ServiceUnavailableError
+from ai_client.prompt_builder import estimate_tokens
+
+_DEFAULT_RESPONSE = json.dumps({"overall_explanation": "No changes needed.", "actions": []})
+
+
+class FakeBackend(AsyncFromSync):
+    """
+    A local stand-in for GeminiClient that behaves like a service under load: each call takes
+    `latency` (+ up to `jitter`) seconds, fails with a 503 at `error_rate`, and is rejected with a
+    429 once more than `quota_rpm` calls / `quota_tpm` prompt tokens arrived in the last
+    `quota_window` seconds (a minute; shorten it, with the quotas, to run load tests quickly).
+    `response` is the text returned (or a function of the prompt, such as `Recordings.lookup`);
+    streamed responses arrive at `chars_per_second` (0: all at once). Use it behind a
+    ResilientClient to see how retries, backoff and the rate limiter behave without network or quota.
+    """
+    model_name = "fake-backend"
+
+    def __init__(self, response: str | typing.Callable[[str], str] = _DEFAULT_RESPONSE, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, quota_rpm: int = 0, quota_tpm: int = 0,
+                 quota_window: float = 60.0, chunk_size: int = 64, chars_per_second: float = 0.0, seed: int | None = 0):
+        self.response = response
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota_rpm = quota_rpm
+        self.quota_tpm = quota_tpm
+        self.quota_window = quota_window
+        self.chunk_size = chunk_size
+        self.chars_per_second = chars_per_second
+        self.generation_config = MappingProxyType({"max_output_tokens": 4096, "temperature": 0.2})
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window: collections.deque = collections.deque()  # (arrival time, prompt tokens) within the quota window
+        self.stats = collections.Counter()  # calls, ok, rate_limited, unavailable, timed_out
+
+    def config_fingerprint(self, overrides: typing.Mapping | None = None) -> dict:
+        return {**self.generation_config, **(overrides or {}), "response_mime_type": "application/json"}
+
+    def _admit(self, prompt: str):
+        """Server side of the call: quota check and injected failures."""
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            self.stats["calls"] += 1
+            now = time.monotonic()
+            while self._window and now - self._window[0][0] >= self.quota_window:
+                self._window.popleft()
+            over_rpm = self.quota_rpm and len(self._window) >= self.quota_rpm
+            over_tpm = self.quota_tpm and sum(t for _, t in self._window) + tokens > self.quota_tpm
+            if over_rpm or over_tpm:
+                self.stats["rate_limited"] += 1
+                retry_after = self.quota_window - (now - self._window[0][0]) if self._window else 1.0
+                raise RateLimitError("429 Resource has been exhausted (fake quota).", retry_after=retry_after)
+            self._window.append((now, tokens))
+            fail = self._random.random() < self.error_rate
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        return fail, delay
+
+    def _wait(self, delay: float, deadline: Deadline | None):
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is not None and remaining < delay:
+            time.sleep(remaining)
+            with self._lock:
+                self.stats["timed_out"] += 1
+            raise DeadlineExceededError("504 Deadline exceeded (fake backend).")
+        time.sleep(delay)
+
+    def _text(self, prompt: str) -> str:
+        return self.response(prompt) if callable(self.response) else self.response
+
+    def generate_response(self, prompt: str, schema: typing.Type, overrides: typing.Mapping | None = None,
+                          deadline: Deadline | None = None) -> str:
+        fail, delay = self._admit(prompt)
+        self._wait(delay, deadline)
+        if fail:
+            with self._lock:
+                self.stats["unavailable"] += 1
+            raise ServiceUnavailableError("503 The service is currently unavailable (fake backend).")
+        with self._lock:
+            self.stats["ok"] += 1
+        return self._text(prompt)
+
+    def generate_response_stream(self, prompt: str, schema: typing.Type, overrides: typing.Mapping | None = None,
+                                 deadline: Deadline | None = None):
+        """Waits the latency before the first chunk, then yields the response `chunk_size` characters at a time."""
+        text = self.generate_response(prompt, schema, overrides=overrides, deadline=deadline)
+        pause = self.chunk_size / self.chars_per_second if self.chars_per_second else 0.0
+        for start in range(0, len(text), self.chunk_size):
+            if start and pause:
+                time.sleep(pause)
+            yield text[start:start + self.chunk_size]
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class Recordings:
+    """
+    Model responses recorded to a JSON-lines file ({"key": sha256 of the prompt, "response": text}),
+    for replaying a session without the model. `lookup` returns the response recorded for the same
+    prompt; prompts never seen (they change with the project and the history) get the recorded
+    responses in turn, so a recorded session replays in order.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._by_key: dict[str, str] = {}
+        self._order: list[str] = []
+        self._next = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._by_key[entry["key"]] = entry["response"]
+                    self._order.append(entry["response"])
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def lookup(self, prompt: str) -> str:
+        with self._lock:
+            text = self._by_key.get(prompt_key(prompt))
+            if text is not None:
+                return text
+            if not self._order:
+                return _DEFAULT_RESPONSE
+            text = self._order[self._next % len(self._order)]
+            self._next += 1
+            return text
+
+    def add(self, prompt: str, response: str):
+        entry = {"key": prompt_key(prompt), "response": response}
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._by_key[entry["key"]] = response
+            self._order.append(response)
+
+
+class RecordingBackend(AsyncFromSync):
+    """Passes calls to another backend and records every complete response into `recordings`."""
+
+    def __init__(self, backend, recordings: Recordings):
+        self.backend = backend
+        self.recordings = recordings
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def generate_response(self, prompt: str, schema: typing.Type, overrides: typing.Mapping | None = None,
+                          deadline: Deadline | None = None) -> str:
+        text = self.backend.generate_response(prompt, schema, overrides=overrides, deadline=deadline)
+        if text:
+            self.recordings.add(prompt, text)
+        return text
+
+    def generate_response_stream(self, prompt: str, schema: typing.Type, overrides: typing.Mapping | None = None,
+                                 deadline: Deadline | None = None):
+        pieces = []
+        for piece in self.backend.generate_response_stream(prompt, schema, overrides=overrides, deadline=deadline):
+            pieces.append(piece)
+            yield piece
+        if pieces:
+            self.recordings.add(prompt, "".join(pieces))
+
+
+def measure_throughput(client, prompts: list[str], concurrency: int = 4, schema: typing.Type = dict) -> dict:
+    """
+    Sends `prompts` through `client` with `concurrency` callers and reports what came back:
+    successes, failures by error type, wall time, requests/second and latency percentiles.
+    """
+    latencies = []
+    errors = collections.Counter()
+    lock = threading.Lock()
+
+    def one(prompt: str):
+        start = time.perf_counter()
+        try:
+            client.generate_response(prompt, schema)
+        except Exception as e:
+            with lock:
+                errors[type(e).__name__] += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, prompts))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+    return {
+        "requests": len(prompts),
+        "ok": len(latencies),
+        "errors": dict(errors),
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50": round(percentile(0.5), 3),
+        "p95": round(percentile(0.95), 3),
+        "p99": round(percentile(0.99), 3),
+    }
@@ -1,7 +1,9 @@
 # ai_client/gemini_client.py
 import google.generativeai as genai
+from ai_client.errors import Deadline, classify
 from config import settings
-from typing import Type  # Add this import for type hinting
+from types import MappingProxyType
+from typing import Iterator, Mapping, Type  # Add this import for type hinting
 
 
 class GeminiClient:
@@ -21,41 +23,91 @@ class GeminiClient:
             {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
         ]
 
-        # 2. Define Generation Configuration to control output
-        self.generation_config = genai.GenerationConfig(
+        # 2. Define Generation Configuration to control output. It is shared by every request (and
+        # every thread), so it is read-only: a request gets its own GenerationConfig built from it.
+        self.generation_config = MappingProxyType({
             # We are setting a hard limit on the output. The AI CANNOT exceed this.
             # This prevents the runaway "abomination" response. 4096 is a generous limit.
-            max_output_tokens=4096,
+            "max_output_tokens": 4096,
 
             # This is the most important setting for this bug.
             # Temperature controls randomness. 0.9 is creative. 0.2 is very direct and factual.
             # We are telling the AI: "Stop being creative and just give me the answer."
-            temperature=0.2
-        )
+            "temperature": 0.2,
+        })
 
+        self.model_name = settings.MODEL_NAME
         self.model = genai.GenerativeModel(
-            'gemini-2.5-flash',
+            self.model_name,
             safety_settings=safety_settings
             # We will pass the rest of the config during the generate call
         )
 
-    def generate_response(self, prompt: str, schema: Type) -> str:
+    def config_fingerprint(self, overrides: Mapping | None = None) -> dict:
+        """The generation settings that influence the response (used for cache keys)."""
+        return {**self.generation_config, **(overrides or {}), "response_mime_type": "application/json"}
+
+    def _request_config(self, schema: Type, overrides: Mapping | None = None) -> genai.GenerationConfig:
+        # A new config per request: concurrent requests must not see each other's schema or overrides.
+        return genai.GenerationConfig(**self.config_fingerprint(overrides), response_schema=schema)
+
+    @staticmethod
+    def _request_options(deadline: Deadline | None) -> dict:
+        remaining = deadline.remaining() if deadline is not None else None
+        return {} if remaining is None else {"timeout": max(remaining, 1.0)}
+
+    def generate_response_stream(self, prompt: str, schema: Type, overrides: Mapping | None = None,
+                                 deadline: Deadline | None = None) -> Iterator[str]:
         """
-        Sends a prompt to the Gemini API with strict configuration to ensure
-        a focused and well-formed response.
+        Same request as generate_response, but yields the text as the model produces it.
+        `overrides` replace generation settings for this call only. Failures are raised as ModelErrors.
         """
         try:
-            # Combine our base config with the specific schema for this request
-            request_config = self.generation_config
-            request_config.response_mime_type = "application/json"
-            request_config.response_schema = schema
+            response = self.model.generate_content(
+                prompt,
+                generation_config=self._request_config(schema, overrides),
+                stream=True,
+                request_options=self._request_options(deadline)
+            )
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # A chunk without text parts (e.g. only a finish reason).
+                    continue
+                if text:
+                    yield text
+        except Exception as e:
+            raise classify(e) from e
 
+    def generate_response(self, prompt: str, schema: Type, overrides: Mapping | None = None,
+                          deadline: Deadline | None = None) -> str:
+        """
+        Sends a prompt to the Gemini API with strict configuration to ensure
+        a focused and well-formed response. The call times out with the `deadline`.
+        Failures are raised as ModelErrors (see ai_client/errors.py); retrying them is the
+        ResilientClient's job.
+        """
+        try:
             response = self.model.generate_content(
                 prompt,
-                generation_config=request_config
+                generation_config=self._request_config(schema, overrides),
+                request_options=self._request_options(deadline)
+            )
+            # This raises (BlockedResponseError) if the model output is blocked by safety settings.
+            return response.text
+        except Exception as e:
+            raise classify(e) from e
+
+    async def agenerate_response(self, prompt: str, schema: Type, overrides: Mapping | None = None,
+                                 deadline: Deadline | None = None) -> str:
+        """generate_response for asyncio callers, on the SDK's native async call."""
+        try:
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=self._request_config(schema, overrides),
+                request_options=self._request_options(deadline)
             )
             return response.text
         except Exception as e:
-            print(f"An error occurred while calling the Gemini API: {e}")
-            # This will now also catch errors if the model output is blocked by safety settings.
-            return ""
\ No newline at end of file
+            raise classify(e) from e
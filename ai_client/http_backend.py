@@ -0,0 +1,245 @@
+# ai_client/http_backend.py
+import argparse
+import codecs
+import http.client
+import json
+import threading
+import typing
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import MappingProxyType
+from ai_client.backends import AsyncFromSync
+from ai_client.errors import (Deadline, DeadlineExceededError, ModelError, RateLimitError, ServiceUnavailableError,
+                              classify)
+
+# A small JSON protocol, so a model server can run in another process (or on another machine):
+#   POST /v1/generate  {"prompt", "overrides", "timeout"} -> {"text"}
+#   POST /v1/stream    same body -> the text as a chunked text/plain body
+# Errors are returned as {"error"} with 429 (and Retry-After), 503, 504 or 500.
+_STATUS = ((RateLimitError, 429), (DeadlineExceededError, 504), (ServiceUnavailableError, 503))
+
+
+class HttpBackend(AsyncFromSync):
+    """
+    A model backend on the other side of an HTTP connection (see the protocol above). Each
+    thread keeps its own persistent connection.
+    """
+
+    def __init__(self, url: str, timeout: float = 300.0):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.model_name = f"http:{self.host}:{self.port}"
+        self.generation_config = MappingProxyType({"max_output_tokens": 4096, "temperature": 0.2})
+        self._local = threading.local()
+
+    def config_fingerprint(self, overrides: typing.Mapping | None = None) -> dict:
+        return {**self.generation_config, **(overrides or {}), "response_mime_type": "application/json"}
+
+    def _connection(self, timeout: float) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def _post(self, path: str, prompt: str, overrides, deadline: Deadline | None) -> http.client.HTTPResponse:
+        remaining = deadline.remaining() if deadline is not None else None
+        timeout = self.timeout if remaining is None else max(remaining, 0.1)
+        body = json.dumps({"prompt": prompt, "overrides": dict(overrides or {}), "timeout": remaining}).encode("utf-8")
+        for attempt in range(2):
+            conn = self._connection(timeout)
+            try:
+                conn.request("POST", path, body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                # The server closed the kept-alive connection; one fresh attempt.
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise classify(e) from e
+            except OSError as e:
+                conn.close()
+                self._local.conn = None
+                raise classify(e) from e
+        if response.status != 200:
+            payload = response.read()
+            try:
+                message = json.loads(payload)["error"]
+            except (ValueError, KeyError):
+                message = payload.decode("utf-8", "replace")
+            retry_after = response.getheader("Retry-After")
+            retry_after = float(retry_after) if retry_after else None
+            error = {429: RateLimitError, 503: ServiceUnavailableError, 502: ServiceUnavailableError,
+                     504: DeadlineExceededError}.get(response.status, ModelError)
+            raise error(f"HTTP {response.status}: {message}", retry_after)
+        return response
+
+    def generate_response(self, prompt: str, schema: typing.Type, overrides: typing.Mapping | None = None,
+                          deadline: Deadline | None = None) -> str:
+        response = self._post("/v1/generate", prompt, overrides, deadline)
+        try:
+            return json.loads(response.read())["text"]
+        except (OSError, http.client.HTTPException) as e:
+            self._local.conn = None
+            raise classify(e) from e
+
+    def generate_response_stream(self, prompt: str, schema: typing.Type, overrides: typing.Mapping | None = None,
+                                 deadline: Deadline | None = None) -> typing.Iterator[str]:
+        response = self._post("/v1/stream", prompt, overrides, deadline)
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        try:
+            while True:
+                data = response.read1(16384)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    yield text
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+        except (OSError, http.client.HTTPException) as e:
+            self._local.conn = None
+            raise classify(e) from e
+        finally:
+            if not response.isclosed():
+                # Stopped early: the rest of the body is unread, so the connection can't be reused.
+                response.close()
+                self._local.conn = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, and chunked bodies for streaming
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # the client gave up (e.g. its deadline passed)
+
+    def _send_error(self, error: Exception):
+        error = classify(error)
+        status = next((code for cls, code in _STATUS if isinstance(error, cls)), 500)
+        headers = {"Retry-After": f"{error.retry_after:.3f}"} if error.retry_after else None
+        self._send_json(status, {"error": str(error)}, headers)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def do_POST(self):
+        from schemas.ai_schemas import GeminiResponse
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            prompt = body["prompt"]
+        except (ValueError, KeyError):
+            self._send_json(400, {"error": "Expected a JSON body with a 'prompt'."})
+            return
+        overrides = body.get("overrides") or None
+        deadline = Deadline(body.get("timeout"))
+        backend = self.server.backend
+        if self.path == "/v1/generate":
+            try:
+                text = backend.generate_response(prompt, GeminiResponse, overrides=overrides, deadline=deadline)
+            except Exception as e:
+                self._send_error(e)
+                return
+            self._send_json(200, {"text": text})
+        elif self.path == "/v1/stream":
+            chunks = iter(backend.generate_response_stream(prompt, GeminiResponse, overrides=overrides, deadline=deadline))
+            try:
+                first = next(chunks, "")
+            except Exception as e:
+                self._send_error(e)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                if first:
+                    self._write_chunk(first.encode("utf-8"))
+                for chunk in chunks:
+                    if chunk:
+                        self._write_chunk(chunk.encode("utf-8"))
+                self.wfile.write(b"0\r\n\r\n")
+            except Exception:
+                # Too late for a status code: dropping the connection tells the client the stream broke.
+                self.close_connection = True
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+
+class FakeModelServer:
+    """
+    Serves any backend (typically a FakeBackend replaying Recordings) over HTTP on localhost, on
+    a background thread, so the whole pipeline can be run and benchmarked against a real socket.
+    """
+
+    def __init__(self, backend, host: str = "127.0.0.1", port: int = 0):
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.backend = backend
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeModelServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-model-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    from ai_client.fake_backend import FakeBackend, Recordings
+    parser = argparse.ArgumentParser(description="Serve recorded model responses over HTTP (MODEL_BACKEND = 'http').")
+    parser.add_argument("--recordings", required=True, help="JSON-lines file of recorded responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first chunk")
+    parser.add_argument("--chars-per-second", type=float, default=0.0, help="streaming speed (0: unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls failing with 503")
+    parser.add_argument("--quota-rpm", type=int, default=0, help="requests per minute before 429s (0: unlimited)")
+    args = parser.parse_args()
+    backend = FakeBackend(response=Recordings(args.recordings).lookup, latency=args.latency,
+                          chars_per_second=args.chars_per_second, error_rate=args.error_rate,
+                          quota_rpm=args.quota_rpm, seed=None)
+    server = FakeModelServer(backend, args.host, args.port)
+    print(f"Serving {args.recordings} at {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
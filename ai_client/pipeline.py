@@ -0,0 +1,199 @@
+# ai_client/pipeline.py
+import re
+import time
+import typing
+from types import MappingProxyType
+from ai_client.planner import run_planned
+from ai_client.prompt_builder import build_prompt_with_report, format_report, history_budget
+from ai_client.response_cache import CachedClient
+from ai_client.response_parser import parse_gemini_response, IncrementalResponseParser
+from config import settings
+from core.file_cache import Excerpt
+from core.tracing import tracer
+from schemas.ai_schemas import GeminiResponse
+
+
+def _ignore(*args):
+    pass
+
+
+def _label(path: str, content: str) -> str:
+    """The path a file is shown under; the head and tail of a huge file are labelled as an excerpt."""
+    return f"{path} (excerpt: head and tail)" if isinstance(content, Excerpt) else path
+
+
+class RequestPipeline:
+    """
+    The steps of one request, without any GUI: read the tree and the history, find the relevant
+    files, build the prompt, call the model (streaming when enabled) and parse its response.
+    The GUI's AiWorker and the command line (cli.py) both run requests through it.
+
+    `progress(message)` and `on_action(action)` report what happens (the latter for every action
+    as soon as it has been streamed); `check()` is called between steps and may raise to stop the
+    request (RequestCancelled, DeadlineExceededError). `chat_manager` may be None for requests
+    without a conversation. With `plan`, the model first plans the change per file and every file
+    is then requested on its own, concurrently (see ai_client.planner).
+    """
+
+    def __init__(self, ai_client, project_manager, chat_manager=None, bypass_cache: bool = False,
+                 pinned_files: list[str] | None = None, overrides: typing.Mapping | None = None, deadline=None,
+                 check: typing.Callable[[], None] | None = None,
+                 progress: typing.Callable[[str], None] | None = None,
+                 on_action: typing.Callable[[dict], None] | None = None, plan: bool = False):
+        self.ai_client = ai_client
+        self.project_manager = project_manager
+        self.chat_manager = chat_manager
+        self.bypass_cache = bypass_cache
+        self.pinned_files = list(pinned_files or [])
+        self.overrides = MappingProxyType(dict(overrides or {}))
+        self.deadline = deadline
+        self.check = check or _ignore
+        self.progress = progress or _ignore
+        self.on_action = on_action or _ignore
+        self.plan = plan
+        self.prompt_report: dict | None = None
+
+    def _generate(self, prompt: str) -> str:
+        if isinstance(self.ai_client, CachedClient):
+            return self.ai_client.generate_response(prompt, schema=GeminiResponse, bypass_cache=self.bypass_cache,
+                                                    overrides=self.overrides, deadline=self.deadline)
+        return self.ai_client.generate_response(prompt, schema=GeminiResponse, overrides=self.overrides,
+                                                deadline=self.deadline)
+
+    def _generate_streaming(self, prompt: str):
+        """Streams the response, reporting every completed action to `on_action`. Returns the parsed response."""
+        if isinstance(self.ai_client, CachedClient):
+            chunks = self.ai_client.generate_response_stream(prompt, schema=GeminiResponse, bypass_cache=self.bypass_cache,
+                                                             overrides=self.overrides, deadline=self.deadline)
+        else:
+            chunks = self.ai_client.generate_response_stream(prompt, schema=GeminiResponse, overrides=self.overrides,
+                                                             deadline=self.deadline)
+
+        parser = IncrementalResponseParser()
+        received = False
+        with tracer.span("model", streaming=True) as span:
+            start = time.perf_counter()
+            size = 0
+            try:
+                for chunk in chunks:
+                    self.check()
+                    if not received:
+                        received = True
+                        span.set(first_chunk_seconds=round(time.perf_counter() - start, 6))
+                        self.progress("Receiving response...")
+                    size += len(chunk)
+                    for action in parser.feed(chunk):
+                        self.on_action(action)
+            finally:
+                span.set(chars=size, actions=len(parser.actions))
+                # Stops the underlying HTTP stream when the request is cancelled half-way.
+                if hasattr(chunks, "close"):
+                    chunks.close()
+        if not received:
+            raise ValueError("Received an empty response from the API.")
+        parsed_response = parser.close()
+        if parser.truncated:
+            self.progress(f"The response was cut off; keeping its {len(parser.actions)} complete action(s).")
+        return parsed_response
+
+    def find_relevant_files(self, query: str) -> dict[str, str]:
+        """
+        Finds the files the request is about: pinned files and paths named in the query come
+        first, then the Python symbols it mentions (with their callers), then the best BM25
+        matches from the project's retrieval index fill up to RETRIEVAL_TOP_K. Finally the
+        import-graph neighbours of all of those are added, up to DEPENDENCY_CONTEXT_BYTES.
+        """
+        top_k = settings.RETRIEVAL_TOP_K
+        relevant_files = {}
+        candidates = self.pinned_files + re.findall(r'[\w./\\-]+\.\w+', query)
+        for candidate, content in self.project_manager.read_files(candidates).items():
+            if content is not None:
+                relevant_files[_label(candidate, content)] = content
+
+        symbol_context = self.project_manager.symbol_index.context_for_query(query, self.project_manager.read_file)
+        covered = {label.split(" (excerpt:", 1)[0] for label in relevant_files}
+        for label, snippet in symbol_context.items():
+            path = label.split(" (excerpt:", 1)[0]
+            if label == path and path in covered:
+                continue
+            relevant_files[label] = snippet
+            covered.add(path)
+
+        index = self.project_manager.retrieval_index
+        if index.ensure_fresh():
+            self.progress("Updated the project search index.")
+        building = self.project_manager.indexing_progress()
+        if building is not None:
+            self.progress(f"The project search index is still being built ({building[0]}/{building[1]} files); "
+                          "the search may miss files.")
+        matches = [path for path, _score in index.search_files(query, top_k=top_k) if path not in covered]
+        for path, content in self.project_manager.read_files(matches).items():
+            if len(relevant_files) >= top_k:
+                break
+            if content is not None:
+                relevant_files[_label(path, content)] = content
+                covered.add(path)
+
+        # The modules these files import, and the ones importing them, within a byte budget.
+        graph = self.project_manager.dependency_graph
+        graph.update()
+        for path, content in self.project_manager.read_files(graph.neighbours_within_budget(covered)).items():
+            if content is not None:
+                relevant_files[_label(path, content)] = content
+        return relevant_files
+
+    def run(self, user_query: str) -> dict:
+        """Runs every step for `user_query` and returns the parsed response (a GeminiResponse)."""
+        self.progress("Analyzing request...")
+        with tracer.span("tree") as span:
+            structure_str = self.project_manager.get_structure_string()
+            span.set(chars=len(structure_str))
+        with tracer.span("history") as span:
+            if self.chat_manager is not None:
+                history_str = self.chat_manager.get_formatted_history(token_budget=history_budget(user_query))
+            else:
+                history_str = ""
+            span.set(chars=len(history_str))
+
+        # --- The "Ground Truth" Step ---
+        # Find and read any files mentioned in the query.
+        with tracer.span("context") as span:
+            relevant_files = self.find_relevant_files(user_query)
+            span.set(files=len(relevant_files), chars=sum(len(c) for c in relevant_files.values()))
+        self.check()
+        if relevant_files:
+            self.progress(f"Reading relevant files: {', '.join(relevant_files.keys())}")
+
+        if self.plan:
+            parsed_response = run_planned(self, structure_str, user_query, history_str, relevant_files)
+            for action in parsed_response["actions"]:
+                self.on_action(action)
+            self.check()
+            return parsed_response
+
+        self.progress("Building prompt for AI...")
+        with tracer.span("prompt") as span:
+            prompt, self.prompt_report = build_prompt_with_report(structure_str, user_query, history_str, relevant_files)
+            span.set(chars=len(prompt), tokens=self.prompt_report['total']['used'])
+        self.progress(f"Prompt: {format_report(self.prompt_report)}")
+        self.check()
+
+        self.progress("Sending request to Gemini (this may take a moment)...")
+        if settings.STREAMING_ENABLED and hasattr(self.ai_client, "generate_response_stream"):
+            parsed_response = self._generate_streaming(prompt)
+        else:
+            with tracer.span("model", streaming=False) as span:
+                ai_response_str = self._generate(prompt)
+                span.set(chars=len(ai_response_str or ""))
+            if not ai_response_str:
+                raise ValueError("Received an empty response from the API.")
+
+            self.progress("Parsing AI response...")
+            with tracer.span("parse") as span:
+                parsed_response = parse_gemini_response(ai_response_str)
+                span.set(actions=len(parsed_response['actions']) if parsed_response else 0)
+        if not parsed_response:
+            raise ValueError("Failed to parse a valid JSON object from the AI's response.")
+
+        self.check()
+        return parsed_response
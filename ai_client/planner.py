@@ -0,0 +1,262 @@
+# ai_client/planner.py
+import json
+import time
+import typing
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from ai_client.context_compressor import compressor
+from ai_client.prompt_builder import build_prompt_with_report, estimate_tokens, truncate_middle
+from ai_client.response_cache import CachedClient
+from ai_client.response_parser import parse_gemini_response
+from config import settings
+from core.file_cache import Excerpt
+from core.patching import PatchConflict, apply_patch
+from core.tracing import tracer
+from schemas.ai_schemas import CodeAction, FilePlan, GeminiResponse, Plan
+
+# Planner mode: one cheap call plans the change file by file, then every file is its own request,
+# sent concurrently, so no single response has to hold the whole change and the wall-clock time
+# follows the largest file rather than the sum of them.
+
+_PLAN_INSTRUCTIONS = """
+You are CodeGenius, an expert AI programming assistant. The user's request will be carried out one file at a time, by separate requests. Your task now is only to plan it: return a JSON object listing every file to create, change or delete, with precise instructions for each.
+
+--- PLANNING INSTRUCTIONS ---
+1.  Your response MUST be a single, valid JSON object. The API enforces the schema.
+2.  List each file once, with its path relative to the project root as shown in the project tree.
+3.  The editor of a file sees only the request, this plan and that one file. Name every function, class, argument and value it must agree on with other files.
+4.  List at most {max_files} files, the most important first. Do not write any code.
+"""
+
+_PLAN_TASK = "Generate the JSON plan (overall_explanation, files)."
+
+
+def parse_plan(response_text: str, max_files: int) -> Plan | None:
+    """The Plan in a response (its first JSON object), with unusable or repeated entries dropped."""
+    start = response_text.find("{")
+    if start < 0:
+        return None
+    try:
+        data, _ = json.JSONDecoder().raw_decode(response_text, start)
+    except ValueError as e:
+        print(f"Error: Could not parse the plan: {e}")
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("files"), list):
+        print("Error: The plan is missing its 'files'.")
+        return None
+    files, seen = [], set()
+    for entry in data["files"]:
+        if not isinstance(entry, dict) or not isinstance(entry.get("file_path"), str):
+            continue
+        path = entry["file_path"].strip().replace("\\", "/")
+        if path.startswith("./"):
+            path = path[2:]
+        if not path or path in seen:
+            continue
+        action_type = entry.get("action_type")
+        if action_type not in ("CREATE", "UPDATE", "PATCH", "DELETE"):
+            action_type = "PATCH"
+        seen.add(path)
+        files.append(FilePlan(file_path=path, action_type=action_type, instructions=str(entry.get("instructions") or "")))
+    if len(files) > max_files:
+        print(f"Warning: The plan lists {len(files)} files; keeping the first {max_files}.")
+        files = files[:max_files]
+    return Plan(overall_explanation=str(data.get("overall_explanation") or ""), files=files)
+
+
+def format_plan(plan: Plan) -> str:
+    lines = [plan["overall_explanation"], ""]
+    lines += [f"- {f['file_path']} ({f['action_type']}): {f['instructions']}" for f in plan["files"]]
+    return "\n".join(lines)
+
+
+def build_plan_prompt(structure_str: str, user_query: str, history_str: str,
+                      relevant_files: dict[str, str]) -> tuple[str, dict]:
+    instructions = _PLAN_INSTRUCTIONS.format(max_files=settings.PLANNER_MAX_FILES)
+    return build_prompt_with_report(structure_str, user_query, history_str, relevant_files,
+                                    instructions=instructions, task=_PLAN_TASK)
+
+
+def build_shared_prefix(structure_str: str, user_query: str, history_str: str, relevant_files: dict[str, str],
+                        plan: Plan) -> str:
+    """
+    The part of every per-file prompt that is the same for all files: instructions, tree, history,
+    the outlines of the relevant files, the request and the plan. Identical bytes up front let the
+    model service reuse its work on the prefix across the fan-out (implicit prompt caching).
+    """
+    outlines = {}
+    for path, content in relevant_files.items():
+        skeleton = compressor.skeleton(path, content)
+        if skeleton:
+            outlines[f"{path} (skeleton)"] = skeleton
+    task = ("The plan below splits this request by file; you are given ONE of its files after it.\n\n"
+            f"--- PLAN ---\n{format_plan(plan)}\n--- END PLAN ---")
+    budget = max(settings.PROMPT_TOKEN_BUDGET - settings.PLANNER_FILE_TOKENS, settings.PROMPT_TOKEN_BUDGET // 4)
+    return build_prompt_with_report(structure_str, user_query, history_str, outlines, token_budget=budget, task=task)[0]
+
+
+def build_file_prompt(prefix: str, entry: FilePlan, content: str | None) -> str:
+    path = entry["file_path"]
+    if content is None:
+        body = f"File: {path} does not exist yet.\n"
+    else:
+        max_chars = int(settings.PLANNER_FILE_TOKENS * settings.PROMPT_CHARS_PER_TOKEN)
+        whole = len(content) <= max_chars and not isinstance(content, Excerpt)
+        label = path if whole else f"{path} (excerpt: head and tail)"
+        body = f"File: {label}\n```\n{truncate_middle(content, max_chars)}\n```\n"
+    return (f"{prefix}\n--- YOUR FILE ---\n{body}\n"
+            f"Carry out the plan for {path} only ({entry['action_type']}): {entry['instructions']}\n"
+            f"Generate the JSON response with the actions for {path}; do not change any other file.\n")
+
+
+def merge_actions(plan: Plan, results: dict[str, GeminiResponse], contents: dict[str, str | None]
+                  ) -> tuple[list[CodeAction], list[str]]:
+    """
+    Merges the actions of the per-file responses, in plan order, and checks them before anything
+    is applied. Dropped, with a reason in the returned conflicts:
+    - actions on any file but the one a response was asked about (its owner is another request),
+    - PATCHes whose SEARCH blocks don't fit the file as it was sent (checked in order),
+    - UPDATEs of a file that was only read in part (an Excerpt: the rest of it would be lost),
+    - the other actions on a file that is also deleted.
+    """
+    actions, conflicts = [], []
+    for entry in plan["files"]:
+        path = entry["file_path"]
+        response = results.get(path)
+        if response is None:
+            continue
+        own = []
+        for action in response["actions"]:
+            target = action["file_path"].replace("\\", "/")
+            if target.startswith("./"):
+                target = target[2:]
+            if target != path:
+                conflicts.append(f"{target}: changed while editing {path}, which the plan does not allow; left out.")
+                continue
+            own.append(CodeAction(action, file_path=path))
+        if not own:
+            continue
+        if len(own) > 1 and any(a["action_type"] == "DELETE" for a in own):
+            conflicts.append(f"{path}: deleted and changed in the same response; left out.")
+            continue
+        content = contents.get(path)
+        if isinstance(content, Excerpt) and any(a["action_type"] == "UPDATE" for a in own):
+            conflicts.append(f"{path}: rewritten whole, but only its head and tail were shown; left out.")
+            continue
+        try:
+            for action in own:
+                if action["action_type"] == "PATCH":
+                    content = apply_patch(content or "", action["code"])
+                elif action["action_type"] in ("CREATE", "UPDATE"):
+                    content = action["code"]
+        except PatchConflict as e:
+            conflicts.append(f"{path}: the patch does not fit the file ({e}); left out.")
+            continue
+        actions.extend(own)
+    return actions, conflicts
+
+
+class FanOut:
+    """
+    Runs the per-file requests of a plan on at most PLANNER_MAX_PARALLEL threads. `generate(prompt)`
+    makes one model call; `check()` is called while waiting and may raise to cancel the rest;
+    `on_file(path, response_or_error)` is told about each file as it completes.
+    """
+
+    def __init__(self, generate: typing.Callable[[str], str], check: typing.Callable[[], None],
+                 on_file: typing.Callable[[str, object], None]):
+        self.generate = generate
+        self.check = check
+        self.on_file = on_file
+
+    def _one(self, prompt: str) -> tuple[GeminiResponse | None, float]:
+        start = time.perf_counter()
+        text = self.generate(prompt)
+        return (parse_gemini_response(text) if text else None), time.perf_counter() - start
+
+    def run(self, prompts: dict[str, str]) -> tuple[dict[str, GeminiResponse], dict[str, str]]:
+        results, errors = {}, {}
+        pool = ThreadPoolExecutor(max_workers=max(1, settings.PLANNER_MAX_PARALLEL), thread_name_prefix="plan-file")
+        try:
+            pending = {pool.submit(self._one, prompt): path for path, prompt in prompts.items()}
+            while pending:
+                self.check()
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    try:
+                        response, seconds = future.result()
+                    except Exception as e:
+                        errors[path] = str(e)
+                        self.on_file(path, e)
+                        continue
+                    tracer.record("plan.file", seconds, file=path,
+                                  actions=len(response["actions"]) if response else 0)
+                    if response is None:
+                        errors[path] = "no valid response"
+                        self.on_file(path, ValueError(errors[path]))
+                    else:
+                        results[path] = response
+                        self.on_file(path, response)
+        finally:
+            # On cancellation, requests not started yet are dropped; running ones finish in the background.
+            pool.shutdown(wait=False, cancel_futures=True)
+        return results, errors
+
+
+def generate_with(client, schema, bypass_cache: bool, overrides, deadline) -> typing.Callable[[str], str]:
+    """A one-argument model call, through the response cache when there is one."""
+    if isinstance(client, CachedClient):
+        return lambda prompt: client.generate_response(prompt, schema=schema, bypass_cache=bypass_cache,
+                                                       overrides=overrides, deadline=deadline)
+    return lambda prompt: client.generate_response(prompt, schema=schema, overrides=overrides, deadline=deadline)
+
+
+def run_planned(pipeline, structure_str: str, user_query: str, history_str: str,
+                relevant_files: dict[str, str]) -> GeminiResponse:
+    """Planner mode for a RequestPipeline: plan, fan out per file, merge. Returns one GeminiResponse."""
+    pipeline.progress("Planning the change file by file...")
+    with tracer.span("plan") as span:
+        prompt, pipeline.prompt_report = build_plan_prompt(structure_str, user_query, history_str, relevant_files)
+        overrides = {**pipeline.overrides, "max_output_tokens": settings.PLANNER_PLAN_MAX_TOKENS}
+        text = generate_with(pipeline.ai_client, Plan, pipeline.bypass_cache, overrides, pipeline.deadline)(prompt)
+        plan = parse_plan(text or "", settings.PLANNER_MAX_FILES)
+        span.set(chars=len(prompt), files=len(plan["files"]) if plan else 0)
+    if plan is None:
+        raise ValueError("Failed to parse a valid plan from the AI's response.")
+    pipeline.check()
+    if not plan["files"]:
+        return GeminiResponse(overall_explanation=plan["overall_explanation"] or "Nothing to change.", actions=[])
+    pipeline.progress(f"Plan: {len(plan['files'])} file(s): {', '.join(f['file_path'] for f in plan['files'])}")
+
+    paths = [f["file_path"] for f in plan["files"]]
+    contents = {path: relevant_files.get(path) for path in paths}
+    missing = [path for path, content in contents.items() if content is None]
+    contents.update(pipeline.project_manager.read_files(missing))
+    prefix = build_shared_prefix(structure_str, user_query, history_str, relevant_files, plan)
+    prompts = {entry["file_path"]: build_file_prompt(prefix, entry, contents[entry["file_path"]])
+               for entry in plan["files"]}
+
+    def on_file(path: str, outcome):
+        if isinstance(outcome, Exception):
+            pipeline.progress(f"{path}: failed ({outcome})")
+        else:
+            pipeline.progress(f"{path}: {len(outcome['actions'])} action(s)")
+
+    overrides = {**pipeline.overrides, "max_output_tokens": settings.PLANNER_FILE_MAX_OUTPUT_TOKENS}
+    generate = generate_with(pipeline.ai_client, GeminiResponse, pipeline.bypass_cache, overrides, pipeline.deadline)
+    with tracer.span("fanout", files=len(prompts), prefix_tokens=estimate_tokens(prefix)) as span:
+        results, errors = FanOut(generate, pipeline.check, on_file).run(prompts)
+        span.set(ok=len(results), failed=len(errors))
+    if not results:
+        raise ValueError(f"Every per-file request failed: {'; '.join(f'{p}: {e}' for p, e in errors.items())}")
+
+    with tracer.span("merge") as span:
+        actions, conflicts = merge_actions(plan, results, contents)
+        span.set(actions=len(actions), conflicts=len(conflicts))
+    notes = [f"- {results[path]['overall_explanation']}" for path in paths if path in results]
+    notes += [f"- {path}: request failed ({error}); not changed." for path, error in errors.items()]
+    notes += [f"- {conflict}" for conflict in conflicts]
+    for conflict in conflicts:
+        pipeline.progress(f"Conflict: {conflict}")
+    explanation = plan["overall_explanation"] + ("\n" + "\n".join(notes) if notes else "")
+    return GeminiResponse(overall_explanation=explanation, actions=actions)
@@ -1,38 +1,197 @@
 # ai_client/prompt_builder.py
+import io
+import math
+from ai_client.context_compressor import compressor
+from config import settings
+from core.file_cache import Excerpt
 
-def build_prompt(project_structure_str: str, user_query: str, conversation_history_str: str, relevant_files: dict[str, str] | None = None) -> str:
-    """
-    Constructs a highly focused and clean prompt.
-    It provides file content as the primary context for modifications.
-    """
-    # Build the file contents string. This is now the most important context.
-    file_contents_str = ""
-    if relevant_files:
-        file_contents_str = "--- Relevant File Contents ---\n"
-        for path, content in relevant_files.items():
-            file_contents_str += f"File: {path}\n```\n{content}\n```\n\n"
-    else:
-        file_contents_str = "No specific files were provided for context.\n"
-
-    final_prompt = f"""
+_INSTRUCTIONS = """
 You are CodeGenius, an expert AI programming assistant. Your task is to generate a JSON object describing file modifications to fulfill the user's request.
 
 --- CORE INSTRUCTIONS ---
 1.  Your response MUST be a single, valid JSON object. The API enforces the schema.
 2.  Analyze the user's request, the project tree, the conversation history, and ESPECIALLY the provided file contents.
 3.  Be direct and factual. Do not comment on your own process.
+4.  Files labelled "(excerpt: ...)" or "(skeleton)" only show part of the file, with "... (N lines)" standing for the lines left out. Files labelled "(compacted)" are complete, but text ending in "…[+N chars]" was shortened. Never UPDATE a file you have only seen partially or compacted, and keep shortened lines out of SEARCH blocks.
+5.  To change part of an existing file, prefer a PATCH action over UPDATE. Its "code" is one or more blocks of the form
+<<<<<<< SEARCH
+(exact lines currently in the file, with enough context to be unique)
+=======
+(the lines that replace them)
+>>>>>>> REPLACE
+    Use UPDATE only to rewrite most of a file. A PATCH may target an excerpt, as long as the SEARCH lines were shown.
+"""
 
---- CONTEXT ---
-Project Tree:
-{project_structure_str}
+def estimate_tokens(text: str) -> int:
+    """A fast local token estimate (no tokenizer round trip): characters / PROMPT_CHARS_PER_TOKEN."""
+    return math.ceil(len(text) / settings.PROMPT_CHARS_PER_TOKEN) if text else 0
 
-{file_contents_str}
-Conversation History (for context on follow-up questions):
-{conversation_history_str}
---- END CONTEXT ---
 
-User Request: "{user_query}"
+def _chars_for(tokens: int) -> int:
+    return max(int(tokens * settings.PROMPT_CHARS_PER_TOKEN), 0)
 
-Generate the JSON response describing the actions to take.
-"""
-    return final_prompt
\ No newline at end of file
+
+def truncate_middle(text: str, max_chars: int) -> str:
+    """Keeps the head and the tail of `text`, replacing the middle with a marker."""
+    if len(text) <= max_chars:
+        return text
+    marker = f"\n... [{len(text) - max_chars} characters omitted] ...\n"
+    keep = max(max_chars - len(marker), 0)
+    head = keep * 2 // 3
+    return text[:head] + marker + text[len(text) - (keep - head):]
+
+
+def _compressed(path: str, content: str, user_query: str, tokens: int, report: dict) -> tuple[str, str | None]:
+    """The largest view of a file that fits in `tokens`, with its label; counts it in `report`."""
+    # Excerpts (symbols, the head and tail of huge files) arrive already labelled; their label is
+    # kept and they are only compacted or cut.
+    partial = isinstance(content, Excerpt)
+    compact = compressor.compact(content)
+    if estimate_tokens(compact) <= tokens:
+        report["compacted"] += 1
+        return (path if partial else f"{path} (compacted)"), compact
+    if not partial:
+        focused = compressor.focus(path, content, user_query)
+        if focused and estimate_tokens(focused) <= tokens:
+            report["focused"] += 1
+            return f"{path} (excerpt: outline and matching lines)", focused
+        skeleton = compressor.skeleton(path, content)
+        if skeleton and estimate_tokens(skeleton) <= tokens:
+            report["skeletonized"] += 1
+            return f"{path} (skeleton)", skeleton
+    if tokens >= settings.PROMPT_MIN_FILE_TOKENS:
+        report["truncated"] += 1
+        return (path if partial else f"{path} (excerpt: head and tail)"), truncate_middle(compact, _chars_for(tokens - 1))
+    return path, None
+
+
+def _section_report(budget: int) -> dict:
+    return {"budget": budget, "used": 0, "items": 0, "compacted": 0, "focused": 0, "truncated": 0, "skeletonized": 0,
+            "omitted": 0}
+
+
+_TASK = "Generate the JSON response describing the actions to take."
+
+
+def _request_line(user_query: str, task: str) -> str:
+    return f'User Request: "{user_query}"\n\n{task}\n'
+
+
+def history_budget(user_query: str, token_budget: int | None = None, instructions: str = _INSTRUCTIONS,
+                   task: str = _TASK) -> int:
+    """
+    The tokens of conversation history the prompt for `user_query` has room for: the history is
+    fitted by ChatManager.get_formatted_history(token_budget=...) and sent as it comes.
+    """
+    token_budget = settings.PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    available = max(token_budget - estimate_tokens(instructions) - estimate_tokens(_request_line(user_query, task)), 0)
+    return int(available * settings.PROMPT_HISTORY_SHARE)
+
+
+def build_prompt_with_report(project_structure_str: str, user_query: str, conversation_history_str: str,
+                             relevant_files: dict[str, str] | None = None,
+                             token_budget: int | None = None, instructions: str = _INSTRUCTIONS,
+                             task: str = _TASK) -> tuple[str, dict]:
+    """
+    Assembles the prompt within a token budget and reports how it was spent.
+
+    The instructions and the user request are always sent in full. What is left is split between
+    the project tree, the conversation history and the files (see PROMPT_*_SHARE); unused budget
+    flows to the files. The history is expected to fit its share already (see history_budget). Files are taken in the order given (most relevant first): each one is sent
+    whole if it fits, otherwise compacted, otherwise as its outline plus the regions mentioning the
+    request, otherwise as a skeleton (see ContextCompressor), otherwise cut in the middle,
+    otherwise left out.
+    `instructions` and `task` (the line after the request) replace the defaults for other kinds of
+    calls, such as the planner's.
+    """
+    token_budget = settings.PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    request_line = _request_line(user_query, task)
+    fixed_tokens = estimate_tokens(instructions) + estimate_tokens(request_line)
+    available = max(token_budget - fixed_tokens, 0)
+
+    report = {
+        "instructions": {**_section_report(fixed_tokens), "used": fixed_tokens, "items": 1},
+        "tree": _section_report(int(available * settings.PROMPT_TREE_SHARE)),
+        "history": _section_report(int(available * settings.PROMPT_HISTORY_SHARE)),
+        "files": _section_report(0),
+    }
+
+    # Project tree: keep the top of the tree, the budgets of the walker already summarise the rest.
+    tree = project_structure_str
+    if estimate_tokens(tree) > report["tree"]["budget"]:
+        marker = "... (tree truncated)"
+        tree = tree[:max(_chars_for(report["tree"]["budget"]) - len(marker), 0)]
+        tree = tree[:tree.rfind("\n") + 1] + marker
+        report["tree"]["truncated"] = 1
+    report["tree"]["used"] = estimate_tokens(tree)
+    report["tree"]["items"] = 1
+
+    # History: already fitted to history_budget() by the chat manager (newest messages, older ones summarised).
+    history = conversation_history_str
+    report["history"]["used"] = estimate_tokens(history)
+    report["history"]["items"] = 1
+
+    files_report = report["files"]
+    files_report["budget"] = available - report["tree"]["used"] - report["history"]["used"]
+    remaining = files_report["budget"]
+
+    files_out = io.StringIO()
+    if relevant_files:
+        header = "--- Relevant File Contents ---\n"
+        files_out.write(header)
+        # Keep room for the header and for the note listing left-out files.
+        remaining -= estimate_tokens(header) + settings.PROMPT_MIN_FILE_TOKENS // 4
+        omitted = []
+        for path, content in relevant_files.items():
+            overhead = estimate_tokens(f"File: {path} (excerpt: outline and matching lines)\n```\n\n```\n\n")
+            label, body = path, content
+            if estimate_tokens(content) + overhead > remaining:
+                label, body = _compressed(path, content, user_query, remaining - overhead, files_report)
+                if body is None:
+                    omitted.append(path)
+                    files_report["omitted"] += 1
+                    continue
+            entry = f"File: {label}\n```\n{body}\n```\n\n"
+            files_out.write(entry)
+            remaining -= estimate_tokens(entry)
+            files_report["items"] += 1
+        if omitted:
+            files_out.write(f"(Left out to fit the prompt budget: {', '.join(omitted)})\n")
+    else:
+        files_out.write("No specific files were provided for context.\n")
+    files_str = files_out.getvalue()
+    files_report["used"] = estimate_tokens(files_str)
+
+    out = io.StringIO()
+    out.write(instructions)
+    out.write("\n--- CONTEXT ---\nProject Tree:\n")
+    out.write(tree)
+    out.write("\n\n")
+    out.write(files_str)
+    out.write("\nConversation History (for context on follow-up questions):\n")
+    out.write(history)
+    out.write("\n--- END CONTEXT ---\n\n")
+    out.write(request_line)
+    prompt = out.getvalue()
+    report["total"] = {"budget": token_budget, "used": estimate_tokens(prompt)}
+    return prompt, report
+
+
+def format_report(report: dict) -> str:
+    """One-line summary of a prompt report, e.g. for progress messages."""
+    parts = []
+    for name in ("tree", "files", "history"):
+        section = report[name]
+        details = [f"{section[k]} {k}" for k in ("compacted", "focused", "skeletonized", "truncated", "omitted")
+                   if section[k]]
+        suffix = f" ({', '.join(details)})" if details else ""
+        parts.append(f"{name} {section['used']}/{section['budget']}{suffix}")
+    return f"~{report['total']['used']} tokens: " + ", ".join(parts)
+
+
+def build_prompt(project_structure_str: str, user_query: str, conversation_history_str: str, relevant_files: dict[str, str] | None = None) -> str:
+    """
+    Constructs a highly focused and clean prompt within the configured token budget.
+    It provides file content as the primary context for modifications.
+    """
+    return build_prompt_with_report(project_structure_str, user_query, conversation_history_str, relevant_files)[0]
@@ -0,0 +1,81 @@
+# ai_client/rate_limit.py
+import threading
+import time
+from ai_client.errors import Deadline, DeadlineExceededError
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` units per second flow in up to `capacity`. `wait_time(n)` says
+    how long until `n` units are there and `take(n)` removes them. Requests larger than the
+    capacity only wait for a full bucket, so they aren't blocked forever.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._level = capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._level = min(self.capacity, self._level + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units could be taken (0 if they can be taken now)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (min(amount, self.capacity) - self._level) / self.rate)
+
+    def take(self, amount: float):
+        """Takes `amount` units; the level may go negative for oversized requests, later ones wait it off."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level -= amount
+
+
+class RateLimiter:
+    """
+    Keeps the client under the model's requests-per-minute and tokens-per-minute quotas, so
+    requests wait here instead of being rejected with 429s. Either limit may be 0 (unlimited).
+    Buckets start full, so a burst of up to a minute's quota goes out at once.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute / 60.0, requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+
+    def _wait_time(self, tokens: int) -> float:
+        waits = [bucket.wait_time(amount) for bucket, amount in ((self.requests, 1), (self.tokens, tokens))
+                 if bucket is not None]
+        return max(waits + [self._paused_until - time.monotonic()])
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Takes the quota for one request of `tokens` tokens if it is available right now."""
+        with self._lock:
+            # Both buckets are checked before either is drawn from, so a request never holds half its quota.
+            if self._wait_time(tokens) > 0:
+                return False
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            return True
+
+    def acquire(self, tokens: int, deadline: Deadline | None = None):
+        """Blocks until one request of `tokens` tokens may be sent; raises if the deadline would pass first."""
+        while not self.try_acquire(tokens):
+            with self._lock:
+                wait = self._wait_time(tokens)
+            remaining = deadline.remaining() if deadline is not None else None
+            if remaining is not None and wait > remaining:
+                raise DeadlineExceededError(f"The rate limit would delay the request by {wait:.1f}s, past its deadline.")
+            time.sleep(max(wait, 0.001))
+
+    def back_off(self, seconds: float):
+        """Called on a 429: nothing is sent for `seconds`."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
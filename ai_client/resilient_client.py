@@ -0,0 +1,143 @@
+# ai_client/resilient_client.py
+import random
+import threading
+import time
+import typing
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from ai_client.backends import AsyncFromSync
+from ai_client.errors import Deadline, DeadlineExceededError, ModelError, RateLimitError, classify
+from ai_client.prompt_builder import estimate_tokens
+from ai_client.rate_limit import RateLimiter
+from config import settings
+
+
+class ResilientClient(AsyncFromSync):
+    """
+    Sits in front of a model client and makes its calls survive quotas and transient failures:
+
+    - every call first waits for the RateLimiter (requests and tokens per minute),
+    - rate-limited, unavailable and timed-out calls are retried with exponential backoff and
+      full jitter (or after the delay the service asked for),
+    - everything happens within the request's Deadline, which is also handed to the client as
+      its call timeout,
+    - optionally, a slow call is hedged with a second identical one (non-streaming calls only).
+
+    Failures are raised as ModelError subclasses instead of being turned into empty responses.
+    """
+
+    def __init__(self, client, limiter: RateLimiter | None = None, max_retries: int | None = None,
+                 backoff_base: float | None = None, backoff_max: float | None = None,
+                 hedge_after: float | None = None, deadline_seconds: float | None = None):
+        self.client = client
+        self.limiter = limiter or RateLimiter(settings.MODEL_REQUESTS_PER_MINUTE, settings.MODEL_TOKENS_PER_MINUTE)
+        self.max_retries = settings.MODEL_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = settings.MODEL_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = settings.MODEL_BACKOFF_MAX if backoff_max is None else backoff_max
+        self.hedge_after = settings.MODEL_HEDGE_AFTER if hedge_after is None else hedge_after
+        self.deadline_seconds = settings.MODEL_REQUEST_DEADLINE if deadline_seconds is None else deadline_seconds
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._random = random.Random()
+
+    def __getattr__(self, name):
+        # Everything else (model_name, config_fingerprint, ...) belongs to the wrapped client.
+        return getattr(self.client, name)
+
+    def _backoff(self, attempt: int, error: ModelError) -> float:
+        if error.retry_after:
+            return error.retry_after
+        return self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _retrying(self, call, deadline: Deadline, prompt: str):
+        """Runs `call()` until it succeeds, fails for good, or the retries or the deadline run out."""
+        tokens = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            deadline.check()
+            self.limiter.acquire(tokens, deadline)
+            try:
+                return call()
+            except Exception as e:
+                error = classify(e)
+            if not error.retryable or attempt >= self.max_retries:
+                raise error
+            delay = self._backoff(attempt, error)
+            if isinstance(error, RateLimitError):
+                # The quota is shared: every request of this client holds back, not just this one.
+                self.limiter.back_off(delay)
+            remaining = deadline.remaining()
+            if remaining is not None and delay >= remaining:
+                raise error
+            print(f"Model call failed ({error}); retrying in {delay:.1f}s.")
+            time.sleep(delay)
+            attempt += 1
+
+    def generate_response(self, prompt: str, schema: typing.Type, overrides: typing.Mapping | None = None,
+                          deadline: Deadline | None = None) -> str:
+        deadline = deadline or Deadline(self.deadline_seconds)
+
+        def call():
+            if self.hedge_after > 0:
+                return self._hedged(prompt, schema, overrides, deadline)
+            return self.client.generate_response(prompt, schema, overrides=overrides, deadline=deadline)
+
+        return self._retrying(call, deadline, prompt)
+
+    def _hedged(self, prompt: str, schema, overrides, deadline: Deadline) -> str:
+        """
+        Sends the call, and if it hasn't answered within `hedge_after` seconds, the same call again
+        (only if the quota allows it right away). The first success wins; the slower call is left
+        to finish on its own.
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                # Calls that lost the race keep their thread until they return, hence the headroom.
+                self._pool = ThreadPoolExecutor(max_workers=8 * settings.SCHEDULER_WORKERS, thread_name_prefix="hedge")
+        tokens = estimate_tokens(prompt)
+
+        def send():
+            return self.client.generate_response(prompt, schema, overrides=overrides, deadline=deadline)
+
+        futures = {self._pool.submit(send)}
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done and not deadline.expired() and self.limiter.try_acquire(tokens):
+            futures.add(self._pool.submit(send))
+        error = None
+        while futures:
+            done, futures = wait(futures, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceededError("The model call ran out of time.")
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+        raise error
+
+    def generate_response_stream(self, prompt: str, schema: typing.Type, overrides: typing.Mapping | None = None,
+                                 deadline: Deadline | None = None):
+        """
+        Streams from the wrapped client. A call is only retried if it fails before its first chunk;
+        once text has been handed on, a failure is raised to the caller.
+        """
+        deadline = deadline or Deadline(self.deadline_seconds)
+        first = []
+
+        def call():
+            stream = iter(self.client.generate_response_stream(prompt, schema, overrides=overrides, deadline=deadline))
+            first[:] = [next(stream, None)]
+            return stream
+
+        stream = self._retrying(call, deadline, prompt)
+        try:
+            if first[0] is not None:
+                yield first[0]
+            yield from stream
+        except Exception as e:
+            error = classify(e)
+            if error is e:
+                raise
+            raise error from e
+        finally:
+            if hasattr(stream, "close"):
+                stream.close()
@@ -0,0 +1,205 @@
+# ai_client/response_cache.py
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import typing
+import zlib
+from ai_client.backends import AsyncFromSync
+from ai_client.response_parser import IncrementalResponseParser
+from config import settings
+from schemas.ai_schemas import GeminiResponse
+
+# Each entry file: creation time (float64) followed by the zlib-compressed response text.
+_HEADER = struct.Struct("<d")
+
+
+def schema_fingerprint(schema) -> str:
+    """A stable description of a response schema (TypedDicts are expanded field by field)."""
+    if isinstance(schema, type) and typing.is_typeddict(schema):
+        fields = typing.get_type_hints(schema)
+        inner = ",".join(f"{name}:{schema_fingerprint(tp)}" for name, tp in sorted(fields.items()))
+        return f"{schema.__name__}{{{inner}}}"
+    args = typing.get_args(schema)
+    if args:
+        origin = typing.get_origin(schema)
+        return f"{getattr(origin, '__name__', repr(origin))}[{','.join(schema_fingerprint(a) for a in args)}]"
+    return getattr(schema, "__name__", repr(schema))
+
+
+class ResponseCache:
+    """
+    A content-addressed, zlib-compressed cache of model responses on disk.
+
+    The least recently used entries are evicted once the cache grows past `max_bytes`
+    (a hit refreshes the entry's mtime), and entries older than `ttl` seconds are ignored.
+    """
+
+    def __init__(self, cache_dir: str | None = None, max_bytes: int | None = None, ttl: float | None = None):
+        self.cache_dir = cache_dir or settings.RESPONSE_CACHE_DIR
+        self.max_bytes = settings.RESPONSE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl = settings.RESPONSE_CACHE_TTL if ttl is None else ttl
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._total_bytes = sum(size for _, _, size in self._entries())
+
+    @staticmethod
+    def make_key(model: str, config: dict, schema, prompt: str) -> str:
+        h = hashlib.sha256()
+        for part in (model, json.dumps(config, sort_keys=True, default=str), schema_fingerprint(schema)):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        h.update(prompt.encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".z")
+
+    def _entries(self):
+        """Yields (path, mtime, size) for every entry on disk."""
+        for bucket in os.scandir(self.cache_dir):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith(".z"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry.path, st.st_mtime, st.st_size
+
+    def get(self, key: str) -> str | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            (created,) = _HEADER.unpack_from(data)
+            if self.ttl and time.time() - created > self.ttl:
+                self._remove(path)
+                return None
+            text = zlib.decompress(data[_HEADER.size:]).decode("utf-8")
+        except FileNotFoundError:
+            return None
+        except (OSError, struct.error, zlib.error, UnicodeDecodeError):
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return text
+
+    def put(self, key: str, text: str):
+        path = self._path(key)
+        data = _HEADER.pack(time.time()) + zlib.compress(text.encode("utf-8"), 6)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            try:
+                self._total_bytes -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(tmp_path, path)
+            self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path: str):
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._total_bytes -= size
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Drops least recently used entries until the cache is back under 90% of its limit."""
+        target = self.max_bytes * 0.9
+        for path, _, size in sorted(self._entries(), key=lambda e: e[1]):
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+                self._total_bytes -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in list(self._entries()):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._total_bytes = 0
+
+
+class CachedClient(AsyncFromSync):
+    """
+    Sits in front of a model client and answers repeated requests from the ResponseCache.
+    The key covers the model name, generation config, schema and prompt, so any change misses.
+    """
+
+    def __init__(self, client, cache: ResponseCache | None = None):
+        self.client = client
+        self.cache = cache or ResponseCache()
+
+    def __getattr__(self, name):
+        # Everything else (model, settings, ...) belongs to the wrapped client.
+        return getattr(self.client, name)
+
+    def generate_response(self, prompt: str, schema: typing.Type, bypass_cache: bool = False,
+                          overrides: typing.Mapping | None = None, deadline=None) -> str:
+        key = self.cache.make_key(self.client.model_name, self.client.config_fingerprint(overrides), schema, prompt)
+        if not bypass_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        text = self.client.generate_response(prompt, schema, overrides=overrides, deadline=deadline)
+        if text and _cacheable(text, schema):
+            # An empty, truncated or invalid answer must not be replayed.
+            self.cache.put(key, text)
+        return text
+
+    def generate_response_stream(self, prompt: str, schema: typing.Type, bypass_cache: bool = False,
+                                 overrides: typing.Mapping | None = None, deadline=None):
+        """Streams from the wrapped client; a cache hit is replayed as a single chunk."""
+        key = self.cache.make_key(self.client.model_name, self.client.config_fingerprint(overrides), schema, prompt)
+        if not bypass_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        pieces = []
+        for piece in self.client.generate_response_stream(prompt, schema, overrides=overrides, deadline=deadline):
+            pieces.append(piece)
+            yield piece
+        text = "".join(pieces)
+        if text and _cacheable(text, schema):
+            # A stream that broke off half-way must not be replayed.
+            self.cache.put(key, text)
+
+
+def _cacheable(text: str, schema) -> bool:
+    """
+    Whether a response may be replayed. A GeminiResponse must parse completely: finished, not
+    truncated, and without invalid fields or actions. Other schemas (the planner's Plan) must at
+    least be one complete JSON object.
+    """
+    if schema is GeminiResponse:
+        parser = IncrementalResponseParser()
+        parser.feed(text)
+        return parser.is_complete()
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        return False
+    try:
+        json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return False
+    return True
@@ -1,51 +1,307 @@
 # ai_client/response_parser.py
 import json
+import re
+import typing
+from json.decoder import scanstring
 from typing import Optional
-from schemas.ai_schemas import GeminiResponse
+from schemas.ai_schemas import CodeAction, GeminiResponse
 
+_ACTION_FIELDS = ("action_type", "file_path", "code", "explanation")
+_ACTION_TYPES = set(typing.get_args(typing.get_type_hints(CodeAction)["action_type"]))
 
-def parse_gemini_response(response_text: str) -> Optional[GeminiResponse]:
+# The body of a JSON string up to (not including) its closing quote or a dangling backslash.
+_STRING_BODY_RE = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_WHITESPACE_RE = re.compile(r"[ \t\r\n]*")
+_SCALAR_RE = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null")
+# What the start of a scalar cut off by the end of a chunk can look like.
+_PARTIAL_SCALAR_RE = re.compile(r"-?\d*(?:\.\d*)?(?:[eE][+-]?\d*)?|t(?:r(?:ue?)?)?|f(?:a(?:l(?:se?)?)?)?|n(?:u(?:ll?)?)?")
+# How much of a broken response is echoed in error messages (never the whole payload).
+_EXCERPT_CHARS = 200
+
+
+def _root_problem(data) -> str | None:
+    """What makes `data` unusable as a GeminiResponse (its actions aside), or None."""
+    if not isinstance(data, dict):
+        return "The response is not a JSON object."
+    if "overall_explanation" not in data or "actions" not in data:
+        return "Parsed JSON is missing required keys ('overall_explanation', 'actions')."
+    if not isinstance(data["overall_explanation"], str):
+        return "'overall_explanation' must be a string."
+    if not isinstance(data["actions"], list):
+        return "'actions' must be a list."
+    return None
+
+
+def _action_problem(value) -> str | None:
+    """Why `value` is not a valid CodeAction, or None."""
+    if not isinstance(value, dict):
+        return f"Skipping an action that is not an object: {str(value)[:80]!r}"
+    missing = [k for k in _ACTION_FIELDS if k not in value]
+    if missing:
+        return f"An action is missing required keys: {missing}"
+    for key in _ACTION_FIELDS:
+        if not isinstance(value[key], str):
+            return f"Action field '{key}' must be a string."
+    if value["action_type"] not in _ACTION_TYPES:
+        return f"Unknown action type '{value['action_type']}'."
+    return None
+
+
+class _Frame:
+    """An open JSON object or array. `role` says what it is in a GeminiResponse."""
+    __slots__ = ("value", "key", "role", "valid")
+
+    def __init__(self, value, role: str):
+        self.value = value
+        self.key = None
+        self.role = role  # "root", "actions", "action" or "other"
+        self.valid = True
+
+
+class IncrementalResponseParser:
     """
-    Parses the raw string from the Gemini API into a GeminiResponse TypedDict.
+    A push-based parser for GeminiResponse JSON.
 
-    This version is more robust: it finds the main JSON block within the
-    response text, ignoring potential markdown wrappers or conversational text.
+    Text is fed in chunks as it arrives (`feed` returns the CodeActions completed by that chunk)
+    and nothing but the unfinished token is kept between chunks, so large `code` payloads are
+    copied once into their final string instead of being sliced out of a buffer first. Fields are
+    validated as they are set, and `close()` recovers the complete actions of a truncated response
+    (e.g. one that hit max_output_tokens).
     """
-    try:
-        # Find the first '{' and the last '}' to isolate the JSON block.
-        # This is more reliable than just stripping markdown.
-        start_index = response_text.find('{')
-        end_index = response_text.rfind('}')
 
-        if start_index == -1 or end_index == -1 or end_index < start_index:
+    def __init__(self):
+        self._stack: list[_Frame] = []
+        self._carry = ""  # a dangling backslash or unfinished scalar, prepended to the next chunk
+        self._in_string = False
+        self._string_parts: list[str] = []
+        self._started = False
+        self.done = False
+        self.truncated = False
+        self.errors: list[str] = []
+        self.actions: list[CodeAction] = []
+        self.overall_explanation: str | None = None
+        self._root: dict | None = None
+        self._excerpt = ""
+
+    # --- Tokenizing ---
+
+    def feed(self, chunk: str) -> list[CodeAction]:
+        if self.done or not chunk:
+            return []
+        if len(self._excerpt) < _EXCERPT_CHARS:
+            self._excerpt += chunk[:_EXCERPT_CHARS - len(self._excerpt)]
+        if self._carry:
+            chunk, self._carry = self._carry + chunk, ""
+
+        completed: list[CodeAction] = []
+        i, n = 0, len(chunk)
+        while i < n and not self.done:
+            if self._in_string:
+                i = self._scan_string(chunk, i)
+                if i < 0:
+                    break
+                continue
+
+            i = _WHITESPACE_RE.match(chunk, i).end()
+            if i >= n:
+                break
+            c = chunk[i]
+            if not self._started:
+                # Skip markdown fences or chatter before the JSON object.
+                start = chunk.find("{", i)
+                if start == -1:
+                    break
+                i, c = start, "{"
+                self._started = True
+
+            if c == '"':
+                self._in_string = True
+                self._string_parts = []
+                i += 1
+            elif c == "{":
+                self._open(dict)
+                i += 1
+            elif c == "[":
+                self._open(list)
+                i += 1
+            elif c in "}]":
+                frame = self._stack.pop()
+                i += 1
+                self._close_frame(frame, completed)
+            elif c in ":,":
+                i += 1
+            else:
+                match = _SCALAR_RE.match(chunk, i)
+                if n - i < 32 and _PARTIAL_SCALAR_RE.fullmatch(chunk, i):
+                    # Possibly cut in the middle of a literal: wait for the next chunk.
+                    self._carry = chunk[i:]
+                    break
+                if match is None:
+                    self._fail(f"unexpected character {c!r}")
+                    break
+                text = match.group()
+                value = {"true": True, "false": False, "null": None}.get(text, text)
+                if isinstance(value, str):
+                    value = float(text) if any(ch in text for ch in ".eE") else int(text)
+                self._add_value(value, completed)
+                i = match.end()
+        return completed
+
+    def _scan_string(self, chunk: str, i: int) -> int:
+        """Consumes string content from `i`. Returns the next position, or -1 if the chunk ran out."""
+        # Find the closing quote at C speed; escapes are decoded once, when the string is complete.
+        j = _STRING_BODY_RE.match(chunk, i).end()
+        if j >= len(chunk) or chunk[j] == "\\":
+            # No closing quote yet (a trailing backslash waits for the character it escapes).
+            self._string_parts.append(chunk[i:j])
+            self._carry = chunk[j:]
+            return -1
+        parts, self._string_parts = self._string_parts, []
+        raw = chunk[i:j] if not parts else "".join(parts) + chunk[i:j]
+        if "\\" in raw:
+            try:
+                value = scanstring(raw + '"', 0, False)[0]
+            except ValueError as e:
+                self._fail(f"bad string escape ({e})")
+                return -1
+        else:
+            value = raw
+        self._in_string = False
+        self._add_string(value)
+        return j + 1
+
+    # --- Building values ---
+
+    def _open(self, container):
+        parent = self._stack[-1] if self._stack else None
+        if parent is None:
+            role = "root"
+        elif parent.role == "root" and parent.key == "actions" and container is list:
+            role = "actions"
+        elif parent.role == "actions" and container is dict:
+            role = "action"
+        else:
+            role = "other"
+        self._stack.append(_Frame(container(), role))
+
+    def _add_string(self, value: str):
+        frame = self._stack[-1] if self._stack else None
+        if frame is not None and isinstance(frame.value, dict) and frame.key is None:
+            frame.key = value
+            return
+        self._add_value(value, None)
+
+    def _add_value(self, value, completed):
+        if not self._stack:
+            return
+        frame = self._stack[-1]
+        if isinstance(frame.value, list):
+            if frame.role == "actions" and not isinstance(value, dict):
+                self.errors.append(f"Skipping an action that is not an object: {str(value)[:80]!r}")
+                return
+            frame.value.append(value)
+            return
+
+        key, frame.key = frame.key, None
+        if key is None:
+            self._fail("value without a key")
+            return
+        if frame.role == "action" and key in _ACTION_FIELDS:
+            if not isinstance(value, str):
+                frame.valid = False
+                self.errors.append(f"Action field '{key}' must be a string.")
+            elif key == "action_type" and value not in _ACTION_TYPES:
+                frame.valid = False
+                self.errors.append(f"Unknown action type '{value}'.")
+        elif frame.role == "root" and key == "overall_explanation" and isinstance(value, str):
+            # Other types are reported by close().
+            self.overall_explanation = value
+        frame.value[key] = value
+
+    def _close_frame(self, frame: _Frame, completed):
+        if frame.role == "action":
+            missing = [k for k in _ACTION_FIELDS if k not in frame.value]
+            if missing:
+                self.errors.append(f"An action is missing required keys: {missing}")
+            elif frame.valid:
+                action = CodeAction(**frame.value)
+                self.actions.append(action)
+                completed.append(action)
+            return
+        if frame.role == "actions":
+            # The actions were collected one by one as they completed; hand over that list.
+            self._add_value(self.actions, completed)
+            return
+        if frame.role == "root":
+            self._root = frame.value
+            self.done = True
+            return
+        self._add_value(frame.value, completed)
+
+    def _fail(self, message: str):
+        self.errors.append(f"Invalid JSON: {message}")
+        self.done = True
+        self._stack.clear()
+
+    # --- Result ---
+
+    def is_complete(self) -> bool:
+        """Whether the whole response has been received and is valid: not truncated, no invalid field or action."""
+        return self.done and not self.errors and self._root is not None and _root_problem(self._root) is None
+
+    def close(self) -> Optional[GeminiResponse]:
+        """
+        Finishes parsing. Returns the complete response, the recovered part of a truncated one,
+        or None if nothing usable was received (or its top-level fields are invalid).
+        """
+        if self._root is not None:
+            problem = _root_problem(self._root)
+            if problem is not None:
+                print(f"Error: {problem}")
+                return None
+            for error in self.errors:
+                print(f"Warning: {error}")
+            return GeminiResponse(overall_explanation=self.overall_explanation, actions=self.actions)
+
+        for error in self.errors:
+            print(f"Warning: {error}")
+        if not self.actions:
             print("Error: Could not find a valid JSON object within the response.")
-            print(f"--- Received Text ---\n{response_text}\n---------------------")
+            print(f"--- Start of received text ---\n{self._excerpt}\n---------------------")
             return None
+        # Cut off before the end (typically max_output_tokens): keep what was complete.
+        self.truncated = True
+        print(f"Warning: The response was truncated; recovered {len(self.actions)} complete action(s).")
+        explanation = self.overall_explanation or ""
+        return GeminiResponse(overall_explanation=explanation + " (response truncated)", actions=self.actions)
 
-        # Extract the JSON substring
-        json_str = response_text[start_index: end_index + 1]
 
-        data = json.loads(json_str)
+def parse_gemini_response(response_text: str) -> Optional[GeminiResponse]:
+    """
+    Parses the raw string from the Gemini API into a GeminiResponse TypedDict.
 
-        # Validation to ensure the parsed data matches our schema's structure
-        if "overall_explanation" not in data or "actions" not in data:
-            print("Error: Parsed JSON is missing required keys ('overall_explanation', 'actions').")
+    A response that is exactly one JSON object is decoded with json.loads. Otherwise the
+    IncrementalResponseParser skips markdown wrappers or conversational text around the JSON
+    object and recovers the complete actions of a truncated response.
+    """
+    try:
+        data = json.loads(response_text)
+    except ValueError:
+        data = None
+    if data is not None:
+        problem = _root_problem(data)
+        if problem is not None:
+            print(f"Error: {problem}")
             return None
+        actions = []
+        for value in data["actions"]:
+            problem = _action_problem(value)
+            if problem is not None:
+                print(f"Warning: {problem}")
+            else:
+                actions.append(CodeAction(**value))
+        return GeminiResponse(overall_explanation=data["overall_explanation"], actions=actions)
 
-        for action in data["actions"]:
-            if not all(k in action for k in ["action_type", "file_path", "code", "explanation"]):
-                print(f"Error: An action is missing required keys. Action: {action}")
-                return None
-
-        # If everything looks good, we return the structured data.
-        # The **data syntax unpacks the dictionary into arguments for the TypedDict.
-        return GeminiResponse(**data)
-
-    except json.JSONDecodeError as e:
-        print(f"Error: Failed to decode JSON from the extracted text: {e}")
-        print(f"--- Extracted Text ---\n{json_str}\n---------------------")
-        return None
-    except TypeError as e:
-        print(f"Error: JSON structure does not match GeminiResponse TypedDict: {e}")
-        print(f"--- Parsed Data ---\n{data}\n---------------------")
-        return None
\ No newline at end of file
+    parser = IncrementalResponseParser()
+    parser.feed(response_text)
+    return parser.close()
@@ -0,0 +1,159 @@
+# ai_client/scheduler.py
+import heapq
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from config import settings
+
+# Lower runs first.
+INTERACTIVE = 0
+BACKGROUND = 10
+
+
+class RequestCancelled(Exception):
+    """Raised inside a job (by `RequestHandle.check`) once its request has been cancelled."""
+
+
+class RequestHandle:
+    """A queued or running job. `state` is "queued", "running", "done", "failed" or "cancelled"."""
+
+    def __init__(self, request_id: int, name: str, priority: int):
+        self.request_id = request_id
+        self.name = name
+        self.priority = priority
+        self.state = "queued"
+        self.future: Future = Future()
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check(self):
+        """Jobs call this between steps; it raises RequestCancelled once the request is cancelled."""
+        if self._cancel_event.is_set():
+            raise RequestCancelled(f"Request {self.request_id} was cancelled.")
+
+    def cancel(self) -> bool:
+        """Cancels the request: a queued one never starts, a running one stops at its next check."""
+        if self.state in ("done", "failed", "cancelled"):
+            return False
+        self._cancel_event.set()
+        return True
+
+
+class RequestScheduler:
+    """
+    Runs model requests on a bounded pool of threads, highest priority first, FIFO within a priority.
+
+    At most `max_queue` requests may wait; `submit` raises queue.Full beyond that. Jobs get their
+    RequestHandle and should call `handle.check()` between steps so cancellation takes effect.
+    `listener(handle)` is told about every state change (from the scheduler's threads).
+    """
+
+    def __init__(self, workers: int | None = None, max_queue: int | None = None, listener=None):
+        self.workers = settings.SCHEDULER_WORKERS if workers is None else workers
+        self.max_queue = settings.SCHEDULER_MAX_QUEUE if max_queue is None else max_queue
+        self.listener = listener
+        self._heap: list[tuple[int, int, RequestHandle, object]] = []
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._idle = 0
+        self._running: dict[int, RequestHandle] = {}
+        self._closed = False
+
+    def submit(self, fn, name: str = "", priority: int = INTERACTIVE) -> RequestHandle:
+        """Queues `fn(handle)`; its return value (or exception) ends up in `handle.future`."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("The scheduler has been shut down.")
+            waiting = sum(1 for _, _, h, _ in self._heap if not h.cancelled)
+            if waiting >= self.max_queue:
+                raise queue.Full(f"{waiting} requests are already waiting.")
+            seq = next(self._ids)
+            handle = RequestHandle(seq, name, priority)
+            heapq.heappush(self._heap, (priority, seq, handle, fn))
+            if self._idle == 0 and len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"request-{len(self._threads) + 1}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            else:
+                self._cond.notify()
+        self._notify(handle)
+        return handle
+
+    def pending(self) -> list[RequestHandle]:
+        with self._cond:
+            return [h for _, _, h, _ in sorted(self._heap) if not h.cancelled]
+
+    def running(self) -> list[RequestHandle]:
+        with self._cond:
+            return list(self._running.values())
+
+    def _notify(self, handle: RequestHandle):
+        if self.listener is not None:
+            try:
+                self.listener(handle)
+            except Exception as e:
+                print(f"Warning: request listener failed: {e}")
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._idle += 1
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                self._idle -= 1
+                if self._closed and not self._heap:
+                    return
+                _, _, handle, fn = heapq.heappop(self._heap)
+                if handle.cancelled:
+                    handle.state = "cancelled"
+                    handle.future.cancel()
+                else:
+                    handle.state = "running"
+                    handle.future.set_running_or_notify_cancel()
+                    self._running[handle.request_id] = handle
+            if handle.state == "cancelled":
+                self._notify(handle)
+                continue
+
+            self._notify(handle)
+            try:
+                result = fn(handle)
+            except RequestCancelled as e:
+                handle.state = "cancelled"
+                handle.future.set_exception(e)
+            except Exception as e:
+                handle.state = "failed"
+                handle.future.set_exception(e)
+            else:
+                handle.state = "cancelled" if handle.cancelled else "done"
+                handle.future.set_result(result)
+            with self._cond:
+                self._running.pop(handle.request_id, None)
+            self._notify(handle)
+
+    def shutdown(self, cancel_pending: bool = True, wait: bool = False, timeout: float | None = None) -> bool:
+        """
+        Stops taking requests and cancels the running ones (and the queued ones with `cancel_pending`).
+        With `wait`, joins the threads, for at most `timeout` seconds in all. Returns False if some
+        are still running (a model call that doesn't check for cancellation until it returns).
+        """
+        with self._cond:
+            self._closed = True
+            if cancel_pending:
+                for _, _, handle, _ in self._heap:
+                    handle.cancel()
+            for handle in self._running.values():
+                handle.cancel()
+            self._cond.notify_all()
+        if not wait:
+            return not any(thread.is_alive() for thread in self._threads)
+        end = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if end is None else max(end - time.monotonic(), 0))
+        return not any(thread.is_alive() for thread in self._threads)
@@ -0,0 +1,249 @@
+# benchmarks/run.py
+"""
+End-to-end benchmarks over synthetic projects.
+
+    python -m benchmarks.run --scales 1k,50k --shapes wide,deep --out results.json
+    python -m benchmarks.run --scales 1k --compare results.json   # exit code 1 on regressions
+
+Every stage is run --repeat times per project; the results (min/median/max seconds, plus sizes)
+are written as JSON so runs of different versions can be compared.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from config import settings
+from benchmarks.synthetic import generate_project, parse_scale
+
+
+def _timed(fn, repeat: int) -> tuple[list[float], object]:
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def _result(scale: str, shape: str, stage: str, times: list[float], **extra) -> dict:
+    return {"scale": scale, "shape": shape, "stage": stage, "runs": len(times), "min": round(min(times), 6),
+            "median": round(statistics.median(times), 6), "max": round(max(times), 6), **extra}
+
+
+def _response(actions: int, chars_per_action: int, paths: list[str]) -> str:
+    code = ("x = 1\n" * (chars_per_action // 6))[:chars_per_action]
+    return json.dumps({
+        "overall_explanation": "Synthetic response.",
+        "actions": [{"action_type": "UPDATE", "file_path": paths[i % len(paths)], "code": code,
+                     "explanation": f"Synthetic change {i}."} for i in range(actions)],
+    })
+
+
+def bench_project(root: str, scale: str, shape: str, repeat: int) -> list[dict]:
+    from ai_client.context_compressor import compressor
+    from ai_client.fake_backend import FakeBackend
+    from ai_client.prompt_builder import build_prompt
+    from ai_client.rate_limit import RateLimiter
+    from ai_client.resilient_client import ResilientClient
+    from ai_client.response_parser import IncrementalResponseParser, parse_gemini_response
+    from core.file_system_manager import FileSystemManager, get_project_structure_str
+    from core.project_manager import ProjectManager
+    from schemas.ai_schemas import GeminiResponse
+
+    results = []
+    rng = random.Random(1)
+
+    # --- Project tree ---
+    start = time.perf_counter()
+    project = ProjectManager(root)
+    tree = project.get_structure_string()
+    results.append(_result(scale, shape, "tree.cold", [time.perf_counter() - start], chars=len(tree)))
+    times, tree = _timed(project.get_structure_string, repeat)
+    results.append(_result(scale, shape, "tree.warm", times, chars=len(tree)))
+    times, walked = _timed(lambda: get_project_structure_str(root, ignored=settings.IGNORED_PATH), repeat)
+    results.append(_result(scale, shape, "tree.walk", times, chars=len(walked)))
+
+    # --- File reads ---
+    paths = sorted(project.tree_index.iter_files())
+    sample = rng.sample(paths, min(200, len(paths)))
+
+    def cold_reads():
+        project.file_cache.clear()
+        return [project.read_file(path) for path in sample]
+
+    def cold_bulk_read():
+        project.file_cache.clear()
+        return list(project.read_files(sample).values())
+    times, contents = _timed(cold_reads, repeat)
+    results.append(_result(scale, shape, "read_file", times, files=len(sample),
+                           chars=sum(len(c or "") for c in contents)))
+    times, _ = _timed(lambda: [project.read_file(path) for path in sample], repeat)
+    results.append(_result(scale, shape, "read_file.warm", times, files=len(sample)))
+    times, _ = _timed(cold_bulk_read, repeat)
+    results.append(_result(scale, shape, "read_files", times, files=len(sample)))
+
+    # --- Prompt ---
+    relevant = {path: project.read_file(path) or "" for path in sample[:20]}
+    history = "\n".join(f"USER: request {i}\nMODEL: answer {i}" for i in range(50))
+    times, prompt = _timed(lambda: build_prompt(tree, "Add type hints to every helper.", history, relevant), repeat)
+    results.append(_result(scale, shape, "build_prompt", times, chars=len(prompt)))
+
+    def cold_skeletons():
+        compressor.clear()
+        return [compressor.skeleton(path, content) for path, content in relevant.items()]
+    times, skeletons = _timed(cold_skeletons, repeat)
+    results.append(_result(scale, shape, "skeleton", times, files=len(relevant),
+                           chars=sum(len(c) for c in relevant.values()), skeleton_chars=sum(len(s) for s in skeletons)))
+    times, _ = _timed(lambda: [compressor.skeleton(path, content) for path, content in relevant.items()], repeat)
+    results.append(_result(scale, shape, "skeleton.warm", times, files=len(relevant)))
+    tight = {path: content * 20 for path, content in relevant.items()}
+    times, prompt = _timed(lambda: build_prompt(tree, "Add type hints to every helper.", history, tight), repeat)
+    results.append(_result(scale, shape, "build_prompt.oversized", times, chars=len(prompt)))
+
+    # --- Parsing large responses ---
+    for actions in (100, 2000):
+        payload = _response(actions, 2000, sample)
+        times, parsed = _timed(lambda: parse_gemini_response(payload), repeat)
+        results.append(_result(scale, shape, f"parse.{actions}", times, chars=len(payload),
+                               actions=len(parsed['actions']) if parsed else 0))
+
+        def incremental():
+            parser = IncrementalResponseParser()
+            for i in range(0, len(payload), 64):
+                parser.feed(payload[i:i + 64])
+            return parser.close()
+        times, _ = _timed(incremental, repeat)
+        results.append(_result(scale, shape, f"parse_stream.{actions}", times, chars=len(payload)))
+
+    # --- Applying batches (each run is undone, so every run starts from the same files) ---
+    fs_manager = FileSystemManager(root)
+    for batch in (1, 100):
+        actions = json.loads(_response(batch, 2000, sample))["actions"]
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ok = fs_manager.apply_actions(actions, request_id=f"bench-{batch}-{time.time_ns()}").ok
+            times.append(time.perf_counter() - start)
+            fs_manager.undo(1)
+            if not ok:
+                raise RuntimeError("Applying the benchmark batch failed.")
+        results.append(_result(scale, shape, f"apply.{batch}", times, actions=batch))
+
+    # --- The whole pipeline against a fake model ---
+    response = _response(20, 2000, sample)
+    client = ResilientClient(FakeBackend(response=response, latency=0.05, chars_per_second=0, chunk_size=256),
+                             limiter=RateLimiter(0, 0))
+
+    def pipeline():
+        structure = project.get_structure_string()
+        files = {path: project.read_file(path) or "" for path in sample[:20]}
+        text = build_prompt(structure, "Add type hints to every helper.", history, files)
+        parser = IncrementalResponseParser()
+        for chunk in client.generate_response_stream(text, GeminiResponse):
+            parser.feed(chunk)
+        parsed = parser.close()
+        ok = fs_manager.apply_actions(parsed['actions'], request_id=f"bench-pipeline-{time.time_ns()}").ok
+        fs_manager.undo(1)
+        return ok
+    times, _ = _timed(pipeline, repeat)
+    results.append(_result(scale, shape, "pipeline", times, model_latency=0.05))
+    project.tree_index.stop_watching()
+    return results
+
+
+def bench_startup(repeat: int) -> list[dict]:
+    """Cold start of the command line: `cli.py --help` (argparse only) and importing what a request needs."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    commands = {"cli.help": [sys.executable, os.path.join(root, "cli.py"), "--help"],
+                "cli.import": [sys.executable, "-c", "import cli; cli.load_modules()"]}
+    results = []
+    for stage, command in commands.items():
+        def run():
+            subprocess.run(command, cwd=root, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times, _ = _timed(run, repeat)
+        results.append(_result("-", "-", stage, times))
+    return results
+
+
+def compare(results: list[dict], baseline_path: str, tolerance: float) -> list[str]:
+    """Stages whose median got slower than the baseline's by more than `tolerance` (0.2 = 20%)."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["scale"], r["shape"], r["stage"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        old = baseline.get((r["scale"], r["shape"], r["stage"]))
+        # Sub-millisecond stages are too noisy to compare.
+        if old and r["median"] > old["median"] * (1 + tolerance) and r["median"] - old["median"] > 0.001:
+            regressions.append(f"{r['scale']}/{r['shape']} {r['stage']}: {old['median']:.4f}s -> {r['median']:.4f}s")
+    return regressions
+
+
+def _version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the assistant's pipeline on synthetic projects.")
+    parser.add_argument("--scales", default="1k,50k", help="project sizes in files, e.g. 1k,50k,500k")
+    parser.add_argument("--shapes", default="wide,deep", help="wide (few huge folders) and/or deep (nested folders)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workdir", help="where projects are generated and kept between runs (default: a temp dir)")
+    parser.add_argument("--out", help="write the results here as JSON (default: stdout)")
+    parser.add_argument("--compare", help="results of an earlier run; exit with 1 if a stage got slower")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    from core.tracing import tracer
+    tracer.path = ""  # keep the spans of the run in memory; they are added to the results
+    workdir = args.workdir or tempfile.mkdtemp(prefix="code_assistant_bench_")
+    results = bench_startup(args.repeat)
+    for r in results:
+        print(f"startup: {r['stage']:<13} median {r['median'] * 1000:9.2f} ms", file=sys.stderr)
+    for scale in args.scales.split(","):
+        for shape in args.shapes.split(","):
+            root = os.path.join(workdir, f"{scale}_{shape}")
+            start = time.perf_counter()
+            generate_project(root, parse_scale(scale), shape)
+            print(f"{scale}/{shape}: project ready in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+            # The managers report every file they write on stdout; that would drown the results.
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                project_results = bench_project(root, scale, shape, args.repeat)
+            for r in project_results:
+                print(f"  {r['stage']:<22} median {r['median'] * 1000:9.2f} ms", file=sys.stderr)
+                results.append(r)
+
+    report = {
+        "meta": {"version": _version(), "python": platform.python_version(), "platform": platform.platform(),
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": args.repeat},
+        "results": results,
+        "spans": tracer.snapshot(),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# benchmarks/synthetic.py
+import json
+import os
+import random
+
+_MARKER = ".synthetic.json"
+
+
+def parse_scale(text: str) -> int:
+    """"1k" -> 1000, "500k" -> 500000, "2m" -> 2000000."""
+    text = text.strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * factor)
+
+
+def _directories(files: int, shape: str) -> list[str]:
+    """
+    "wide": a few huge directories (1000 files each, side by side);
+    "deep": a binary tree of nested directories, twelve levels down, files spread over all of them.
+    """
+    if shape == "wide":
+        return [f"pkg_{i:04d}" for i in range(max(1, -(-files // 1000)))]
+    if shape == "deep":
+        dirs = [""]
+        frontier = [""]
+        for depth in range(12):
+            if len(dirs) * 4 > files:
+                break
+            frontier = [f"{parent}/d{depth}_{k}".lstrip("/") for parent in frontier for k in range(2)]
+            dirs.extend(frontier)
+        return dirs
+    raise ValueError(f"Unknown shape {shape!r} (expected 'wide' or 'deep').")
+
+
+def _module(rng: random.Random, name: str, others: list[str]) -> str:
+    imports = "\n".join(f"from {other.replace('/', '.')} import helper_{other.rsplit('/', 1)[-1]}"
+                        for other in rng.sample(others, min(3, len(others))))
+    body = "\n\n".join(
+        f"def helper_{name}_{i}(value: int) -> int:\n"
+        f"    \"\"\"Synthetic helper {i} of {name}.\"\"\"\n"
+        f"    total = value * {rng.randint(2, 99)}\n"
+        f"    for step in range({rng.randint(2, 9)}):\n"
+        f"        total += step\n"
+        f"    return total\n"
+        for i in range(rng.randint(2, 6)))
+    return (f"# {name}.py (synthetic)\nimport os\n{imports}\n\n\n"
+            f"class {name.title().replace('_', '')}:\n    limit = {rng.randint(1, 1000)}\n\n\n{body}")
+
+
+def generate_project(root: str, files: int, shape: str = "wide", seed: int = 0) -> str:
+    """
+    Writes a synthetic Python project of `files` modules under `root`, reproducibly for a given
+    seed. A project already generated with the same parameters is reused.
+    """
+    params = {"files": files, "shape": shape, "seed": seed}
+    marker = os.path.join(root, _MARKER)
+    try:
+        with open(marker, "r", encoding="utf-8") as f:
+            if json.load(f) == params:
+                return root
+    except (OSError, ValueError):
+        pass
+
+    rng = random.Random(seed)
+    dirs = _directories(files, shape)
+    modules = [f"{dirs[i % len(dirs)]}/mod_{i:06d}".lstrip("/") for i in range(files)]
+    made = set()
+    for i, module in enumerate(modules):
+        directory = os.path.join(root, os.path.dirname(module))
+        if directory not in made:
+            os.makedirs(directory, exist_ok=True)
+            made.add(directory)
+        neighbours = modules[max(0, i - 50):i]
+        with open(os.path.join(root, module + ".py"), "w", encoding="utf-8") as f:
+            f.write(_module(rng, os.path.basename(module), neighbours))
+    with open(os.path.join(root, ".gitignore"), "w", encoding="utf-8") as f:
+        f.write("build/\n*.log\n")
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(params, f)
+    return root
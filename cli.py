@@ -0,0 +1,200 @@
+# cli.py
+"""
+The assistant without a window, for scripts and CI.
+
+    python cli.py "Add type hints to utils.py" --project ~/code/app
+    python cli.py --batch tasks.jsonl --concurrency 4 --out results.jsonl --apply
+
+A batch is a JSON-lines file of tasks: {"query", "id", "project", "pinned_files", "overrides", "apply", "plan"}
+(only "query" is required; the others default to the line number and the command-line options).
+Every task is answered with one JSON line: its id, whether it succeeded, the model's explanation,
+the proposed actions and, with --apply, whether they were written.
+
+Only argparse is imported up front: the managers, the model client (and the SDK behind it) are
+loaded once the first task is about to run, so `--help` and bad arguments return at once.
+`python -m benchmarks.run` measures that cold start (stages cli.help and cli.import).
+"""
+import argparse
+import contextlib
+import json
+import sys
+import threading
+import time
+
+_STARTED = time.perf_counter()
+
+
+def load_modules() -> dict:
+    """Imports everything a request needs (but not PyQt6), and returns it by name."""
+    from ai_client.backends import create_backend
+    from ai_client.errors import Deadline
+    from ai_client.pipeline import RequestPipeline
+    from ai_client.resilient_client import ResilientClient
+    from ai_client.response_cache import CachedClient
+    from ai_client.scheduler import RequestScheduler
+    from config import settings
+    from core.tracing import tracer
+    from core.workspace import Workspace
+    return locals()
+
+
+def _read_tasks(args):
+    """Yields (line number, task) pairs; a bad line becomes a task that fails with its error."""
+    if args.batch is None:
+        yield 1, {"id": "1", "query": args.query}
+        return
+    with open(args.batch, "r", encoding="utf-8") if args.batch != "-" else contextlib.nullcontext(sys.stdin) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                task = json.loads(line)
+                if not isinstance(task, dict) or not str(task.get("query") or "").strip():
+                    raise ValueError("expected an object with a non-empty 'query'")
+            except ValueError as e:
+                task = {"error": f"line {number}: {e}"}
+            yield number, task
+
+
+class BatchRunner:
+    """
+    Runs tasks through RequestPipelines on a RequestScheduler, at most `concurrency` at a time.
+    Projects are roots of a Workspace, shared by their tasks (and closed when unused for a while,
+    so a batch over many projects stays within WORKSPACE_MAX_LOADED_ROOTS); actions are applied
+    one batch at a time per project, like the GUI's ApplyWorker does.
+    """
+
+    def __init__(self, modules: dict, client, default_project: str, apply: bool, concurrency: int, out,
+                 plan: bool = False):
+        self.m = modules
+        self.client = client
+        self.default_project = default_project
+        self.apply = apply
+        self.plan = plan
+        self.concurrency = concurrency
+        self.out = out
+        self.counts = {"ok": 0, "failed": 0}
+        self.workspace = modules["Workspace"](roots=[])
+        self._apply_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _root_name(self, project: str) -> str:
+        """A task's project is a root name or a folder (added as a root)."""
+        if project in self.workspace.names():
+            return project
+        return self.workspace.add_root(project)
+
+    def _write(self, result: dict):
+        line = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self.counts["ok" if result["ok"] else "failed"] += 1
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def run_task(self, task_id: str, task: dict, handle=None) -> dict:
+        settings, tracer = self.m["settings"], self.m["tracer"]
+        start = time.perf_counter()
+        result = {"id": task_id, "ok": False, "project": task.get("project") or self.default_project}
+        try:
+            if "error" in task:
+                raise ValueError(task["error"])
+            name = self._root_name(result["project"])
+            with self._lock:
+                apply_lock = self._apply_locks.setdefault(name, threading.Lock())
+            deadline = self.m["Deadline"](settings.MODEL_REQUEST_DEADLINE)
+
+            def check():
+                if handle is not None:
+                    handle.check()
+                deadline.check()
+
+            with tracer.trace(f"task-{task_id}", query_chars=len(task["query"])), self.workspace.use(name) as root:
+                pipeline = self.m["RequestPipeline"](self.client, root.project_manager, None,
+                                                     pinned_files=task.get("pinned_files"),
+                                                     overrides=task.get("overrides"), deadline=deadline, check=check,
+                                                     plan=task.get("plan", self.plan))
+                parsed = pipeline.run(task["query"])
+                result.update(explanation=parsed["overall_explanation"], actions=parsed["actions"],
+                              prompt_tokens=pipeline.prompt_report["total"]["used"])
+                if task.get("apply", self.apply) and parsed["actions"]:
+                    with apply_lock:
+                        applied = root.fs_manager.apply_actions(parsed["actions"], label=task["query"][:80],
+                                                                request_id=f"cli-{task_id}-{time.time_ns()}")
+                    result["applied"] = applied.ok
+                    if not applied.ok:
+                        raise RuntimeError(f"Applying the actions failed: {applied.error}")
+            result["ok"] = True
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        self._write(result)
+        return result
+
+    def run(self, tasks) -> int:
+        scheduler = self.m["RequestScheduler"](workers=self.concurrency, max_queue=2 * self.concurrency)
+        # Tasks are read as slots free up, so a long batch never sits in memory.
+        slots = threading.BoundedSemaphore(2 * self.concurrency)
+        handles = []
+        try:
+            for number, task in tasks:
+                slots.acquire()
+                task_id = str(task.get("id", number))
+                handle = scheduler.submit(lambda h, i=task_id, t=task: self.run_task(i, t, h), name=task_id)
+                handle.future.add_done_callback(lambda _: slots.release())
+                handles.append(handle)
+            for handle in handles:
+                with contextlib.suppress(Exception):
+                    handle.future.result()
+        except KeyboardInterrupt:
+            print("Interrupted: cancelling the remaining tasks.", file=sys.stderr)
+            scheduler.shutdown(cancel_pending=True, wait=True)
+            return 130
+        finally:
+            self.workspace.close()
+        scheduler.shutdown(cancel_pending=False)
+        return 0 if self.counts["failed"] == 0 else 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the coding assistant without its window.")
+    parser.add_argument("query", nargs="?", help="one request (or use --batch)")
+    parser.add_argument("--batch", metavar="FILE", help="JSON-lines file of tasks ('-' for stdin)")
+    parser.add_argument("--project", help="project the tasks run on (default: BASE_PROJECT_PATH)")
+    parser.add_argument("--apply", action="store_true", help="write the proposed changes (default: only report them)")
+    parser.add_argument("--plan", action="store_true", help="plan every task per file, then request the files concurrently")
+    parser.add_argument("--concurrency", type=int, default=None, help="tasks run at once (default: SCHEDULER_WORKERS)")
+    parser.add_argument("--backend", help="gemini, replay or http (default: MODEL_BACKEND)")
+    parser.add_argument("--no-cache", action="store_true", help="don't answer from the response cache")
+    parser.add_argument("--out", help="write the results here (default: stdout)")
+    parser.add_argument("--trace", metavar="FILE", help="append the spans of every task to this JSON-lines file")
+    args = parser.parse_args(argv)
+    if (args.query is None) == (args.batch is None):
+        parser.error("give either a query or --batch FILE")
+
+    m = load_modules()
+    settings, tracer = m["settings"], m["tracer"]
+    tracer.path = args.trace or ""
+    client = m["ResilientClient"](m["create_backend"](args.backend))
+    if settings.RESPONSE_CACHE_ENABLED and not args.no_cache:
+        client = m["CachedClient"](client)
+    concurrency = max(1, args.concurrency or settings.SCHEDULER_WORKERS)
+    startup = time.perf_counter() - _STARTED
+
+    out = open(args.out, "a", encoding="utf-8") if args.out else sys.stdout
+    runner = BatchRunner(m, client, args.project or settings.BASE_PROJECT_PATH, args.apply, concurrency, out,
+                         plan=args.plan)
+    start = time.perf_counter()
+    try:
+        # The managers report what they do on stdout, which may be carrying the results.
+        with contextlib.redirect_stdout(sys.stderr):
+            code = runner.run(_read_tasks(args))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{runner.counts['ok']} ok, {runner.counts['failed']} failed in {time.perf_counter() - start:.2f}s "
+          f"(startup {startup:.3f}s)", file=sys.stderr)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,32 +14,208 @@ BASE_PROJECT_PATH = "/home/dev/Desktop/sandbox/my-app"
 # --- For testing purposes, we'll keep these for now ---
 # We will replace this with a dynamic path later
 # BASE_PROJECT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-IGNORED_PATH = {'node_modules', '.venv', '.idea', '__pycache__', '.git', 'code-chat-assistant.egg-info'}
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+# Folder (inside the edited project) where the assistant keeps its indexes and caches.
+ASSISTANT_DATA_DIR = ".code_assistant"
+IGNORED_PATH = {'node_modules', '.venv', '.idea', '__pycache__', '.git', 'code-chat-assistant.egg-info', ASSISTANT_DATA_DIR}
+
+# --- Workspace ---
+# The project folders the assistant works on; the first one is shown at start. More can be added in the window (for the session).
+WORKSPACE_ROOTS = [BASE_PROJECT_PATH]
+# At most this many roots keep their trees, indexes and file caches in memory (least recently used are closed first).
+WORKSPACE_MAX_LOADED_ROOTS = 4
+# Roots not used for this many seconds are closed; they are reloaded on their next use. 0 keeps them open.
+WORKSPACE_IDLE_SECONDS = 15 * 60
+
+# --- Project tree index ---
+# How often (in seconds) the polling watcher re-checks directory mtimes when inotify is not available.
+TREE_POLL_INTERVAL = 2.0
+# Honour .gitignore files when walking the project.
+TREE_USE_GITIGNORE = True
+# Budgets for the tree sent in prompts. Anything beyond them is summarised as "... (N more files)".
+# Set a budget to None to disable it.
+TREE_MAX_DEPTH = 12
+TREE_MAX_ENTRIES_PER_DIR = 200
+TREE_MAX_TOTAL_ENTRIES = 5000
+# Threads used to list directories in parallel on large trees.
+TREE_WALK_WORKERS = 8
+
+# --- File reads (ProjectManager.read_file) ---
+# Recently read files are kept decoded in memory up to this many characters.
+FILE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Larger files are read as their first and last lines only (2/3 head, 1/3 tail of this size).
+FILE_READ_MAX_BYTES = 1024 * 1024
+# How much of a file is inspected to skip binary and minified files.
+FILE_SNIFF_BYTES = 8192
+# Files whose lines average more than this many bytes are treated as minified.
+FILE_MINIFIED_LINE_LENGTH = 1000
+# Threads used by read_files.
+FILE_READ_WORKERS = 8
+
+# --- Retrieval (find_relevant_files) ---
+# Files are indexed in chunks of this many lines.
+RETRIEVAL_CHUNK_LINES = 60
+# Larger files are not indexed at all.
+RETRIEVAL_MAX_FILE_BYTES = 512 * 1024
+# How many files are attached to a prompt.
+RETRIEVAL_TOP_K = 5
+# A full stat sweep of the project runs (in the background) at most this often; files the assistant writes are re-indexed right away.
+RETRIEVAL_REFRESH_SECONDS = 30.0
+# Query terms found in more than this share of all chunks are not scored (the rarest one is kept if all are).
+RETRIEVAL_COMMON_TERM_SHARE = 0.25
+
+# --- Python symbol index ---
+# A file that defines a symbol named in the request is sent whole up to this many lines, as excerpts beyond.
+SYMBOL_WHOLE_FILE_LINES = 400
+# How many calling functions are attached for each mentioned symbol.
+SYMBOL_MAX_CALLERS = 5
+
+# --- Import graph ---
+# How many import edges away from the relevant files to look for neighbouring modules.
+DEPENDENCY_HOPS = 2
+# Total size of the neighbouring modules added to a prompt.
+DEPENDENCY_CONTEXT_BYTES = 48 * 1024
+
+# --- Prompt budget ---
+# Upper bound for the whole prompt, in (estimated) tokens.
+PROMPT_TOKEN_BUDGET = 60000
+# Used by the local token estimator; code averages roughly 3-4 characters per token.
+PROMPT_CHARS_PER_TOKEN = 3.5
+# Shares of the budget left after the instructions; whatever the tree and history don't use goes to files.
+PROMPT_TREE_SHARE = 0.15
+PROMPT_HISTORY_SHARE = 0.15
+# A file is only cut down to an excerpt if at least this many tokens are left for it.
+PROMPT_MIN_FILE_TOKENS = 200
+
+# --- Context compression (files that don't fit the prompt whole) ---
+# String literals longer than this are shortened to half of it, and lines cut after CONTEXT_LONG_LINE_CHARS.
+CONTEXT_LONG_LITERAL_CHARS = 200
+CONTEXT_LONG_LINE_CHARS = 400
+# Lines kept around each line mentioning the request; terms found on more than this share of a
+# file's lines are too common to mark anything.
+CONTEXT_FOCUS_LINES = 3
+CONTEXT_FOCUS_MAX_SHARE = 0.05
+# File outlines and skeletons memoized by content hash.
+CONTEXT_CACHE_ENTRIES = 4096
+
+# --- Response cache ---
+# Identical requests (same model, config, schema and prompt) are answered from disk.
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "code_assistant", "responses")
+# Least recently used entries are evicted above this size.
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Entries older than this (in seconds) are ignored. 0 disables expiry.
+RESPONSE_CACHE_TTL = 7 * 24 * 3600
+
+# --- Streaming ---
+# Stream the model's answer and hand over each action as soon as it is complete.
+STREAMING_ENABLED = True
+# True: apply streamed actions right away. False: only preview them, apply once the response is complete.
+STREAM_AUTO_APPLY = True
+
+# --- Patching ---
+# PATCH actions: how similar (0-1, difflib ratio) a SEARCH block must be to the file when it
+# doesn't match exactly or up to whitespace. Below this the hunk is reported as a conflict.
+PATCH_FUZZY_THRESHOLD = 0.9
+
+# --- Applying actions ---
+# Threads used to stage the files of a batch.
+APPLY_WORKERS = 8
+# fsync staged files, the journal and the touched directories before reporting a batch as applied.
+APPLY_FSYNC = True
+# What to do with a batch interrupted by a crash: "rollback" (restore the old files) or "replay" (finish it).
+APPLY_RECOVERY_MODE = "rollback"
+
+# --- Undo snapshots ---
+# Pre-images of changed files are kept under ASSISTANT_DATA_DIR/snapshots. The oldest requests are
+# forgotten beyond either limit.
+SNAPSHOT_MAX_REQUESTS = 100
+SNAPSHOT_MAX_BYTES = 128 * 1024 * 1024
+
+# --- Chat view ---
+# Messages kept rendered in the chat log; older ones come back a page at a time when scrolling up.
+CHAT_VIEW_MAX_RENDERED = 200
+CHAT_VIEW_PAGE = 50
+# Updates arriving within this many milliseconds are drawn together.
+CHAT_VIEW_FLUSH_MS = 50
+
+# --- File tree ---
+# Rows of a directory handed to the tree view at a time; more are added as the user scrolls.
+FILE_TREE_BATCH = 1000
+
+# --- Diff preview ---
+# Show a diff of every action and let the user accept or reject actions/hunks before anything is written.
+DIFF_PREVIEW_ENABLED = True
+# Context lines around each hunk.
+DIFF_CONTEXT_LINES = 3
+# Above this many changed lines, the exact (Myers) diff falls back to difflib's faster approximation.
+DIFF_MAX_EDIT_DISTANCE = 2000
+
+# --- Conversation history ---
+# Continue the last conversation of the project when the app starts.
+CHAT_RESUME_SESSION = True
+# Messages kept in memory; older ones are read back from ASSISTANT_DATA_DIR/chat.sqlite when needed.
+CHAT_MEMORY_MESSAGES = 200
+# Tokens of history sent with a prompt, the summary of older turns included.
+CHAT_HISTORY_TOKENS = int(PROMPT_TOKEN_BUDGET * PROMPT_HISTORY_SHARE)
+# A single message longer than this is cut in the middle.
+CHAT_MAX_MESSAGE_TOKENS = 1500
+# Size of the rolling summary of older turns, and of each of its lines.
+CHAT_SUMMARY_TOKENS = 600
+CHAT_SUMMARY_LINE_CHARS = 160
+
+# --- Request scheduler ---
+# Model requests running at the same time; the rest wait in a queue of at most SCHEDULER_MAX_QUEUE.
+SCHEDULER_WORKERS = 3
+SCHEDULER_MAX_QUEUE = 20
+# On closing the window, how long to wait for cancelled requests to stop before the projects are closed.
+SCHEDULER_SHUTDOWN_SECONDS = 5.0
+
+# --- Model requests ---
+# Client-side quota, matching the model's limits, so requests wait instead of failing with 429s. 0 disables a limit.
+MODEL_REQUESTS_PER_MINUTE = 10
+MODEL_TOKENS_PER_MINUTE = 250_000
+# Retries of rate-limited, unavailable or timed-out calls, with exponential backoff (full jitter).
+MODEL_MAX_RETRIES = 4
+MODEL_BACKOFF_BASE = 1.0
+MODEL_BACKOFF_MAX = 30.0
+# Seconds a whole request (context gathering, waits, retries and the call) may take.
+MODEL_REQUEST_DEADLINE = 180.0
+# Send a second, identical call if the first hasn't answered after this many seconds and the
+# quota allows it; the first answer wins. 0 disables hedging (it costs quota).
+MODEL_HEDGE_AFTER = 0.0
+
+# --- Planner (map-reduce requests) ---
+# A planned request first asks for a per-file plan (at most PLANNER_MAX_FILES files, in an answer of
+# at most PLANNER_PLAN_MAX_TOKENS), then sends one request per file, PLANNER_MAX_PARALLEL at a time.
+# Each shows its file within PLANNER_FILE_TOKENS and may answer with up to PLANNER_FILE_MAX_OUTPUT_TOKENS.
+# The per-file calls still go through the model quota above, so raise it along with the parallelism.
+PLANNER_MAX_FILES = 20
+PLANNER_MAX_PARALLEL = 4
+PLANNER_PLAN_MAX_TOKENS = 2048
+PLANNER_FILE_TOKENS = 20000
+PLANNER_FILE_MAX_OUTPUT_TOKENS = 8192
+
+# --- Model backend ---
+# "gemini" (the Google API), "replay" (recorded responses, in-process) or "http" (a model server,
+# e.g. `python -m ai_client.http_backend --recordings FILE`).
+MODEL_BACKEND = "gemini"
+MODEL_NAME = "gemini-2.5-flash"
+MODEL_REPLAY_FILE = os.path.join(os.path.expanduser("~"), ".cache", "code_assistant", "recordings.jsonl")
+MODEL_HTTP_URL = "http://127.0.0.1:8765"
+# Record every response of the real backend to MODEL_REPLAY_FILE, for replaying later.
+MODEL_RECORD_RESPONSES = False
+# Replay speed: seconds before the first chunk, then characters per second (0: all at once).
+FAKE_BACKEND_LATENCY = 0.5
+FAKE_BACKEND_CHARS_PER_SECOND = 2000.0
+
+# --- Tracing ---
+# Time the stages of every request (context, prompt, model call, parsing, applying).
+TRACE_ENABLED = True
+# Every finished span is appended here as a JSON line ("" to keep spans in memory only); the file
+# is rotated to TRACE_FILE + ".1" beyond TRACE_FILE_MAX_BYTES.
+TRACE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "code_assistant", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = 16 * 1024 * 1024
+# Quantiles are computed over this many recent spans of each stage.
+TRACE_HISTOGRAM_SAMPLES = 1024
+# cProfile output of requests run with profiling on.
+TRACE_PROFILE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "code_assistant", "profiles")
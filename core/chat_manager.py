@@ -1,39 +1,218 @@
 # core/chat_manager.py
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
 from typing import List, Dict
+from ai_client.prompt_builder import estimate_tokens, truncate_middle
+from config import settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY, created REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_session ON messages (session, id);
+CREATE TABLE IF NOT EXISTS summaries (
+    session INTEGER NOT NULL,
+    upto_id INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (session, upto_id)
+) WITHOUT ROWID;
+"""
+_PAGE = 50
+
+
+def _summary_line(role: str, content: str) -> str:
+    """One line standing in for an older message: its first line, shortened."""
+    first = next((line.strip() for line in content.splitlines() if line.strip()), "")
+    if len(first) > settings.CHAT_SUMMARY_LINE_CHARS:
+        first = first[:settings.CHAT_SUMMARY_LINE_CHARS - 3] + "..."
+    return f"- {role.upper()}: {first}"
 
 
 class ChatManager:
-    """Manages the state of the conversation history."""
+    """
+    Manages the state of the conversation history.
+
+    Messages are appended to an SQLite database in the project (ASSISTANT_DATA_DIR/chat.sqlite), so
+    a session survives restarts; only the last CHAT_MEMORY_MESSAGES are kept in memory. The history
+    sent with a prompt is chosen by tokens rather than by message count: the newest messages that
+    fit in CHAT_HISTORY_TOKENS (each capped at CHAT_MAX_MESSAGE_TOKENS), preceded by a rolling
+    summary of everything older. Summaries are stored too, so each prompt only summarises the
+    messages that left the window since the last one.
+    """
+
+    def __init__(self, base_path: str | None = None, db_path: str | None = None, resume: bool | None = None):
+        if db_path is None:
+            data_dir = os.path.join(os.path.abspath(base_path or settings.BASE_PROJECT_PATH), settings.ASSISTANT_DATA_DIR)
+            os.makedirs(data_dir, exist_ok=True)
+            db_path = os.path.join(data_dir, "chat.sqlite")
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript("PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;" + _SCHEMA)
+        self._lock = threading.RLock()
+        self._recent: deque = deque(maxlen=settings.CHAT_MEMORY_MESSAGES)
+        self._count = 0
+
+        resume = settings.CHAT_RESUME_SESSION if resume is None else resume
+        row = self._db.execute("SELECT MAX(id) FROM sessions").fetchone()
+        if resume and row[0] is not None:
+            self.session = row[0]
+            self._load_recent()
+        else:
+            self._new_session()
+
+    def _new_session(self):
+        with self._lock, self._db:
+            self.session = self._db.execute("INSERT INTO sessions (created) VALUES (?)", (time.time(),)).lastrowid
+        self._recent.clear()
+        self._count = 0
+
+    def _load_recent(self):
+        rows = self._db.execute(
+            "SELECT role, content FROM messages WHERE session = ? ORDER BY id DESC LIMIT ?",
+            (self.session, self._recent.maxlen)).fetchall()
+        self._recent.clear()
+        self._recent.extend({'role': role, 'content': content} for role, content in reversed(rows))
+        self._count = self._db.execute("SELECT COUNT(*) FROM messages WHERE session = ?", (self.session,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
 
-    def __init__(self):
-        # History will be a list of message dictionaries
-        # e.g., [{'role': 'user', 'content': '...'}, {'role': 'model', 'content': '...'}]
-        self.history: List[Dict[str, str]] = []
+    # --- Messages ---
 
-    def add_message(self, role: str, content: str):
-        """Adds a new message to the conversation history."""
+    def add_message(self, role: str, content: str) -> int:
+        """Adds a new message to the conversation history. Returns its id (for `remove_message`)."""
         # Basic validation
         if role not in ['user', 'model']:
             raise ValueError("Role must be 'user' or 'model'")
-        self.history.append({'role': role, 'content': content})
+        with self._lock, self._db:
+            message_id = self._db.execute(
+                "INSERT INTO messages (session, role, content, tokens, created) VALUES (?, ?, ?, ?, ?)",
+                (self.session, role, content, estimate_tokens(content), time.time())).lastrowid
+            self._recent.append({'role': role, 'content': content})
+            self._count += 1
+        return message_id
 
-    def get_formatted_history(self) -> str:
-        """Formats the history into a simple, clean, plain-text format."""
-        if not self.history:
+    def remove_message(self, message_id: int):
+        """Takes back a message, e.g. the request of one that could not be queued after all."""
+        with self._lock, self._db:
+            removed = self._db.execute("DELETE FROM messages WHERE session = ? AND id = ?",
+                                       (self.session, message_id)).rowcount
+            # Summaries reaching that far included it.
+            self._db.execute("DELETE FROM summaries WHERE session = ? AND upto_id >= ?", (self.session, message_id))
+        if removed:
+            with self._lock:
+                self._load_recent()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def last_message(self) -> Dict[str, str] | None:
+        with self._lock:
+            return dict(self._recent[-1]) if self._recent else None
+
+    def recent_messages(self, limit: int | None = None) -> List[Dict[str, str]]:
+        """The newest `limit` messages, oldest first (from memory when they fit)."""
+        limit = self._count if limit is None else min(limit, self._count)
+        with self._lock:
+            if limit <= len(self._recent):
+                return [dict(m) for m in list(self._recent)[len(self._recent) - limit:]]
+            rows = self._db.execute(
+                "SELECT role, content FROM messages WHERE session = ? ORDER BY id DESC LIMIT ?",
+                (self.session, limit)).fetchall()
+        return [{'role': role, 'content': content} for role, content in reversed(rows)]
+
+    @property
+    def history(self) -> List[Dict[str, str]]:
+        """The whole session, read from disk. Prefer `recent_messages`/`last_message`."""
+        return self.recent_messages()
+
+    def _iter_newest_first(self):
+        """(id, role, content, tokens) of the session's messages, newest first, a page at a time."""
+        before = None
+        while True:
+            with self._lock:
+                if before is None:
+                    rows = self._db.execute(
+                        "SELECT id, role, content, tokens FROM messages WHERE session = ? ORDER BY id DESC LIMIT ?",
+                        (self.session, _PAGE)).fetchall()
+                else:
+                    rows = self._db.execute(
+                        "SELECT id, role, content, tokens FROM messages WHERE session = ? AND id < ? "
+                        "ORDER BY id DESC LIMIT ?", (self.session, before, _PAGE)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            before = rows[-1][0]
+
+    # --- Summaries ---
+
+    def _summary_upto(self, upto_id: int) -> str:
+        """The rolling summary of every message up to `upto_id`, extending the newest cached one."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT upto_id, summary FROM summaries WHERE session = ? AND upto_id <= ? "
+                "ORDER BY upto_id DESC LIMIT 1", (self.session, upto_id)).fetchone()
+            start, summary = row if row else (0, "")
+            if start == upto_id:
+                return summary
+            rows = self._db.execute(
+                "SELECT role, content FROM messages WHERE session = ? AND id > ? AND id <= ? ORDER BY id",
+                (self.session, start, upto_id)).fetchall()
+            lines = summary.splitlines() if summary else []
+            lines.extend(_summary_line(role, content) for role, content in rows)
+            # Keep the summary itself bounded: the oldest lines go first.
+            while len(lines) > 1 and estimate_tokens("\n".join(lines)) > settings.CHAT_SUMMARY_TOKENS:
+                lines.pop(0)
+            summary = "\n".join(lines)
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO summaries (session, upto_id, summary) VALUES (?, ?, ?)",
+                                 (self.session, upto_id, summary))
+            return summary
+
+    def get_formatted_history(self, token_budget: int | None = None) -> str:
+        """
+        Formats the history into a simple, clean, plain-text format: the newest messages that fit
+        in `token_budget`, after a short summary of the older ones.
+        """
+        if not self._count:
             return "No previous conversation history."
+        if token_budget is None:
+            token_budget = settings.CHAT_HISTORY_TOKENS
+        summary_reserve = settings.CHAT_SUMMARY_TOKENS + 20
+        remaining = token_budget - summary_reserve
 
-        # We only want to show the last few turns to keep the prompt clean
-        # You can adjust this number.
-        recent_history = self.history[-6:]
+        window = []
+        cutoff = None  # id of the newest message left out of the window
+        for message_id, role, content, tokens in self._iter_newest_first():
+            if tokens > settings.CHAT_MAX_MESSAGE_TOKENS:
+                # A huge message (e.g. a code dump) is cut down instead of crowding out the rest.
+                content = truncate_middle(content, int(settings.CHAT_MAX_MESSAGE_TOKENS * settings.PROMPT_CHARS_PER_TOKEN))
+                tokens = estimate_tokens(content)
+            line = f"{role.upper()}: {content}"
+            cost = tokens + 2
+            if cost > remaining and window:
+                cutoff = message_id
+                break
+            window.append(line)
+            remaining -= cost
 
         formatted_lines = []
-        for msg in recent_history:
-            role = msg['role'].upper()
-            content = msg['content']
-            formatted_lines.append(f"{role}: {content}")
-
+        if cutoff is not None:
+            formatted_lines.append("Summary of the earlier conversation:")
+            formatted_lines.append(self._summary_upto(cutoff))
+            formatted_lines.append("")
+        formatted_lines.extend(reversed(window))
         return "\n".join(formatted_lines)
 
     def clear_history(self):
-        """Resets the conversation."""
-        self.history = []
\ No newline at end of file
+        """Resets the conversation. The old session stays on disk; a new one is started."""
+        self._new_session()
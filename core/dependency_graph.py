@@ -0,0 +1,299 @@
+# core/dependency_graph.py
+import os
+import posixpath
+import re
+import threading
+import time
+from collections import defaultdict
+from config import settings
+from core.symbol_index import SymbolIndex
+
+_JS_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs")
+_JS_IMPORT_RE = re.compile(
+    r"""(?:^|[;\s])(?:import|export)\s+(?:[\w*{}\s,$]+?\s+from\s+)?['"]([^'"]+)['"]"""
+    r"""|(?:require|import)\s*\(\s*['"]([^'"]+)['"]\s*\)""",
+    re.MULTILINE,
+)
+
+
+def _module_name(rel_path: str) -> str:
+    """"core/math_util.py" -> "core.math_util", "core/__init__.py" -> "core"."""
+    name = rel_path[:-3].replace("/", ".")
+    return name[:-len(".__init__")] if name.endswith(".__init__") else name
+
+
+class DependencyGraph:
+    """
+    A module-level import graph of the project (Python, plus JS/TS `import`/`require`).
+
+    Python edges come straight from the SymbolIndex, so they share its content-hash cache;
+    JS/TS files are scanned with a regex and cached by (mtime, size). Only files whose
+    imports changed touch the graph, and both directions are kept for k-hop queries.
+    Edge weight = how many names one file imports from the other.
+
+    `update()` is cheap enough for the request path: it only looks at the files flagged by
+    `mark_dirty` (FileSystemManager writes, and files the SymbolIndex re-parsed), and lists the
+    project again only when `tree_version()` says the set of files changed. Changes made outside
+    the assistant are picked up by a full rescan in the background, every RETRIEVAL_REFRESH_SECONDS.
+    """
+
+    def __init__(self, base_path: str, list_files, symbol_index: SymbolIndex, tree_version=None):
+        self.base_path = os.path.abspath(base_path)
+        self.list_files = list_files
+        # Returns a number that changes whenever `list_files` would; None lists on every update.
+        self.tree_version = tree_version
+        self.symbol_index = symbol_index
+        self._lock = threading.RLock()
+        # path -> {imported path: weight}, and the reverse direction
+        self._out: dict[str, dict[str, int]] = {}
+        self._in: dict[str, dict[str, int]] = defaultdict(dict)
+        # path -> the cache key its edges were computed from (content hash or (mtime, size))
+        self._keys: dict[str, object] = {}
+        self._modules: dict[str, str] = {}
+        self._suffixes: dict[str, str | None] = {}
+        self._files: set[str] = set()
+        self._listed_version = None
+        # Its own lock: the SymbolIndex reports changes while holding its lock, and update()
+        # holds ours while asking the SymbolIndex.
+        self._dirty: set[str] = set()
+        self._dirty_lock = threading.Lock()
+        self._last_full_update = 0.0
+        self._sweeping = False
+        self._closed = False
+        symbol_index.add_change_listener(self.mark_dirty)
+
+    # --- Module resolution ---
+
+    def _index_modules(self, files: list[str]):
+        modules, suffixes = {}, {}
+        for rel_path in files:
+            if not rel_path.endswith(".py"):
+                continue
+            name = _module_name(rel_path)
+            modules[name] = rel_path
+            # "src/pkg/mod.py" must also answer to "pkg.mod"; ambiguous suffixes resolve to nothing.
+            parts = name.split(".")
+            for start in range(1, len(parts)):
+                suffix = ".".join(parts[start:])
+                suffixes[suffix] = None if suffix in suffixes and suffixes[suffix] != rel_path else rel_path
+        self._modules, self._suffixes = modules, suffixes
+        self._files = set(files)
+
+    def _resolve_python(self, importer: str, module: str, name: str) -> str | None:
+        if module.startswith("."):
+            level = len(module) - len(module.lstrip("."))
+            package = _module_name(importer).split(".")
+            if not importer.endswith("__init__.py"):
+                package = package[:-1]
+            package = package[:len(package) - (level - 1)] if level > 1 else package
+            module = ".".join(package + ([module.lstrip(".")] if module.lstrip(".") else []))
+        # `from pkg import mod` may import a submodule rather than a name.
+        for candidate in (f"{module}.{name}" if module and name != module else None, module):
+            if not candidate:
+                continue
+            target = self._modules.get(candidate) or self._suffixes.get(candidate)
+            if target and target != importer:
+                return target
+        return None
+
+    def _resolve_js(self, importer: str, spec: str) -> str | None:
+        if not spec.startswith("."):
+            return None  # a package, not a project file
+        base = posixpath.normpath(posixpath.join(posixpath.dirname(importer), spec))
+        candidates = [base] + [base + ext for ext in _JS_EXTENSIONS] + [f"{base}/index{ext}" for ext in _JS_EXTENSIONS]
+        for candidate in candidates:
+            if candidate in self._files and candidate != importer:
+                return candidate
+        return None
+
+    # --- Edges ---
+
+    def _python_edges(self, rel_path: str) -> dict[str, int]:
+        edges: dict[str, int] = defaultdict(int)
+        for imp in self.symbol_index.imports_of(rel_path):
+            target = self._resolve_python(rel_path, imp.module, imp.name)
+            if target:
+                edges[target] += 1
+        return dict(edges)
+
+    def _js_edges(self, rel_path: str) -> dict[str, int]:
+        try:
+            with open(os.path.join(self.base_path, rel_path), "r", encoding="utf-8", errors="replace") as f:
+                text = f.read(settings.RETRIEVAL_MAX_FILE_BYTES)
+        except OSError:
+            return {}
+        edges: dict[str, int] = defaultdict(int)
+        for match in _JS_IMPORT_RE.finditer(text):
+            target = self._resolve_js(rel_path, match.group(1) or match.group(2))
+            if target:
+                edges[target] += 1
+        return dict(edges)
+
+    def _set_edges(self, rel_path: str, edges: dict[str, int]):
+        for target in self._out.get(rel_path, {}):
+            self._in[target].pop(rel_path, None)
+        if edges:
+            self._out[rel_path] = edges
+            for target, weight in edges.items():
+                self._in[target][rel_path] = weight
+        else:
+            self._out.pop(rel_path, None)
+
+    def mark_dirty(self, rel_path: str, *_):
+        """Flags a file whose imports may have changed (a change listener for FileSystemManager)."""
+        with self._dirty_lock:
+            self._dirty.add(rel_path.replace("\\", "/"))
+
+    def _key(self, rel_path: str):
+        if rel_path.endswith(".py"):
+            return self.symbol_index.content_hash(rel_path)
+        try:
+            st = os.stat(os.path.join(self.base_path, rel_path))
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _relist(self, files: list[str]) -> bool:
+        """Takes in a new list of the project's files. Returns whether every edge must be recomputed."""
+        def code(paths):
+            return {p for p in paths if p.endswith(".py") or p.endswith(_JS_EXTENSIONS)}
+        before = (set(self._modules), code(self._files))
+        self._index_modules(files)
+        # New or removed modules can change how *other* files resolve; start over in that case.
+        return before != (set(self._modules), code(self._files))
+
+    def _refresh(self, rel_paths) -> int:
+        """Recomputes the edges of `rel_paths` whose key changed, and drops files no longer listed."""
+        changed = 0
+        for rel_path in rel_paths:
+            if rel_path not in self._files:
+                if rel_path in self._keys or rel_path in self._out:
+                    self._keys.pop(rel_path, None)
+                    self._set_edges(rel_path, {})
+                    self._in.pop(rel_path, None)
+                    changed += 1
+                continue
+            if not rel_path.endswith(".py") and not rel_path.endswith(_JS_EXTENSIONS):
+                continue
+            key = self._key(rel_path)
+            if key is None or self._keys.get(rel_path) == key:
+                continue
+            self._keys[rel_path] = key
+            edges = self._python_edges(rel_path) if rel_path.endswith(".py") else self._js_edges(rel_path)
+            if edges != self._out.get(rel_path, {}):
+                self._set_edges(rel_path, edges)
+                changed += 1
+        return changed
+
+    def _take_in(self, files: list[str], changed) -> int:
+        """Relists the project and refreshes `changed`, or every file if modules came or went."""
+        known = set(self._files)
+        if self._relist(files):
+            self._keys.clear()
+            return self._refresh(self._files | known)
+        return self._refresh(set(changed) | (self._files ^ known))
+
+    def update(self) -> int:
+        """
+        Recomputes the edges of the flagged files, and of every file after modules were added or
+        removed. The first build, and a rescan whenever the last one is older than
+        RETRIEVAL_REFRESH_SECONDS, run in the background. Returns how many files were touched.
+        """
+        self.symbol_index.ensure_fresh()
+        with self._lock:
+            if self._closed:
+                return 0
+            if time.monotonic() - self._last_full_update > settings.RETRIEVAL_REFRESH_SECONDS and not self._sweeping:
+                self._sweeping = True
+                threading.Thread(target=self._sweep, name="dependency-sweep", daemon=True).start()
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, set()
+            if not self._last_full_update:
+                return 0  # the first sweep covers them
+            version = self.tree_version() if self.tree_version is not None else None
+            if version is None or version != self._listed_version:
+                self._listed_version = version
+                return self._take_in([p.replace("\\", "/") for p in self.list_files()], dirty)
+            return self._refresh(dirty)
+
+    def _sweep(self):
+        """
+        The full rescan, in the background: JS/TS files are stat'ed without the lock, which is
+        only taken to recompute the edges of the files that changed. Python files follow the
+        SymbolIndex, whose own sweep reports them through `mark_dirty`.
+        """
+        try:
+            version = self.tree_version() if self.tree_version is not None else None
+            files = [p.replace("\\", "/") for p in self.list_files()]
+            with self._lock:
+                if self._closed:
+                    return
+                keys = dict(self._keys)
+            changed = [p for p in files if p.endswith(_JS_EXTENSIONS) and keys.get(p) != self._key(p)]
+            with self._lock:
+                if self._closed:
+                    return
+                if not self._last_full_update:
+                    changed = files
+                self._take_in(files, changed)
+                self._listed_version = version
+                self._last_full_update = time.monotonic()
+        except Exception as e:
+            print(f"Warning: could not refresh the import graph: {e}")
+        finally:
+            self._sweeping = False
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+
+    # --- Queries ---
+
+    def imports(self, rel_path: str) -> dict[str, int]:
+        with self._lock:
+            return dict(self._out.get(rel_path, {}))
+
+    def imported_by(self, rel_path: str) -> dict[str, int]:
+        with self._lock:
+            return dict(self._in.get(rel_path, {}))
+
+    def neighbours(self, seeds, hops: int | None = None) -> list[tuple[str, float]]:
+        """
+        Files within `hops` import edges of the seed files (either direction), best first.
+        A neighbour's score is the weight of the edges leading to it, halved for every extra hop.
+        """
+        hops = settings.DEPENDENCY_HOPS if hops is None else hops
+        seeds = {s.replace("\\", "/") for s in seeds}
+        scores: dict[str, float] = defaultdict(float)
+        with self._lock:
+            frontier = {s: 1.0 for s in seeds}
+            visited = set(seeds)
+            for hop in range(hops):
+                next_frontier: dict[str, float] = defaultdict(float)
+                for path, carried in frontier.items():
+                    for edges in (self._out.get(path, {}), self._in.get(path, {})):
+                        for other, weight in edges.items():
+                            if other in seeds:
+                                continue
+                            gain = carried * weight / (2 ** hop)
+                            scores[other] += gain
+                            if other not in visited:
+                                next_frontier[other] += carried
+                visited.update(next_frontier)
+                frontier = next_frontier
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def neighbours_within_budget(self, seeds, budget_bytes: int | None = None, hops: int | None = None) -> list[str]:
+        """The best-ranked neighbours whose combined size fits in `budget_bytes`."""
+        budget_bytes = settings.DEPENDENCY_CONTEXT_BYTES if budget_bytes is None else budget_bytes
+        picked = []
+        for path, _score in self.neighbours(seeds, hops):
+            try:
+                size = os.path.getsize(os.path.join(self.base_path, path))
+            except OSError:
+                continue
+            if size > budget_bytes:
+                continue
+            picked.append(path)
+            budget_bytes -= size
+        return picked
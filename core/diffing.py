@@ -0,0 +1,163 @@
+# core/diffing.py
+import difflib
+from typing import NamedTuple
+from config import settings
+
+
+class DiffHunk(NamedTuple):
+    """A group of changes with their context. `ops` are difflib-style opcodes (tag, i1, i2, j1, j2)."""
+    a_start: int
+    a_end: int
+    b_start: int
+    b_end: int
+    ops: list
+
+    def row_count(self) -> int:
+        rows = 0
+        for tag, i1, i2, j1, j2 in self.ops:
+            rows += (i2 - i1) if tag in ("equal", "delete") else (j2 - j1) if tag == "insert" else (i2 - i1) + (j2 - j1)
+        return rows
+
+
+def _line_ids(a: list[str], b: list[str]) -> tuple[list[int], list[int]]:
+    """Maps every distinct line to a small int, so the diff compares ints instead of strings."""
+    ids: dict[str, int] = {}
+    return [ids.setdefault(line, len(ids)) for line in a], [ids.setdefault(line, len(ids)) for line in b]
+
+
+def _myers(a: list[int], b: list[int], max_d: int) -> list[tuple] | None:
+    """
+    Myers' O((N+M)D) shortest edit script. Returns opcodes relative to `a`/`b`, or None if the
+    files differ by more than `max_d` lines (the trace would get too large).
+    """
+    n, m = len(a), len(b)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []
+    for d in range(max_d + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                trace.append(v[offset - d:offset + d + 1])
+                return _backtrack(trace, n, m)
+        trace.append(v[offset - d:offset + d + 1])
+    return None
+
+
+def _backtrack(trace: list[list[int]], n: int, m: int) -> list[tuple]:
+    steps = []  # (tag, x, y) single-line edits and equal runs, in reverse order
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        prev = trace[d - 1]  # covers k in [-(d-1), d-1]
+        k = x - y
+
+        def at(kk):
+            return prev[kk + d - 1]
+
+        if k == -d or (k != d and at(k - 1) < at(k + 1)):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = at(prev_k)
+        prev_y = prev_x - prev_k
+        mid_x, mid_y = (prev_x, prev_y + 1) if prev_k == k + 1 else (prev_x + 1, prev_y)
+        if x > mid_x:
+            steps.append(("equal", mid_x, x, mid_y, y))
+        steps.append(("insert", prev_x, prev_x, prev_y, prev_y + 1) if prev_k == k + 1
+                     else ("delete", prev_x, prev_x + 1, prev_y, prev_y))
+        x, y = prev_x, prev_y
+    if x > 0:
+        steps.append(("equal", 0, x, 0, y))
+    steps.reverse()
+
+    # Merge single-line steps into opcodes; a delete run followed by an insert run is a replace.
+    ops = []
+    for tag, i1, i2, j1, j2 in steps:
+        if ops and ops[-1][0] == tag and ops[-1][2] == i1 and ops[-1][4] == j1:
+            ops[-1] = (tag, ops[-1][1], i2, ops[-1][3], j2)
+        elif ops and tag == "insert" and ops[-1][0] in ("delete", "replace") and ops[-1][2] == i1 and ops[-1][4] == j1:
+            ops[-1] = ("replace", ops[-1][1], i2, ops[-1][3], j2)
+        elif ops and tag == "insert" and ops[-1][0] == "replace" and ops[-1][4] == j1:
+            ops[-1] = ("replace", ops[-1][1], ops[-1][2], ops[-1][3], j2)
+        else:
+            ops.append((tag, i1, i2, j1, j2))
+    return ops
+
+
+def diff_opcodes(a: list[str], b: list[str]) -> list[tuple]:
+    """Line opcodes turning `a` into `b`: common head and tail are trimmed, then Myers on line ids."""
+    a_ids, b_ids = _line_ids(a, b)
+    head = 0
+    limit = min(len(a_ids), len(b_ids))
+    while head < limit and a_ids[head] == b_ids[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and a_ids[-1 - tail] == b_ids[-1 - tail]:
+        tail += 1
+    a_mid, b_mid = a_ids[head:len(a_ids) - tail], b_ids[head:len(b_ids) - tail]
+
+    if not a_mid and not b_mid:
+        inner = []
+    elif not a_mid:
+        inner = [("insert", 0, 0, 0, len(b_mid))]
+    elif not b_mid:
+        inner = [("delete", 0, len(a_mid), 0, 0)]
+    else:
+        inner = _myers(a_mid, b_mid, settings.DIFF_MAX_EDIT_DISTANCE)
+        if inner is None:
+            # Mostly rewritten: an exact shortest script isn't worth its memory here.
+            inner = difflib.SequenceMatcher(None, a_mid, b_mid, autojunk=False).get_opcodes()
+
+    ops = [("equal", 0, head, 0, head)] if head else []
+    ops += [(tag, i1 + head, i2 + head, j1 + head, j2 + head) for tag, i1, i2, j1, j2 in inner]
+    if tail:
+        ops.append(("equal", len(a) - tail, len(a), len(b) - tail, len(b)))
+    return ops
+
+
+def make_hunks(ops: list[tuple], context: int = 3) -> list[DiffHunk]:
+    """Groups opcodes into hunks with `context` lines around each change (like `diff -U`)."""
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in ops:
+        if tag == "equal":
+            if group and i2 - i1 <= 2 * context:
+                group.append((tag, i1, i2, j1, j2))
+                continue
+            if group:
+                group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+                groups.append(group)
+            group = [(tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)] if i2 > i1 else []
+            continue
+        group.append((tag, i1, i2, j1, j2))
+    if group and any(op[0] != "equal" for op in group):
+        groups.append(group)
+    hunks = []
+    for group in groups:
+        group = [op for op in group if op[1] != op[2] or op[3] != op[4]]
+        hunks.append(DiffHunk(group[0][1], group[-1][2], group[0][3], group[-1][4], group))
+    return hunks
+
+
+def hunks_to_unified(a: list[str], b: list[str], hunks: list[DiffHunk]) -> str:
+    """Renders hunks as a unified diff (the form PATCH actions accept)."""
+    out = []
+    for hunk in hunks:
+        out.append(f"@@ -{hunk.a_start + 1},{hunk.a_end - hunk.a_start} +{hunk.b_start + 1},{hunk.b_end - hunk.b_start} @@\n")
+        for tag, i1, i2, j1, j2 in hunk.ops:
+            if tag == "equal":
+                out.extend(" " + line.rstrip("\r\n") + "\n" for line in a[i1:i2])
+                continue
+            if tag in ("delete", "replace"):
+                out.extend("-" + line.rstrip("\r\n") + "\n" for line in a[i1:i2])
+            if tag in ("insert", "replace"):
+                out.extend("+" + line.rstrip("\r\n") + "\n" for line in b[j1:j2])
+    return "".join(out)
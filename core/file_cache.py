@@ -0,0 +1,151 @@
+# core/file_cache.py
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import settings
+
+
+def sniff(data: bytes, complete: bool = True) -> str | None:
+    """
+    Tells from the first bytes of a file whether it is worth reading as source code:
+    "binary" (a NUL byte, or not UTF-8), "minified" (hardly any line breaks) or None.
+    `complete` says whether `data` is the whole file.
+    """
+    sample = data[:settings.FILE_SNIFF_BYTES]
+    if b"\0" in sample:
+        return "binary"
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A sample cut from a longer file may end in the middle of a multi-byte character.
+        cut = not complete or len(data) > len(sample)
+        if not cut or e.start < len(sample) - 3:
+            return "binary"
+    line_length = settings.FILE_MINIFIED_LINE_LENGTH
+    if len(sample) > line_length and (sample.count(b"\n") + 1) * line_length < len(sample):
+        return "minified"
+    return None
+
+
+class Excerpt(str):
+    """
+    Content that is only part of its file: the head and tail of a file above FILE_READ_MAX_BYTES,
+    or the lines of one symbol (SymbolIndex.context_for_query). Its label already says so.
+    """
+    __slots__ = ()
+
+
+def _head_and_tail(full_path: str, max_bytes: int) -> Excerpt:
+    """
+    The start and the end of a large file, cut at line breaks, around a marker. Through mmap,
+    only the pages of those two slices are read, however large the file is.
+    """
+    with open(full_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        head_end = max_bytes * 2 // 3
+        tail_start = size - (max_bytes - head_end)
+        cut = mm.rfind(b"\n", 0, head_end)
+        head_end = cut + 1 if cut > 0 else head_end
+        cut = mm.find(b"\n", tail_start)
+        tail_start = max(cut + 1 if 0 <= cut < size - 1 else tail_start, head_end)
+        head, tail = mm[:head_end], mm[tail_start:]
+    marker = f"\n... [{tail_start - head_end} bytes omitted] ...\n"
+    return Excerpt(head.decode("utf-8", errors="replace") + marker + tail.decode("utf-8", errors="replace"))
+
+
+class FileContentCache:
+    """
+    The decoded content of recently read files, least recently used first out once the cached
+    text exceeds `max_bytes`. Entries are keyed by path and checked against the file's
+    (mtime_ns, size) on every read, so a changed file is never served stale.
+
+    Files larger than FILE_READ_MAX_BYTES are read as their head and tail only (an Excerpt); binary and
+    minified files are skipped (read as None), and so are files that cannot be decoded or read.
+    """
+
+    def __init__(self, max_bytes: int | None = None):
+        self.max_bytes = settings.FILE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._entries: OrderedDict[str, tuple[int, int, str | None]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, full_path: str) -> str | None:
+        """The content of the file at `full_path`; raises FileNotFoundError/OSError like open() would."""
+        st = os.stat(full_path)
+        with self._lock:
+            entry = self._entries.get(full_path)
+            if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                self._entries.move_to_end(full_path)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        content = self._load(full_path, st.st_size)
+        with self._lock:
+            self._store(full_path, (st.st_mtime_ns, st.st_size, content))
+        return content
+
+    def _load(self, full_path: str, size: int) -> str | None:
+        max_bytes = settings.FILE_READ_MAX_BYTES
+        with open(full_path, "rb") as f:
+            head = f.read(settings.FILE_SNIFF_BYTES)
+            if sniff(head, complete=size <= len(head)) is not None:
+                return None
+            if size > max_bytes:
+                return _head_and_tail(full_path, max_bytes)
+            data = head + f.read()
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+
+    def _store(self, full_path: str, entry: tuple):
+        old = self._entries.pop(full_path, None)
+        if old is not None:
+            self._bytes -= len(old[2] or "")
+        cost = len(entry[2] or "")
+        if cost > self.max_bytes:
+            return
+        self._entries[full_path] = entry
+        self._bytes += cost
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted[2] or "")
+
+    def invalidate(self, full_path: str):
+        with self._lock:
+            old = self._entries.pop(full_path, None)
+            if old is not None:
+                self._bytes -= len(old[2] or "")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"files": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def read_concurrently(read, paths: list[str]) -> dict:
+    """
+    `{path: read(path)}` for every path. The reads overlap on a shared pool of FILE_READ_WORKERS
+    threads, which pays off for files that are not in the OS cache yet (cold disks, network drives).
+    """
+    global _pool
+    paths = list(dict.fromkeys(paths))
+    if len(paths) <= 1 or settings.FILE_READ_WORKERS <= 1:
+        return {path: read(path) for path in paths}
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.FILE_READ_WORKERS, thread_name_prefix="read-file")
+    return dict(zip(paths, _pool.map(read, paths)))
@@ -1,14 +1,36 @@
 import os, sys
-from config.settings import BASE_PROJECT_PATH, IGNORED_PATH
+from config import settings
+from config.settings import IGNORED_PATH
 
 # core/file_system_manager.py
 import os
 from schemas.ai_schemas import CodeAction
+from core.tree_index import TreeIndex
+from core.patching import apply_patch
+from core.snapshot_store import SnapshotStore
+from core.tracing import tracer
+from core.transaction import ApplyTransaction, BatchResult
+from core.tree_walker import TreeWalker, to_nested, walker_from_settings
+
+_DONE_LABELS = {"CREATE": "CREATED", "UPDATE": "UPDATED", "PATCH": "PATCHED", "DELETE": "DELETED", "RESTORE": "RESTORED"}
 
 
 class FileSystemManager:
-    def __init__(self, base_path: str):
+    def __init__(self, base_path: str, tree_index: TreeIndex | None = None):
         self.base_path = os.path.abspath(base_path)
+        # When given, the index is updated directly so the next prompt doesn't wait for the watcher.
+        self.tree_index = tree_index
+        # Callbacks `(relative_path, action_type)` run after every successful action.
+        self._change_listeners = []
+        self.transaction = ApplyTransaction(self.base_path)
+        # The previous content of every file a request touches, for undo.
+        self.snapshots = SnapshotStore(self.base_path)
+        # Finish (roll back) any batch a previous run was killed in the middle of.
+        self.transaction.recover()
+
+    def add_change_listener(self, callback):
+        """Registers a callback that is told about every file this manager changes."""
+        self._change_listeners.append(callback)
 
     def _is_path_safe(self, target_path: str) -> bool:
         """
@@ -16,146 +38,153 @@ class FileSystemManager:
         """
         # Get the absolute path of the target file/folder
         abs_target_path = os.path.abspath(target_path)
-        # Check if the absolute target path starts with the project's absolute base path
-        return abs_target_path.startswith(self.base_path)
+        # Check that the absolute target path is inside the project's absolute base path
+        # (not just a prefix of it: "/work/api-gateway" is outside "/work/api").
+        return abs_target_path == self.base_path or abs_target_path.startswith(self.base_path.rstrip(os.sep) + os.sep)
 
-    def apply_action(self, action: CodeAction) -> bool:
+    @staticmethod
+    def _shown_in_part(action: CodeAction, file_path: str) -> bool:
         """
-        Executes a single CodeAction (CREATE, UPDATE, DELETE).
-        Returns True on success, False on failure.
+        An UPDATE of a file above FILE_READ_MAX_BYTES: the model was only ever shown its head and
+        tail (see ProjectManager.read_file), so rewriting it whole would lose everything in between.
         """
-        file_path = os.path.join(self.base_path, action['file_path'])
-
-        if not self._is_path_safe(file_path):
-            print(f"SECURITY ERROR: Action blocked. Attempted to modify path outside of project: {action['file_path']}")
+        if action['action_type'] != "UPDATE":
             return False
-
-        action_type = action['action_type']
-
         try:
-            if action_type == "CREATE":
-                # Ensure parent directory exists
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(action['code'])
-                print(f"CREATED: {action['file_path']}")
-
-            elif action_type == "UPDATE":
-                if not os.path.exists(file_path):
-                    print(f"ERROR: Cannot update non-existent file: {action['file_path']}")
-                    return False
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(action['code'])
-                print(f"UPDATED: {action['file_path']}")
-
-            elif action_type == "DELETE":
-                if not os.path.exists(file_path):
-                    print(f"ERROR: Cannot delete non-existent file: {action['file_path']}")
-                    return False
-                os.remove(file_path)
-                print(f"DELETED: {action['file_path']}")
+            return os.path.getsize(file_path) > settings.FILE_READ_MAX_BYTES
+        except OSError:
+            return False
 
+    def apply_actions(self, actions: list[CodeAction], request_id: str | None = None, label: str = "") -> BatchResult:
+        """
+        Executes a batch of CodeActions (CREATE, UPDATE, PATCH, DELETE) as one transaction:
+        either every action is applied, or the project is left exactly as it was. A batch that
+        UPDATEs a file only shown to the model in part is rejected as a whole.
+        The previous content of the touched files is recorded under `request_id` for `undo()`.
+        """
+        entries = []
+        for action in actions:
+            file_path = os.path.join(self.base_path, action['file_path'])
+            if not self._is_path_safe(file_path):
+                print(f"SECURITY ERROR: Action blocked. Attempted to modify path outside of project: {action['file_path']}")
+                return BatchResult(False, [], f"Path outside of project: {action['file_path']}")
+            if self._shown_in_part(action, file_path):
+                print(f"ERROR: UPDATE of {action['file_path']} rejected: only its head and tail were shown. No changes were made.")
+                return BatchResult(False, [], f"UPDATE of a file only shown in part: {action['file_path']}")
+            entries.append((os.path.relpath(file_path, self.base_path), file_path, action))
+
+        with tracer.span("apply", request_id=request_id, actions=len(entries)) as span:
+            try:
+                with tracer.span("apply.snapshot", files=len(entries)):
+                    pre_images = self.snapshots.capture(dict.fromkeys(rel_path for rel_path, _, _ in entries))
+            except OSError as e:
+                print(f"ERROR: Could not snapshot the files before changing them: {e}. No changes were made.")
+                span.set(ok=False)
+                return BatchResult(False, [], f"Snapshot failed: {e}")
+
+            result = self._commit(entries)
+            if result.ok:
+                self.snapshots.record(pre_images, request_id, label)
+            span.set(ok=result.ok)
+        return result
+
+    def _commit(self, entries: list[tuple[str, str, dict]]) -> BatchResult:
+        result = self.transaction.apply(entries)
+        if not result.ok:
+            print(f"ERROR: {result.error}. No changes were made.")
+            return result
+
+        for rel_path, _, action in entries:
+            action_type = action['action_type']
+            print(f"{_DONE_LABELS[action_type]}: {action['file_path']}")
+            if self.tree_index is not None:
+                if action_type in ("CREATE", "RESTORE"):
+                    self.tree_index.add_path(rel_path)
+                elif action_type == "DELETE":
+                    self.tree_index.remove_path(rel_path)
+            for listener in self._change_listeners:
+                listener(rel_path, action_type)
+        return result
+
+    def preview(self, action: CodeAction, current: str | None = None) -> tuple[str, str]:
+        """
+        The content of the action's file before and after it would be applied, without touching disk.
+        `current` overrides what is on disk (e.g. the result of an earlier action of the same batch).
+        Raises PatchConflict or OSError if the action could not be applied.
+        """
+        file_path = os.path.join(self.base_path, action['file_path'])
+        if not self._is_path_safe(file_path):
+            raise OSError(f"Path outside of project: {action['file_path']}")
+        if self._shown_in_part(action, file_path):
+            raise OSError(f"UPDATE of a file only shown in part: {action['file_path']}")
+        if current is None and os.path.exists(file_path):
+            with open(file_path, 'r', encoding='utf-8', newline='') as f:
+                current = f.read()
+        before = current or ""
+        action_type = action['action_type']
+        if action_type in ("CREATE", "UPDATE"):
+            return before, action['code']
+        if action_type == "PATCH":
+            return before, apply_patch(before, action['code'])
+        if action_type == "DELETE":
+            return before, ""
+        raise ValueError(f"Unknown action type '{action_type}'")
+
+    def undo(self, count: int = 1) -> BatchResult:
+        """Puts back the files changed by the last `count` requests, as one transaction."""
+        plan, seqs = self.snapshots.restore_plan(count)
+        if not seqs:
+            print("Nothing to undo.")
+            return BatchResult(False, [], "Nothing to undo")
+        entries = []
+        for rel_path, data in plan.items():
+            target = os.path.join(self.base_path, rel_path)
+            if data is not None:
+                action = {'action_type': "RESTORE", 'file_path': rel_path, 'code': data, 'explanation': "undo"}
+            elif os.path.exists(target):
+                action = {'action_type': "DELETE", 'file_path': rel_path, 'code': "", 'explanation': "undo"}
             else:
-                print(f"ERROR: Unknown action type '{action_type}'")
-                return False
+                continue
+            entries.append((rel_path, target, action))
+        result = self._commit(entries)
+        if result.ok:
+            self.snapshots.drop(seqs)
+        return result
 
-            return True
-
-        except Exception as e:
-            print(f"ERROR performing '{action_type}' on '{action['file_path']}': {e}")
-            return False
+    def apply_action(self, action: CodeAction) -> bool:
+        """
+        Executes a single CodeAction (CREATE, UPDATE, PATCH, DELETE).
+        Returns True on success, False on failure.
+        """
+        return self.apply_actions([action]).ok
 
-def get_project_structure(base_path=BASE_PROJECT_PATH, indent=""):
+def get_project_structure(base_path=None, indent=""):
     """
-    Returns the nested structure of folders and files starting from base_path.
+    Returns the nested structure of folders and files starting from base_path (default: BASE_PROJECT_PATH).
 
     Structure format:
     ['folder_name', [...contents...]]
     ['file_name']
     """
+    base_path = base_path or settings.BASE_PROJECT_PATH
+    root = TreeWalker(base_path).walk(name=os.path.basename(base_path.rstrip(os.sep)))
+    return to_nested(root)
 
-    def walk_dir(current_path):
-        items = []
-        for entry in sorted(os.listdir(current_path)):
-            if entry in IGNORED_PATH:continue
-            full_path = os.path.join(current_path, entry)
-            if os.path.isdir(full_path):
-                items.append([entry, walk_dir(full_path)])  # Recursive call for folders
-            else:
-                items.append([entry])  # Files are leaves
-        return items
-
-    return [os.path.basename(base_path), walk_dir(base_path)]
-
-
-def print_project_structure(base_path=BASE_PROJECT_PATH, indent="", visited=None, root=True):
-    if visited is None:
-        visited = set()
-
-    real_path = os.path.realpath(base_path)
-    if real_path in visited:
-        return  # avoid cycles or duplicate visits
-    visited.add(real_path)
-
-    base_name = os.path.basename(base_path.rstrip(os.sep))
-    if root:
-        print(f"{indent}{base_name}/")
-    try:
-        entries = sorted(os.listdir(base_path))
-    except PermissionError:
-        print(f"{indent} [Permission Denied]")
-        return
-    total = len(entries)
-    for index, entry in enumerate(entries):
-        if entry in IGNORED_PATH: continue
-        full_path = os.path.join(base_path, entry)
-        is_last = index == total - 1
-        connector = "└── " if is_last else "├── "
-        next_indent = indent + ("    " if is_last else "│   ")
-        if os.path.isdir(full_path) and not os.path.islink(full_path):
-            print(f"{indent}{connector}{entry}/")
-            print_project_structure(full_path, indent=next_indent, visited=visited, root=False)
-        else:
-            print(f"{indent}{connector}{entry}")
-
-
-
-def get_project_structure_str(base_path=BASE_PROJECT_PATH, indent="", visited=None, root=True, ignored=IGNORED_PATH):
-    if visited is None:
-        visited = set()
-    if ignored is None:
-        ignored = set()
-
-    lines = []
-
-    real_path = os.path.realpath(base_path)
-    if real_path in visited:
-        return ""  # avoid cycles or duplicate visits
-    visited.add(real_path)
-
-    base_name = os.path.basename(base_path.rstrip(os.sep))
-    if root:
-        lines.append(f"{indent}{base_name}/")
-
-    try:
-        entries = [e for e in sorted(os.listdir(base_path)) if e not in ignored]
-    except PermissionError:
-        lines.append(f"{indent}[Permission Denied]")
-        return "\n".join(lines)
-
-    total = len(entries)
-    for index, entry in enumerate(entries):
-        full_path = os.path.join(base_path, entry)
-        is_last = index == total - 1
-        connector = "└── " if is_last else "├── "
-        next_indent = indent + ("    " if is_last else "│   ")
-
-        if os.path.isdir(full_path) and not os.path.islink(full_path):
-            lines.append(f"{indent}{connector}{entry}/")
-            sub_structure = get_project_structure_str(full_path, next_indent, visited, root=False, ignored=ignored)
-            if sub_structure:
-                lines.append(sub_structure)
-        else:
-            lines.append(f"{indent}{connector}{entry}")
-
-    return "\n".join(lines)
+
+def print_project_structure(base_path=None, indent="", visited=None, root=True):
+    print(get_project_structure_str(base_path, indent=indent, root=root))
+
+
+def get_project_structure_str(base_path=None, indent="", visited=None, root=True, ignored=IGNORED_PATH):
+    """
+    Returns the project tree as a string, using the shared TreeWalker and the budgets from settings.
+    `visited` is kept for backwards compatibility; symlinked folders are never followed, so cycles can't happen.
+    """
+    base_path = base_path or settings.BASE_PROJECT_PATH
+    walker = walker_from_settings(base_path, ignored if ignored is not None else set())
+    tree = walker.render(walker.walk(name=os.path.basename(base_path.rstrip(os.sep))))
+    if not root:
+        tree = tree.partition("\n")[2]
+    if indent and tree:
+        tree = indent + tree.replace("\n", "\n" + indent)
+    return tree
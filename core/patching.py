@@ -0,0 +1,208 @@
+# core/patching.py
+import difflib
+import re
+from config import settings
+
+_BLOCK_RE = re.compile(
+    r"^<{5,}\s*SEARCH[^\n]*\n(.*?)^={5,}[ \t]*\n(.*?)^>{5,}\s*REPLACE[^\n]*$",
+    re.MULTILINE | re.DOTALL,
+)
+_HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchConflict(Exception):
+    """A hunk doesn't match the current content of the file (or matches it in several places)."""
+
+
+class Hunk:
+    __slots__ = ("search", "replace", "line_hint")
+
+    def __init__(self, search: str, replace: str, line_hint: int | None = None):
+        self.search = search
+        self.replace = replace
+        # 1-based line the hunk is expected at (from unified diffs); used to pick between matches.
+        self.line_hint = line_hint
+
+
+def parse_patch(text: str) -> list[Hunk]:
+    """
+    Reads the `code` of a PATCH action: either SEARCH/REPLACE blocks
+
+        <<<<<<< SEARCH
+        old lines
+        =======
+        new lines
+        >>>>>>> REPLACE
+
+    or a unified diff (`@@ -a,b +c,d @@` hunks; `---`/`+++` headers are ignored).
+    """
+    blocks = _BLOCK_RE.findall(text)
+    if blocks:
+        return [Hunk(search, replace) for search, replace in blocks]
+
+    hunks = []
+    current = None
+    for line in text.splitlines():
+        header = _HUNK_HEADER_RE.match(line)
+        if header:
+            current = ([], [], int(header.group(1)))
+            hunks.append(current)
+            continue
+        if current is None or line.startswith(("--- ", "+++ ")):
+            continue
+        search, replace, _ = current
+        if line.startswith("-"):
+            search.append(line[1:])
+        elif line.startswith("+"):
+            replace.append(line[1:])
+        elif line.startswith("\\"):
+            continue  # "\ No newline at end of file"
+        else:
+            context = line[1:] if line.startswith(" ") else line
+            search.append(context)
+            replace.append(context)
+    if not hunks:
+        raise PatchConflict("The patch contains no SEARCH/REPLACE blocks or diff hunks.")
+    return [Hunk("".join(l + "\n" for l in s), "".join(l + "\n" for l in r), hint) for s, r, hint in hunks]
+
+
+def _line_offsets(lines: list[str]) -> list[int]:
+    offsets, pos = [], 0
+    for line in lines:
+        offsets.append(pos)
+        pos += len(line)
+    offsets.append(pos)
+    return offsets
+
+
+def _pick(matches: list[int], hint: int | None, what: str) -> int:
+    """Chooses a unique match (the one closest to the line hint, if there is one)."""
+    if not matches:
+        raise PatchConflict(f"{what} not found in the current file.")
+    if len(matches) == 1:
+        return matches[0]
+    if hint is None:
+        raise PatchConflict(f"{what} matches {len(matches)} places; add more context lines.")
+    return min(matches, key=lambda line: abs(line + 1 - hint))
+
+
+def _find_exact(content: str, search: str, lines: list[str], hint: int | None) -> tuple[int, int] | None:
+    """Exact match on whole lines: a SEARCH of `x = 1` must not match inside `max = 1`."""
+    starts, pos = [], content.find(search)
+    while pos != -1:
+        end = pos + len(search)
+        if (pos == 0 or content[pos - 1] == "\n") and (end == len(content) or content[end - 1] == "\n"):
+            starts.append(pos)
+        pos = content.find(search, pos + 1)
+    if not starts:
+        return None
+    if len(starts) == 1:
+        return starts[0], starts[0] + len(search)
+    if hint is None:
+        raise PatchConflict("The SEARCH text matches several places; add more context lines.")
+    offsets = _line_offsets(lines)
+    hint_offset = offsets[min(max(hint - 1, 0), len(lines))]
+    start = min(starts, key=lambda s: abs(s - hint_offset))
+    return start, start + len(search)
+
+
+def _find_by_lines(lines: list[str], search_lines: list[str], hint: int | None, fuzzy: bool) -> tuple[int, int] | None:
+    """Line-based match ignoring indentation/trailing whitespace differences, optionally fuzzy."""
+    n = len(search_lines)
+    if n == 0 or n > len(lines):
+        return None
+    norm = [line.strip() for line in lines]
+    wanted = [line.strip() for line in search_lines]
+
+    if not fuzzy:
+        # Index the first non-empty wanted line, then verify candidates.
+        anchor = next((k for k, line in enumerate(wanted) if line), 0)
+        matches = [i - anchor for i, line in enumerate(norm)
+                   if line == wanted[anchor] and 0 <= i - anchor <= len(lines) - n
+                   and norm[i - anchor:i - anchor + n] == wanted]
+        if not matches:
+            return None
+        start = _pick(matches, hint, "The SEARCH text")
+        return start, start + n
+
+    target = "\n".join(wanted)
+    threshold = settings.PATCH_FUZZY_THRESHOLD
+    best, best_ratio, ties = None, threshold, []
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(target)
+    for start in range(len(lines) - n + 1):
+        matcher.set_seq1("\n".join(norm[start:start + n]))
+        if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio + 1e-9:
+            best, best_ratio, ties = start, ratio, [start]
+        elif abs(ratio - best_ratio) <= 1e-9 and best is not None:
+            ties.append(start)
+    if best is None:
+        return None
+    start = _pick(ties, hint, "The SEARCH text (fuzzy)")
+    return start, start + n
+
+
+def _reindent(replace: str, found: str, search: str) -> str:
+    """If the file is indented differently from the SEARCH text, shift the replacement the same way."""
+    def indent(text):
+        for line in text.splitlines():
+            if line.strip():
+                return line[:len(line) - len(line.lstrip())]
+        return ""
+    have, expected = indent(found), indent(search)
+    if have == expected:
+        return replace
+    out = []
+    for line in replace.splitlines(keepends=True):
+        if line.strip() and line.startswith(expected):
+            line = have + line[len(expected):]
+        out.append(line)
+    return "".join(out)
+
+
+def apply_hunk(content: str, hunk: Hunk) -> str:
+    """Applies one hunk: exact match first, then whitespace-insensitive, then fuzzy."""
+    search, replace = hunk.search, hunk.replace
+    if not search.strip():
+        if content.strip():
+            raise PatchConflict("An empty SEARCH block can only be used on an empty file.")
+        return replace
+
+    lines = content.splitlines(keepends=True)
+    span = _find_exact(content, search, lines, hunk.line_hint)
+    if span is not None:
+        start, end = span
+        return content[:start] + replace + content[end:]
+
+    search_lines = search.splitlines()
+    for fuzzy in (False, True):
+        found = _find_by_lines(lines, search_lines, hunk.line_hint, fuzzy)
+        if found is None:
+            continue
+        first, last = found
+        old = "".join(lines[first:last])
+        new = _reindent(replace, old, search)
+        if old.endswith("\n") and new and not new.endswith("\n"):
+            new += "\n"
+        return "".join(lines[:first]) + new + "".join(lines[last:])
+
+    # Conflict, unless the change is already there (e.g. a retried request): the replacement must
+    # sit on whole lines and share a context line with the SEARCH text to count.
+    shared = {line.strip() for line in search_lines if line.strip()} & {line.strip() for line in replace.splitlines()}
+    if shared and replace.strip() and (content.startswith(replace) or "\n" + replace in content):
+        return content
+    preview = search.strip().splitlines()[0][:80] if search.strip() else ""
+    raise PatchConflict(f"The SEARCH text starting with '{preview}' does not match the current file.")
+
+
+def apply_patch(content: str, patch_text: str) -> str:
+    """Applies every hunk of a PATCH action in order; raises PatchConflict if any hunk doesn't fit."""
+    for index, hunk in enumerate(parse_patch(patch_text), start=1):
+        try:
+            content = apply_hunk(content, hunk)
+        except PatchConflict as e:
+            raise PatchConflict(f"Hunk {index}: {e}") from None
+    return content
@@ -1,6 +1,11 @@
 # core/project_manager.py
 import os
 from config import settings
+from core.file_cache import FileContentCache, read_concurrently
+from core.tree_index import TreeIndex
+from core.retrieval_index import RetrievalIndex
+from core.symbol_index import SymbolIndex
+from core.dependency_graph import DependencyGraph
 
 
 class ProjectManager:
@@ -9,39 +14,63 @@ class ProjectManager:
             raise ValueError(f"The provided path '{base_path}' is not a valid directory.")
         self.base_path = os.path.abspath(base_path)
         self.ignored = settings.IGNORED_PATH
+        self.tree_index = TreeIndex(self.base_path, self.ignored)
+        self.file_cache = FileContentCache()
+        self._retrieval_index = None
+        self._symbol_index = None
+        self._dependency_graph = None
+
+    @property
+    def retrieval_index(self) -> RetrievalIndex:
+        """The BM25 index of the project, opened on first use (it lives in the project's data folder)."""
+        if self._retrieval_index is None:
+            self._retrieval_index = RetrievalIndex(self.base_path, self.tree_index.iter_files)
+        return self._retrieval_index
+
+    @property
+    def symbol_index(self) -> SymbolIndex:
+        """The `ast` symbol index of the project's Python files, loaded on first use."""
+        if self._symbol_index is None:
+            self._symbol_index = SymbolIndex(self.base_path, self.tree_index.iter_files)
+        return self._symbol_index
+
+    @property
+    def dependency_graph(self) -> DependencyGraph:
+        """The import graph of the project, built on top of the symbol index."""
+        if self._dependency_graph is None:
+            self._dependency_graph = DependencyGraph(self.base_path, self.tree_index.iter_files, self.symbol_index,
+                                                     tree_version=lambda: self.tree_index.version)
+        return self._dependency_graph
+
+    def start_indexing(self):
+        """
+        Brings the indexes up to date in the background, so the first request doesn't wait for
+        them (called when a project is loaded). `indexing_progress()` tells how far the search
+        index got.
+        """
+        self.retrieval_index.start_sweep()
+        # Both only start their background sweeps here.
+        self.symbol_index.ensure_fresh()
+        self.dependency_graph.update()
+
+    def indexing_progress(self) -> tuple[int, int] | None:
+        """(files indexed, files to index) while the search index is being built or refreshed, else None."""
+        return self._retrieval_index.progress if self._retrieval_index is not None else None
 
     def get_structure_string(self) -> str:
-        """Generates a string representation of the project's file tree."""
-        lines = []
-
-        def recurse(path, indent="", is_last_dict=None):
-            if os.path.basename(path) in self.ignored:
-                return
-
-            real_path = os.path.realpath(path)
-            base_name = os.path.basename(real_path)
-
-            if indent == "":  # Root directory
-                lines.append(f"{base_name}/")
-            else:
-                connector = "└── " if is_last_dict.get(path, False) else "├── "
-                lines.append(f"{indent}{connector}{base_name}{'/' if os.path.isdir(path) else ''}")
-
-            if os.path.isdir(path):
-                next_indent = indent + ("    " if is_last_dict.get(path, False) else "│   ")
-                try:
-                    entries = [os.path.join(path, e) for e in sorted(os.listdir(path)) if e not in self.ignored]
-                    is_last_map = {entries[-1]: True} if entries else {}
-                    for entry_path in entries:
-                        recurse(entry_path, next_indent, is_last_map)
-                except PermissionError:
-                    lines.append(f"{next_indent}[Permission Denied]")
-
-        recurse(self.base_path, is_last_dict={})
-        return "\n".join(lines)
+        """
+        Returns a string representation of the project's file tree.
+        The tree is served from the cached TreeIndex, so only the first call walks the disk.
+        """
+        return self.tree_index.render()
 
     def read_file(self, relative_path: str) -> str | None:
-        """Reads the content of a file, given a path relative to the project root."""
+        """
+        Reads the content of a file, given a path relative to the project root.
+        Served from the FileContentCache while the file is unchanged; binary and minified files
+        read as None, and files above FILE_READ_MAX_BYTES as their head and tail only: an Excerpt,
+        which callers must label as such and never let the model rewrite whole.
+        """
         full_path = os.path.join(self.base_path, relative_path)
         # Security check
         if not self._is_path_safe(full_path):
@@ -49,14 +78,36 @@ class ProjectManager:
             return None
 
         try:
-            with open(full_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            return self.file_cache.read(os.path.abspath(full_path))
         except FileNotFoundError:
             return None
         except Exception as e:
             print(f"Error reading file {relative_path}: {e}")
             return None
 
+    def read_files(self, relative_paths: list[str]) -> dict[str, str | None]:
+        """`read_file` for many paths at once, on FILE_READ_WORKERS threads. Keeps the order of the paths."""
+        return read_concurrently(self.read_file, relative_paths)
+
+    def invalidate_file(self, relative_path: str, *_):
+        """Drops a file from the content cache (a change listener for FileSystemManager)."""
+        self.file_cache.invalidate(os.path.abspath(os.path.join(self.base_path, relative_path)))
+
+    def close(self):
+        """Stops the tree watcher and closes the indexes (they reopen on next use)."""
+        self.tree_index.stop_watching()
+        if self._retrieval_index is not None:
+            self._retrieval_index.close()
+            self._retrieval_index = None
+        if self._dependency_graph is not None:
+            self._dependency_graph.close()
+            self._dependency_graph = None
+        if self._symbol_index is not None:
+            self._symbol_index.close()
+            self._symbol_index = None
+
     def _is_path_safe(self, path: str) -> bool:
         """Ensures the path is within the project's base directory."""
-        return os.path.abspath(path).startswith(self.base_path)
\ No newline at end of file
+        path = os.path.abspath(path)
+        # Not just a prefix: "/work/api-gateway" is outside "/work/api".
+        return path == self.base_path or path.startswith(self.base_path.rstrip(os.sep) + os.sep)
\ No newline at end of file
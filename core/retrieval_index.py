@@ -0,0 +1,407 @@
+# core/retrieval_index.py
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from config import settings
+from core.file_cache import sniff
+
+# Bumped whenever what is indexed changes; an index of another version is rebuilt from scratch.
+_SCHEMA_VERSION = 2
+
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+# Only applied to queries: code legitimately uses words like "in" or "for".
+_QUERY_STOPWORDS = {
+    "a", "an", "and", "the", "to", "of", "in", "on", "for", "is", "it", "be", "please", "can", "you",
+    "with", "that", "this", "fix", "add", "make", "change", "update", "file", "code", "so", "we", "me", "i",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    start_line INTEGER NOT NULL,
+    end_line INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_by_file ON chunks(file_id);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT UNIQUE NOT NULL,
+    df INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    chunk_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term_id, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_chunk ON postings(chunk_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits text into lowercase search terms.
+    Identifiers are kept whole *and* split on snake_case/camelCase, so `parseGeminiResponse`
+    is found by "parse", "gemini", "response" and the full name.
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        lower = word.lower()
+        if len(lower) > 1:
+            tokens.append(lower)
+        parts = [p for piece in word.split("_") if piece for p in _CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(p.lower() for p in parts if len(p) > 1)
+    return tokens
+
+
+def query_terms(query: str) -> list[str]:
+    terms = [t for t in tokenize(query) if t not in _QUERY_STOPWORDS]
+    return list(dict.fromkeys(terms))
+
+
+class SearchHit:
+    __slots__ = ("path", "start_line", "end_line", "score")
+
+    def __init__(self, path: str, start_line: int, end_line: int, score: float):
+        self.path = path
+        self.start_line = start_line
+        self.end_line = end_line
+        self.score = score
+
+    def __repr__(self):
+        return f"SearchHit({self.path}:{self.start_line}-{self.end_line}, score={self.score:.3f})"
+
+
+class RetrievalIndex:
+    """
+    A BM25 inverted index over the project's text files, stored in SQLite under the project.
+
+    Files are split into fixed-size line chunks. `update()` re-indexes only files whose
+    (mtime, size) changed and whose content hash really differs; `mark_dirty()` lets the
+    FileSystemManager point at files it just wrote, so they are re-indexed before the next query.
+    Periodic full sweeps (`ensure_fresh`) run on a background thread, off the request path.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, base_path: str, list_files, db_path: str | None = None):
+        """
+        `list_files` returns the project's files as paths relative to `base_path`
+        (normally `TreeIndex.iter_files`, so ignore rules stay in one place).
+        """
+        self.base_path = os.path.abspath(base_path)
+        self.list_files = list_files
+        if db_path is None:
+            data_dir = os.path.join(self.base_path, settings.ASSISTANT_DATA_DIR)
+            os.makedirs(data_dir, exist_ok=True)
+            db_path = os.path.join(data_dir, "retrieval.sqlite")
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript("PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;" + _SCHEMA)
+        self._check_version()
+        self._lock = threading.RLock()
+        self._dirty: set[str] = set()
+        self._last_full_update = 0.0
+        self._sweeping = False
+        self._closed = False
+        # (files indexed, files to index) while a sweep re-indexes files, else None.
+        self.progress: tuple[int, int] | None = None
+
+    def _check_version(self):
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if row is not None and int(row[0]) == _SCHEMA_VERSION:
+            return
+        with self._db:
+            for table in ("postings", "chunks", "terms", "files", "meta"):
+                self._db.execute(f"DELETE FROM {table}")
+            self._db.execute("INSERT INTO meta(key, value) VALUES ('schema_version', ?)", (_SCHEMA_VERSION,))
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._db.close()
+
+    # --- Indexing ---
+
+    def mark_dirty(self, rel_path: str, *_):
+        """Flags a file as changed; it is re-indexed on the next update or search."""
+        with self._lock:
+            self._dirty.add(rel_path.replace("\\", "/"))
+
+    def _read_text(self, full_path: str) -> str | None:
+        try:
+            with open(full_path, "rb") as f:
+                data = f.read(settings.RETRIEVAL_MAX_FILE_BYTES + 1)
+        except OSError:
+            return None
+        if len(data) > settings.RETRIEVAL_MAX_FILE_BYTES or sniff(data) is not None:
+            return None
+        return data.decode("utf-8", errors="replace")
+
+    def _remove_file(self, cur, file_id: int):
+        cur.execute("""
+            UPDATE terms SET df = df - (
+                SELECT COUNT(*) FROM postings p JOIN chunks c ON c.id = p.chunk_id
+                WHERE c.file_id = ? AND p.term_id = terms.id)
+            WHERE id IN (SELECT p.term_id FROM postings p JOIN chunks c ON c.id = p.chunk_id WHERE c.file_id = ?)
+        """, (file_id, file_id))
+        removed = cur.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks WHERE file_id = ?",
+                              (file_id,)).fetchone()
+        cur.execute("DELETE FROM postings WHERE chunk_id IN (SELECT id FROM chunks WHERE file_id = ?)", (file_id,))
+        cur.execute("DELETE FROM chunks WHERE file_id = ?", (file_id,))
+        cur.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        self._bump_stats(cur, -removed[0], -removed[1])
+
+    def _bump_stats(self, cur, chunks: int, length: int):
+        cur.execute("INSERT INTO meta(key, value) VALUES ('n_chunks', ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value", (chunks,))
+        cur.execute("INSERT INTO meta(key, value) VALUES ('total_length', ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value", (length,))
+
+    def _term_ids(self, cur, terms) -> dict[str, int]:
+        cur.executemany("INSERT OR IGNORE INTO terms(term) VALUES (?)", ((t,) for t in terms))
+        ids = {}
+        terms = list(terms)
+        for start in range(0, len(terms), 500):
+            batch = terms[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            ids.update(cur.execute(f"SELECT term, id FROM terms WHERE term IN ({marks})", batch).fetchall())
+        return ids
+
+    def _index_file(self, cur, rel_path: str, text: str, mtime_ns: int, size: int, digest: str):
+        cur.execute("INSERT INTO files(path, mtime_ns, size, hash) VALUES (?, ?, ?, ?)",
+                    (rel_path, mtime_ns, size, digest))
+        file_id = cur.lastrowid
+        path_terms = tokenize(rel_path)
+        lines = text.splitlines()
+        chunk_lines = settings.RETRIEVAL_CHUNK_LINES
+
+        chunks = []
+        for start in range(0, max(len(lines), 1), chunk_lines):
+            counts = Counter(tokenize("\n".join(lines[start:start + chunk_lines])))
+            if not start:
+                # The path goes with the first chunk only, so "math_util" finds core/math_util.py
+                # without repeating its terms in the postings of every chunk.
+                counts.update(path_terms)
+            chunks.append((start + 1, min(start + chunk_lines, len(lines)), counts))
+
+        ids = self._term_ids(cur, {t for _, _, counts in chunks for t in counts})
+        df_delta = Counter()
+        total_length = 0
+        for start_line, end_line, counts in chunks:
+            length = sum(counts.values())
+            total_length += length
+            cur.execute("INSERT INTO chunks(file_id, start_line, end_line, length) VALUES (?, ?, ?, ?)",
+                        (file_id, start_line, end_line, length))
+            chunk_id = cur.lastrowid
+            cur.executemany("INSERT INTO postings(term_id, chunk_id, tf) VALUES (?, ?, ?)",
+                            ((ids[t], chunk_id, tf) for t, tf in counts.items()))
+            df_delta.update(ids[t] for t in counts)
+        cur.executemany("UPDATE terms SET df = df + ? WHERE id = ?", ((n, tid) for tid, n in df_delta.items()))
+        self._bump_stats(cur, len(chunks), total_length)
+
+    def _sync_paths(self, cur, rel_paths, known: dict[str, tuple]) -> int:
+        """Re-indexes the given paths if they changed. Returns how many files were (re)indexed."""
+        changed = 0
+        for rel_path in rel_paths:
+            full_path = os.path.join(self.base_path, rel_path)
+            row = known.get(rel_path)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                st = None
+            if st is None:
+                if row is not None:
+                    self._remove_file(cur, row[0])
+                    changed += 1
+                continue
+            if row is not None and row[1] == st.st_mtime_ns and row[2] == st.st_size:
+                continue
+
+            text = self._read_text(full_path)
+            digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest() if text is not None else ""
+            if row is not None:
+                if row[3] == digest:
+                    # Touched but not modified: just remember the new stat.
+                    cur.execute("UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?",
+                                (st.st_mtime_ns, st.st_size, row[0]))
+                    continue
+                self._remove_file(cur, row[0])
+            if text is None:
+                # Binary or oversized: remember it so it isn't re-read on every update.
+                cur.execute("INSERT INTO files(path, mtime_ns, size, hash) VALUES (?, ?, ?, '')",
+                            (rel_path, st.st_mtime_ns, st.st_size))
+            else:
+                self._index_file(cur, rel_path, text, st.st_mtime_ns, st.st_size, digest)
+            changed += 1
+        return changed
+
+    def _known(self, cur, rel_paths=None) -> dict[str, tuple]:
+        if rel_paths is None:
+            rows = cur.execute("SELECT path, id, mtime_ns, size, hash FROM files").fetchall()
+        else:
+            rows = []
+            rel_paths = list(rel_paths)
+            for start in range(0, len(rel_paths), 500):
+                batch = rel_paths[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                rows += cur.execute(f"SELECT path, id, mtime_ns, size, hash FROM files WHERE path IN ({marks})",
+                                    batch).fetchall()
+        return {r[0]: r[1:] for r in rows}
+
+    def update(self) -> int:
+        """Brings the whole index in line with the project. Returns the number of re-indexed files."""
+        with self._lock:
+            cur = self._db.cursor()
+            known = self._known(cur)
+            current = [p.replace("\\", "/") for p in self.list_files()]
+            # Files that disappeared from the project (deleted or newly ignored).
+            gone = known.keys() - set(current)
+            with self._db:
+                changed = self._sync_paths(cur, current, known)
+                for rel_path in gone:
+                    self._remove_file(cur, known[rel_path][0])
+            self._dirty.clear()
+            self._last_full_update = time.monotonic()
+            return changed + len(gone)
+
+    def _sweep(self):
+        """
+        A full update in the background: the project is listed and stat'ed without the lock, and
+        only the files that changed are re-indexed, a batch at a time, so searches are never held
+        up for long.
+        """
+        try:
+            with self._lock:
+                if self._closed:
+                    return
+                known = self._known(self._db.cursor())
+            current = [p.replace("\\", "/") for p in self.list_files()]
+            changed = []
+            for rel_path in current:
+                row = known.get(rel_path)
+                try:
+                    st = os.stat(os.path.join(self.base_path, rel_path))
+                except OSError:
+                    continue
+                if row is None or row[1] != st.st_mtime_ns or row[2] != st.st_size:
+                    changed.append(rel_path)
+            gone = list(known.keys() - set(current))
+            for start in range(0, len(changed), 100):
+                self.progress = (start, len(changed))
+                with self._lock:
+                    if self._closed:
+                        return
+                    cur = self._db.cursor()
+                    batch = changed[start:start + 100]
+                    with self._db:
+                        self._sync_paths(cur, batch, self._known(cur, batch))
+            with self._lock:
+                if self._closed:
+                    return
+                cur = self._db.cursor()
+                with self._db:
+                    for row in self._known(cur, gone).values():
+                        self._remove_file(cur, row[0])
+            self._last_full_update = time.monotonic()
+        except Exception as e:
+            print(f"Warning: could not refresh the search index: {e}")
+        finally:
+            self.progress = None
+            self._sweeping = False
+
+    def start_sweep(self) -> bool:
+        """Starts a full update in the background, unless one is running. Returns whether it started."""
+        with self._lock:
+            if self._sweeping or self._closed:
+                return False
+            self._sweeping = True
+            threading.Thread(target=self._sweep, name="retrieval-sweep", daemon=True).start()
+            return True
+
+    def ensure_fresh(self, max_age: float | None = None) -> int:
+        """
+        Cheap freshness check for the request path: files flagged by `mark_dirty` are always
+        re-indexed. When the last full sweep is older than `max_age`, a new one starts in the
+        background. The first build starts when the project is loaded (see
+        ProjectManager.start_indexing); until it is done, searches see what is indexed so far.
+        """
+        max_age = settings.RETRIEVAL_REFRESH_SECONDS if max_age is None else max_age
+        with self._lock:
+            if time.monotonic() - self._last_full_update > max_age:
+                self.start_sweep()
+            if not self._dirty:
+                return 0
+            dirty, self._dirty = self._dirty, set()
+            cur = self._db.cursor()
+            with self._db:
+                return self._sync_paths(cur, dirty, self._known(cur, dirty))
+
+    # --- Searching ---
+
+    def search(self, query: str, top_k: int = 10) -> list[SearchHit]:
+        """
+        Returns the best matching chunks for `query`, ranked by BM25. Scores are summed and ranked
+        in SQL; terms found in more than RETRIEVAL_COMMON_TERM_SHARE of the chunks are left out
+        (they hardly change the ranking but have the longest postings), unless nothing else is left.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        with self._lock:
+            cur = self._db.cursor()
+            stats = dict(cur.execute("SELECT key, value FROM meta").fetchall())
+            n_chunks = stats.get("n_chunks", 0)
+            if n_chunks <= 0:
+                return []
+            avg_length = stats.get("total_length", 0) / n_chunks or 1.0
+
+            marks = ",".join("?" * len(terms))
+            term_rows = cur.execute(f"SELECT id, df FROM terms WHERE term IN ({marks}) AND df > 0", terms).fetchall()
+            if not term_rows:
+                return []
+            rare = [(term_id, df) for term_id, df in term_rows if df <= n_chunks * settings.RETRIEVAL_COMMON_TERM_SHARE]
+            term_rows = rare or [min(term_rows, key=lambda row: row[1])]
+
+            k1, b = self.K1, self.B
+            idfs = [(term_id, math.log(1 + (n_chunks - df + 0.5) / (df + 0.5))) for term_id, df in term_rows]
+            values = ",".join("(?, ?)" for _ in idfs)
+            rows = cur.execute(f"""
+                WITH q(term_id, idf) AS (VALUES {values}),
+                best AS (
+                    SELECT p.chunk_id AS chunk_id,
+                           SUM(q.idf * p.tf * ? / (p.tf + ? * (? + ? * c.length))) AS score
+                    FROM q JOIN postings p ON p.term_id = q.term_id JOIN chunks c ON c.id = p.chunk_id
+                    GROUP BY p.chunk_id ORDER BY score DESC LIMIT ?)
+                SELECT f.path, c.start_line, c.end_line, best.score
+                FROM best JOIN chunks c ON c.id = best.chunk_id JOIN files f ON f.id = c.file_id
+                ORDER BY best.score DESC
+            """, [v for pair in idfs for v in pair] + [k1 + 1, k1, 1 - b, b / avg_length, top_k]).fetchall()
+            return [SearchHit(*row) for row in rows]
+
+    def search_files(self, query: str, top_k: int = 5) -> list[tuple[str, float]]:
+        """Ranks files by their best chunk score."""
+        best: dict[str, float] = {}
+        for hit in self.search(query, top_k=top_k * 4):
+            if hit.score > best.get(hit.path, 0.0):
+                best[hit.path] = hit.score
+        return sorted(best.items(), key=lambda item: item[1], reverse=True)[:top_k]
@@ -0,0 +1,191 @@
+# core/snapshot_store.py
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from config import settings
+
+
+class SnapshotStore:
+    """
+    Keeps the content files had before the assistant changed them, so requests can be undone.
+
+    Pre-images are stored once per content hash as zlib blobs (objects/ab/abcdef....z), and each
+    request gets a small manifest (manifests/00000042.json) mapping the paths it touched to the
+    hash of their previous content, or to null for files it created. Undoing the last request only
+    reads its manifest and the blobs it names. `gc()` drops the oldest manifests beyond
+    SNAPSHOT_MAX_REQUESTS or SNAPSHOT_MAX_BYTES, then the blobs no manifest refers to. The store's
+    size is tracked as blobs are written, so recording only runs `gc()` once it exceeds the limit.
+    """
+
+    def __init__(self, base_path: str, store_dir: str | None = None,
+                 max_bytes: int | None = None, max_requests: int | None = None):
+        self.base_path = os.path.abspath(base_path)
+        self.store_dir = store_dir or os.path.join(self.base_path, settings.ASSISTANT_DATA_DIR, "snapshots")
+        self.max_bytes = settings.SNAPSHOT_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_requests = settings.SNAPSHOT_MAX_REQUESTS if max_requests is None else max_requests
+        self._objects = os.path.join(self.store_dir, "objects")
+        self._manifests = os.path.join(self.store_dir, "manifests")
+        os.makedirs(self._objects, exist_ok=True)
+        os.makedirs(self._manifests, exist_ok=True)
+        self._lock = threading.RLock()
+        # Manifest sequence numbers, oldest first.
+        self._seqs = sorted(int(name[:-5]) for name in os.listdir(self._manifests) if name.endswith(".json"))
+        # Bytes of all blobs on disk (including unreferenced ones until gc), measured on first need.
+        self._bytes: int | None = None
+
+    # --- Blobs ---
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self._objects, digest[:2], digest + ".z")
+
+    def put_blob(self, data: bytes) -> str:
+        """Stores `data` (once) and returns its hash."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            compressed = zlib.compress(data, 6)
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+            with self._lock:
+                if self._bytes is not None:
+                    self._bytes += len(compressed)
+        return digest
+
+    def get_blob(self, digest: str) -> bytes:
+        with open(self._blob_path(digest), "rb") as f:
+            return zlib.decompress(f.read())
+
+    # --- Manifests ---
+
+    def _manifest_path(self, seq: int) -> str:
+        return os.path.join(self._manifests, f"{seq:08d}.json")
+
+    def _read_manifest(self, seq: int) -> dict:
+        with open(self._manifest_path(seq), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, seq: int, manifest: dict):
+        path = self._manifest_path(seq)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def capture(self, rel_paths) -> dict[str, str | None]:
+        """Stores the current content of `rel_paths`; returns {path: hash, or None if it doesn't exist}."""
+        pre_images = {}
+        for rel_path in rel_paths:
+            try:
+                with open(os.path.join(self.base_path, rel_path), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                pre_images[rel_path] = None
+                continue
+            pre_images[rel_path] = self.put_blob(data)
+        return pre_images
+
+    def record(self, pre_images: dict[str, str | None], request_id: str | None = None, label: str = ""):
+        """
+        Saves the manifest of an applied batch. Batches of the same request (e.g. actions applied
+        while a response streams in) share one manifest; a path keeps its earliest pre-image.
+        """
+        if not pre_images:
+            return
+        with self._lock:
+            last = self._seqs[-1] if self._seqs else None
+            manifest = self._read_manifest(last) if last is not None else None
+            if request_id is not None and manifest is not None and manifest.get("request") == request_id:
+                seq = last
+                for path, digest in pre_images.items():
+                    manifest["files"].setdefault(path, digest)
+            else:
+                seq = (last or 0) + 1
+                manifest = {"request": request_id, "label": label, "time": time.time(), "files": dict(pre_images)}
+                self._seqs.append(seq)
+            self._write_manifest(seq, manifest)
+            if self._bytes is None:
+                self._bytes = sum(size for _, size in self._scan_blobs().values())
+            if len(self._seqs) > self.max_requests:
+                # Their blobs stay (and count towards the size) until the next gc.
+                self.drop(self._seqs[:len(self._seqs) - self.max_requests])
+            over_size = self._bytes > self.max_bytes
+        if over_size:
+            self.gc()
+
+    def history(self) -> list[dict]:
+        """The recorded requests, newest first."""
+        with self._lock:
+            return [dict(self._read_manifest(seq), seq=seq) for seq in reversed(self._seqs)]
+
+    def restore_plan(self, count: int = 1) -> tuple[dict[str, bytes | None], list[int]]:
+        """
+        What undoing the last `count` requests means: {path: content to put back, or None to delete},
+        and the manifests that would be consumed. Nothing is changed on disk.
+        """
+        with self._lock:
+            seqs = self._seqs[-count:] if count > 0 else []
+            plan: dict[str, bytes | None] = {}
+            # Newest first, so that for every path the oldest pre-image wins.
+            for seq in reversed(seqs):
+                for path, digest in self._read_manifest(seq)["files"].items():
+                    plan[path] = digest
+            return {path: (self.get_blob(d) if d else None) for path, d in plan.items()}, seqs
+
+    def drop(self, seqs: list[int]):
+        """Forgets manifests (after they were undone); their blobs are left for gc."""
+        with self._lock:
+            for seq in seqs:
+                try:
+                    os.remove(self._manifest_path(seq))
+                except OSError:
+                    pass
+                if seq in self._seqs:
+                    self._seqs.remove(seq)
+
+    # --- Garbage collection ---
+
+    def _scan_blobs(self) -> dict[str, tuple[str, int]]:
+        """{hash: (path, size)} of every blob on disk."""
+        blobs = {}
+        for bucket in os.scandir(self._objects):
+            if bucket.is_dir():
+                for entry in os.scandir(bucket.path):
+                    if entry.name.endswith(".z"):
+                        blobs[entry.name[:-2]] = (entry.path, entry.stat().st_size)
+        return blobs
+
+    def gc(self) -> int:
+        """Keeps the store within its limits. Returns how many bytes were freed."""
+        with self._lock:
+            if len(self._seqs) > self.max_requests:
+                self.drop(self._seqs[:len(self._seqs) - self.max_requests])
+
+            blobs = self._scan_blobs()
+            total = sum(size for _, size in blobs.values())
+
+            referenced: dict[int, set[str]] = {
+                seq: {d for d in self._read_manifest(seq)["files"].values() if d} for seq in self._seqs}
+            live = set().union(*referenced.values()) if referenced else set()
+            # Over the size limit: give up the oldest requests first (but always keep the newest one).
+            while total > self.max_bytes and len(self._seqs) > 1:
+                seq = self._seqs[0]
+                self.drop([seq])
+                referenced.pop(seq)
+                live = set().union(*referenced.values())
+                total = sum(size for digest, (_, size) in blobs.items() if digest in live)
+
+            freed = 0
+            for digest, (path, size) in blobs.items():
+                if digest not in live:
+                    try:
+                        os.remove(path)
+                        freed += size
+                    except OSError:
+                        pass
+            self._bytes = sum(size for _, size in blobs.values()) - freed
+            return freed
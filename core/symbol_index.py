@@ -0,0 +1,425 @@
+# core/symbol_index.py
+import ast
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import NamedTuple
+from config import settings
+from core.file_cache import Excerpt
+
+
+# Stands in for "not parsed yet" (a parse result of None means the file doesn't parse).
+_UNPARSED = object()
+
+
+class Symbol(NamedTuple):
+    name: str
+    qualname: str  # e.g. "ProjectManager.read_file"
+    kind: str  # "function", "class" or "method"
+    path: str
+    start_line: int
+    end_line: int
+
+
+class Import(NamedTuple):
+    module: str  # "" for `from . import x`
+    name: str  # the imported name, or the module itself for `import x`
+    alias: str
+    path: str
+    line: int
+
+
+class Reference(NamedTuple):
+    name: str  # the called name (last attribute for `obj.method()`)
+    path: str
+    line: int
+    scope: str  # qualname of the enclosing definition, "" at module level
+
+
+class FileSymbols(NamedTuple):
+    definitions: list[Symbol]
+    imports: list[Import]
+    references: list[Reference]
+
+
+def parse_python_source(path: str, source: str) -> FileSymbols | None:
+    """
+    Extracts definitions, imports and call references from one Python file.
+    Top-level so it can run in a worker process.
+    """
+    try:
+        tree = ast.parse(source, filename=path)
+    except (SyntaxError, ValueError):
+        return None
+
+    definitions, imports, references = [], [], []
+
+    def visit(node, scope: list[str], in_class: bool):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                qualname = ".".join(scope + [child.name])
+                if isinstance(child, ast.ClassDef):
+                    kind = "class"
+                else:
+                    kind = "method" if in_class else "function"
+                # Decorators belong to the definition's slice.
+                start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                definitions.append(Symbol(child.name, qualname, kind, path, start, child.end_lineno or child.lineno))
+                visit(child, scope + [child.name], isinstance(child, ast.ClassDef))
+                continue
+            if isinstance(child, ast.Import):
+                for alias in child.names:
+                    imports.append(Import(alias.name, alias.name, alias.asname or alias.name, path, child.lineno))
+            elif isinstance(child, ast.ImportFrom):
+                module = "." * child.level + (child.module or "")
+                for alias in child.names:
+                    imports.append(Import(module, alias.name, alias.asname or alias.name, path, child.lineno))
+            elif isinstance(child, ast.Call):
+                func = child.func
+                name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+                if name:
+                    references.append(Reference(name, path, child.lineno, ".".join(scope)))
+            visit(child, scope, in_class)
+
+    visit(tree, [], False)
+    return FileSymbols(definitions, imports, references)
+
+
+def _parse_file(args):
+    path, full_path = args
+    try:
+        with open(full_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return path, None, None
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return path, digest, parse_python_source(path, data.decode("utf-8", errors="replace"))
+
+
+class SymbolIndex:
+    """
+    A project-wide index of Python definitions, imports and call references (built with `ast`).
+
+    Parsed files are cached by content hash (and saved as JSON under the project's data folder), so
+    only new or modified files are parsed again; big batches are parsed in a process pool.
+    """
+
+    # Below this many files to parse, starting worker processes costs more than it saves.
+    PARALLEL_THRESHOLD = 64
+
+    def __init__(self, base_path: str, list_files, cache_path: str | None = None):
+        self.base_path = os.path.abspath(base_path)
+        self.list_files = list_files
+        if cache_path is None:
+            cache_path = os.path.join(self.base_path, settings.ASSISTANT_DATA_DIR, "symbols.json")
+        self.cache_path = cache_path
+        # path -> (mtime_ns, size, content hash)
+        self._stats: dict[str, tuple[int, int, str]] = {}
+        # content hash -> parse result (None for files that don't parse)
+        self._parsed: dict[str, FileSymbols | None] = {}
+        self._lock = threading.RLock()
+        self._dirty: set[str] = set()
+        self._last_full_update = 0.0
+        self._sweeping = False
+        self._closed = False
+        self._listeners = []
+        # Lookup tables, rebuilt after each update.
+        self._by_name: dict[str, list[Symbol]] = {}
+        self._callers: dict[str, list[Reference]] = {}
+        self._load_cache()
+        self._rebuild_lookups()
+
+    # --- Persistence ---
+
+    # The cache lives inside the project, which may come from anyone: it is plain JSON (never
+    # pickle), and a file that doesn't have the expected shape is ignored.
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            stats = {path: (int(mtime), int(size), str(digest)) for path, (mtime, size, digest) in data["stats"].items()}
+            parsed = {}
+            for digest, entry in data["parsed"].items():
+                parsed[digest] = None if entry is None else FileSymbols(
+                    [Symbol(*row) for row in entry["definitions"]],
+                    [Import(*row) for row in entry["imports"]],
+                    [Reference(*row) for row in entry["references"]])
+            self._stats, self._parsed = stats, parsed
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            self._stats, self._parsed = {}, {}
+
+    def _save_cache(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        data = {"stats": self._stats,
+                "parsed": {digest: None if symbols is None else symbols._asdict()
+                           for digest, symbols in self._parsed.items()}}
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.cache_path)
+
+    # --- Indexing ---
+
+    def add_change_listener(self, callback):
+        """
+        Registers `callback(rel_path)`, told about every file whose parse result changed, from
+        whichever thread updated the index (with its lock held: callbacks must not wait on it).
+        """
+        self._listeners.append(callback)
+
+    def mark_dirty(self, rel_path: str, *_):
+        """Flags a file as changed; it is re-parsed on the next update."""
+        with self._lock:
+            self._dirty.add(rel_path.replace("\\", "/"))
+
+    def _stat_changed(self, rel_paths, known: dict) -> tuple[list, list]:
+        """The Python files among `rel_paths` whose (mtime, size) differ from `known`, and those that are gone."""
+        to_parse, missing = [], []
+        for rel_path in rel_paths:
+            if not rel_path.endswith(".py"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.base_path, rel_path))
+            except OSError:
+                missing.append(rel_path)
+                continue
+            cached = known.get(rel_path)
+            if cached is None or cached[0] != st.st_mtime_ns or cached[1] != st.st_size:
+                to_parse.append((rel_path, st))
+        return to_parse, missing
+
+    def _parse_all(self, to_parse: list) -> list:
+        jobs = [(rel_path, os.path.join(self.base_path, rel_path)) for rel_path, _ in to_parse]
+        if len(jobs) >= self.PARALLEL_THRESHOLD:
+            # Imported here: multiprocessing is slow to import and small projects never need it.
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor() as pool:
+                return list(pool.map(_parse_file, jobs, chunksize=32))
+        return [self._parse_cached(job) for job in jobs]
+
+    def _store(self, to_parse: list, results: list, missing, known: dict | None = None) -> int:
+        """
+        Records parse results and forgets missing files (under the lock). With `known`, the stats
+        a background sweep started from, entries that changed since (re-parsed on the request
+        path in the meantime) are left alone.
+        """
+        changed = []
+        for rel_path in missing:
+            if known is not None and self._stats.get(rel_path) != known.get(rel_path):
+                continue
+            if self._stats.pop(rel_path, None) is not None:
+                changed.append(rel_path)
+        for (rel_path, st), (_, digest, parsed) in zip(to_parse, results):
+            if known is not None and self._stats.get(rel_path) != known.get(rel_path):
+                continue
+            if digest is None:
+                self._stats.pop(rel_path, None)
+                continue
+            if self._stats.get(rel_path, (0, 0, None))[2] != digest:
+                changed.append(rel_path)
+            self._stats[rel_path] = (st.st_mtime_ns, st.st_size, digest)
+            if digest not in self._parsed:
+                self._parsed[digest] = parsed
+
+        if changed:
+            # Forget parse results no file points at any more.
+            live = {entry[2] for entry in self._stats.values()}
+            for digest in list(self._parsed):
+                if digest not in live:
+                    del self._parsed[digest]
+            self._rebuild_lookups()
+            self._save_cache()
+            for callback in self._listeners:
+                for rel_path in changed:
+                    callback(rel_path)
+        return len(changed)
+
+    def _sync(self, rel_paths, prune: bool) -> int:
+        rel_paths = list(rel_paths)
+        to_parse, missing = self._stat_changed(rel_paths, self._stats)
+        if prune:
+            seen = set(rel_paths)
+            missing += [rel_path for rel_path in self._stats if rel_path not in seen]
+        return self._store(to_parse, self._parse_all(to_parse), missing)
+
+    def _parse_cached(self, job):
+        """In-process parse that skips `ast` entirely when the content hash is already known."""
+        path, full_path = job
+        try:
+            with open(full_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return path, None, None
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        parsed = self._parsed.get(digest, _UNPARSED)
+        if parsed is not _UNPARSED:
+            return path, digest, parsed
+        return path, digest, parse_python_source(path, data.decode("utf-8", errors="replace"))
+
+    def _rebuild_lookups(self):
+        by_name: dict[str, list[Symbol]] = {}
+        callers: dict[str, list[Reference]] = {}
+        for rel_path, (_, _, digest) in self._stats.items():
+            parsed = self._parsed.get(digest)
+            if parsed is None:
+                continue
+            # Results are shared between identical files, so re-home them on this path.
+            for symbol in parsed.definitions:
+                by_name.setdefault(symbol.name, []).append(symbol._replace(path=rel_path))
+            for ref in parsed.references:
+                callers.setdefault(ref.name, []).append(ref._replace(path=rel_path))
+        self._by_name, self._callers = by_name, callers
+
+    def update(self) -> int:
+        """Re-parses every Python file whose content changed. Returns the number of changed files."""
+        with self._lock:
+            changed = self._sync([p.replace("\\", "/") for p in self.list_files()], prune=True)
+            if not changed and not self._by_name:
+                self._rebuild_lookups()
+            self._dirty.clear()
+            self._last_full_update = time.monotonic()
+            return changed
+
+    def _sweep(self):
+        """
+        A full update in the background: the project is listed, stat'ed and parsed without the
+        lock, which is only taken to record the results, so lookups are never held up for long.
+        """
+        try:
+            with self._lock:
+                if self._closed:
+                    return
+                known = dict(self._stats)
+            current = [p.replace("\\", "/") for p in self.list_files()]
+            to_parse, missing = self._stat_changed(current, known)
+            seen = set(current)
+            missing += [rel_path for rel_path in known if rel_path not in seen]
+            results = self._parse_all(to_parse)
+            with self._lock:
+                if self._closed:
+                    return
+                self._store(to_parse, results, missing, known)
+                if not self._by_name:
+                    self._rebuild_lookups()
+                self._last_full_update = time.monotonic()
+        except Exception as e:
+            print(f"Warning: could not refresh the symbol index: {e}")
+        finally:
+            self._sweeping = False
+
+    def ensure_fresh(self, max_age: float | None = None) -> int:
+        """
+        Cheap freshness check for the request path: only files flagged by `mark_dirty` are
+        re-parsed here. When the last full sweep is older than `max_age`, a new one starts in the
+        background; until the first one is done, lookups answer from the saved cache.
+        """
+        max_age = settings.RETRIEVAL_REFRESH_SECONDS if max_age is None else max_age
+        with self._lock:
+            if self._closed:
+                return 0
+            if time.monotonic() - self._last_full_update > max_age and not self._sweeping:
+                self._sweeping = True
+                threading.Thread(target=self._sweep, name="symbol-sweep", daemon=True).start()
+            if not self._dirty:
+                return 0
+            dirty, self._dirty = self._dirty, set()
+            return self._sync(dirty, prune=False)
+
+    def close(self):
+        """Stops a running sweep from recording anything (the index reopens from its cache)."""
+        with self._lock:
+            self._closed = True
+
+    # --- Queries ---
+
+    def content_hash(self, rel_path: str) -> str | None:
+        """The content hash the file was last parsed at (None if it isn't indexed)."""
+        with self._lock:
+            entry = self._stats.get(rel_path)
+            return entry[2] if entry else None
+
+    def imports_of(self, rel_path: str) -> list[Import]:
+        with self._lock:
+            entry = self._stats.get(rel_path)
+            parsed = self._parsed.get(entry[2]) if entry else None
+            return [i._replace(path=rel_path) for i in parsed.imports] if parsed else []
+
+    def definitions_in(self, rel_path: str) -> list[Symbol]:
+        with self._lock:
+            entry = self._stats.get(rel_path)
+            parsed = self._parsed.get(entry[2]) if entry else None
+            return [s._replace(path=rel_path) for s in parsed.definitions] if parsed else []
+
+    def lookup(self, name: str) -> list[Symbol]:
+        """Definitions called `name` (or whose qualified name is `name`, e.g. "ChatManager.add_message")."""
+        with self._lock:
+            if "." in name:
+                short = name.rsplit(".", 1)[1]
+                return [s for s in self._by_name.get(short, []) if s.qualname == name]
+            return list(self._by_name.get(name, []))
+
+    def callers(self, name: str) -> list[Symbol]:
+        """The definitions whose bodies call `name`."""
+        with self._lock:
+            result = {}
+            for ref in self._callers.get(name, []):
+                if not ref.scope:
+                    continue
+                short = ref.scope.rsplit(".", 1)[-1]
+                for symbol in self._by_name.get(short, []):
+                    if symbol.path == ref.path and symbol.qualname == ref.scope:
+                        result[(symbol.path, symbol.qualname)] = symbol
+            return list(result.values())
+
+    def mentioned_symbols(self, query: str) -> list[Symbol]:
+        """Definitions whose names appear in the query; `module_name` hints narrow them down."""
+        words = set(re.findall(r"[A-Za-z_][A-Za-z0-9_.]*", query))
+        found = []
+        with self._lock:
+            for word in words:
+                for candidate in {word, word.rsplit(".", 1)[-1]}:
+                    if len(candidate) > 2 and candidate in self._by_name:
+                        found.extend(self.lookup(word if "." in word else candidate))
+                        break
+            # "fix divide in math_util": prefer definitions living in a module the query names.
+            hinted = [s for s in found if os.path.splitext(os.path.basename(s.path))[0] in words]
+        return list(dict.fromkeys(hinted or found))
+
+    def context_for_query(self, query: str, read_file, max_callers: int | None = None) -> dict[str, str]:
+        """
+        Symbol-level context for the prompt: each mentioned definition and the functions that call it.
+        Files under SYMBOL_WHOLE_FILE_LINES lines are sent whole; larger ones only as excerpts.
+        """
+        max_callers = settings.SYMBOL_MAX_CALLERS if max_callers is None else max_callers
+        self.ensure_fresh()
+        context: dict[str, str] = {}
+        sources: dict[str, list[str] | None] = {}
+
+        def lines_of(path):
+            if path not in sources:
+                content = read_file(path)
+                # The head and tail of a huge file don't keep its line numbers; such files come from retrieval.
+                usable = content is not None and not isinstance(content, Excerpt)
+                sources[path] = content.splitlines() if usable else None
+            return sources[path]
+
+        def add(symbol: Symbol, note: str | None = None):
+            lines = lines_of(symbol.path)
+            if lines is None or symbol.path in context:
+                return
+            if note is None and len(lines) <= settings.SYMBOL_WHOLE_FILE_LINES:
+                context[symbol.path] = "\n".join(lines)
+                return
+            description = f"{symbol.qualname}, {note}" if note else symbol.qualname
+            label = f"{symbol.path} (excerpt: {description}, lines {symbol.start_line}-{symbol.end_line})"
+            context[label] = Excerpt("\n".join(lines[symbol.start_line - 1:symbol.end_line]))
+
+        for symbol in self.mentioned_symbols(query):
+            add(symbol)
+            for caller in self.callers(symbol.name)[:max_callers]:
+                add(caller, f"calls {symbol.name}")
+        return context
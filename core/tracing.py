@@ -0,0 +1,222 @@
+# core/tracing.py
+import bisect
+import contextlib
+import io
+import json
+import os
+import threading
+import time
+from collections import deque
+from config import settings
+
+
+class Span:
+    """One timed stage of a request. `attrs` carry sizes and counts (prompt tokens, response chars, ...)."""
+    __slots__ = ("name", "trace_id", "parent", "start", "seconds", "attrs")
+
+    def __init__(self, name: str, trace_id: str | None, parent: str | None, attrs: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.parent = parent
+        self.start = time.time()
+        self.seconds = 0.0
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "trace": self.trace_id, "parent": self.parent, "start": round(self.start, 6),
+                "seconds": round(self.seconds, 6), **self.attrs}
+
+
+class RollingHistogram:
+    """
+    Durations of one kind of span: quantiles over the last `size` samples (so they follow the
+    current session, not its whole history), plus running totals.
+    """
+
+    def __init__(self, size: int):
+        self._window = deque(maxlen=size)
+        self._sorted: list[float] = []
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        if len(self._window) == self._window.maxlen:
+            oldest = self._window[0]
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        self._window.append(value)
+        bisect.insort(self._sorted, value)
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> float:
+        if not self._sorted:
+            return 0.0
+        return self._sorted[min(len(self._sorted) - 1, int(q * len(self._sorted)))]
+
+    def snapshot(self) -> dict:
+        return {"count": self.count, "sum": round(self.total, 6), "p50": self.quantile(0.5),
+                "p90": self.quantile(0.9), "p99": self.quantile(0.99), "max": self._sorted[-1] if self._sorted else 0.0}
+
+
+class Tracer:
+    """
+    Records spans around the stages of a request, keeps a RollingHistogram per span name and
+    appends every finished span to a JSON-lines file (TRACE_FILE, if set). `prometheus_text()`
+    renders the histograms as Prometheus summaries.
+
+    A request is wrapped in `trace(trace_id, profile=...)`; spans opened on the same thread
+    inside it belong to that request. With `profile`, the request also runs under cProfile and
+    tracemalloc, and its root span reports where the time and memory went.
+    """
+
+    def __init__(self, enabled: bool | None = None, path: str | None = None, samples: int | None = None):
+        self.enabled = settings.TRACE_ENABLED if enabled is None else enabled
+        self.path = settings.TRACE_FILE if path is None else path
+        self.samples = samples or settings.TRACE_HISTOGRAM_SAMPLES
+        self._histograms: dict[str, RollingHistogram] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._tracemalloc_users = 0
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+            self._local.trace_id = None
+        return self._local.stack
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        """Times the block. Yields the Span, so the block can add attributes with `span.set(...)`."""
+        stack = self._stack()
+        span = Span(name, self._local.trace_id, stack[-1].name if stack else None, attrs)
+        if not self.enabled:
+            yield span
+            return
+        stack.append(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            span.seconds = time.perf_counter() - start
+            stack.pop()
+            self._finish(span)
+
+    def record(self, name: str, seconds: float, **attrs):
+        """Adds a span that was timed elsewhere (e.g. on a pool thread) to the current request."""
+        if not self.enabled:
+            return
+        stack = self._stack()
+        span = Span(name, self._local.trace_id, stack[-1].name if stack else None, attrs)
+        span.seconds = seconds
+        self._finish(span)
+
+    @contextlib.contextmanager
+    def trace(self, trace_id: str, profile: bool = False, **attrs):
+        """Wraps one request: its spans get `trace_id`, and the whole request is a span named "request"."""
+        self._stack()
+        outer = self._local.trace_id
+        self._local.trace_id = trace_id
+        profiler = self._start_profiling() if profile else None
+        try:
+            with self.span("request", **attrs) as span:
+                try:
+                    yield span
+                finally:
+                    if profiler is not None:
+                        span.set(**self._stop_profiling(profiler, trace_id))
+        finally:
+            self._local.trace_id = outer
+
+    def _start_profiling(self):
+        # The profilers are imported on demand: most runs never profile, and pstats is slow to import.
+        import cProfile
+        import tracemalloc
+        with self._lock:
+            self._tracemalloc_users += 1
+            if self._tracemalloc_users == 1 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _stop_profiling(self, profiler, trace_id: str) -> dict:
+        import pstats
+        import tracemalloc
+        profiler.disable()
+        _, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:5]
+        with self._lock:
+            self._tracemalloc_users -= 1
+            if self._tracemalloc_users == 0:
+                tracemalloc.stop()
+        result = {"memory_peak_bytes": peak, "memory_top": [str(stat) for stat in top]}
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(15)
+        result["profile_top"] = out.getvalue().strip().splitlines()[-20:]
+        if settings.TRACE_PROFILE_DIR:
+            try:
+                os.makedirs(settings.TRACE_PROFILE_DIR, exist_ok=True)
+                path = os.path.join(settings.TRACE_PROFILE_DIR, f"{trace_id}.prof")
+                profiler.dump_stats(path)
+                result["profile_path"] = path
+            except OSError as e:
+                print(f"Warning: could not save the profile of {trace_id}: {e}")
+        return result
+
+    def _finish(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str) if self.path else None
+        with self._lock:
+            histogram = self._histograms.get(span.name)
+            if histogram is None:
+                histogram = self._histograms[span.name] = RollingHistogram(self.samples)
+            histogram.add(span.seconds)
+            if line is not None:
+                self._write(line)
+
+    def _write(self, line: str):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) > settings.TRACE_FILE_MAX_BYTES:
+                os.replace(self.path, self.path + ".1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"Warning: could not write trace to {self.path}: {e}")
+            self.path = ""
+
+    # --- Export ---
+
+    def snapshot(self) -> dict[str, dict]:
+        """Per span name: count, sum and rolling quantiles of its duration in seconds."""
+        with self._lock:
+            return {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())}
+
+    def prometheus_text(self) -> str:
+        """The histograms in the Prometheus text exposition format (one summary, labelled by stage)."""
+        lines = ["# HELP code_assistant_stage_seconds Duration of the stages of AI requests.",
+                 "# TYPE code_assistant_stage_seconds summary"]
+        for name, stats in self.snapshot().items():
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            for q in ("0.5", "0.9", "0.99"):
+                value = stats["p" + q[2:].ljust(2, "0")]
+                lines.append(f'code_assistant_stage_seconds{{stage="{label}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'code_assistant_stage_seconds_sum{{stage="{label}"}} {stats["sum"]:.6f}')
+            lines.append(f'code_assistant_stage_seconds_count{{stage="{label}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Writes `prometheus_text()` atomically (for node_exporter's textfile collector, for example)."""
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(path + ".tmp", path)
+
+
+# The process-wide tracer the pipeline reports to.
+tracer = Tracer()
@@ -0,0 +1,367 @@
+# core/transaction.py
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import NamedTuple
+from config import settings
+from core.patching import PatchConflict, apply_patch
+from core.tracing import tracer
+
+_UNREAD = object()
+
+
+class ApplyError(Exception):
+    """An action of a batch could not be staged. Nothing in the project was changed."""
+
+
+class BatchResult(NamedTuple):
+    ok: bool
+    applied: list  # the actions that were committed: all of them, or none
+    error: str | None
+
+
+class _Op:
+    """Everything a batch does to one file (several actions on the same path are folded into one write)."""
+    __slots__ = ("rel_path", "target", "actions", "existed", "content", "newline", "tmp", "backup", "dirs", "seconds")
+
+    def __init__(self, rel_path: str, target: str):
+        self.rel_path = rel_path
+        self.target = target
+        self.actions = []
+        self.existed = False
+        self.content = None  # final text, or None when the file ends up deleted
+        self.newline = None  # None: write with the platform's line endings; "": keep them as they are
+        self.tmp = None
+        self.backup = None
+        self.dirs = []  # directories created to stage it, outermost first; removed again on rollback
+        self.seconds = 0.0  # time spent folding and staging it
+
+    def record(self) -> dict:
+        return {"path": self.rel_path, "target": self.target, "existed": self.existed,
+                "delete": self.content is None, "tmp": self.tmp, "backup": self.backup, "dirs": self.dirs}
+
+
+def _missing_dirs(directory: str) -> list[str]:
+    """The ancestors of `directory` (itself included) that don't exist yet, outermost first."""
+    missing = []
+    while not os.path.isdir(directory):
+        missing.append(directory)
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+    return missing[::-1]
+
+
+def _remove_dirs(dirs):
+    """Removes directories a batch created, deepest first, unless something else was put in them."""
+    for directory in sorted(set(dirs), key=len, reverse=True):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+
+def _fsync_path(path: str, directory: bool = False):
+    flags = os.O_RDONLY | (getattr(os, "O_DIRECTORY", 0) if directory else 0)
+    try:
+        fd = os.open(path, flags)
+    except OSError:
+        return  # e.g. directories can't be opened on Windows
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class ApplyTransaction:
+    """
+    Applies a batch of CodeActions all-or-nothing.
+
+    Every new file content is first written to a temp file next to its target, and the files
+    being replaced or deleted are kept as backups (hard links, so nothing is copied). A journal
+    under ASSISTANT_DATA_DIR/journal records the batch before the first target is touched; then
+    each temp file is moved over its target with os.replace. If a step fails, the targets already
+    replaced are restored from the backups. If the process dies half-way, `recover()` rolls the
+    batch back (or replays it) on the next start.
+
+    Staging runs on a thread pool, one task per file, and the fsyncs are issued together once
+    everything is written instead of after each file.
+    """
+
+    def __init__(self, base_path: str, workers: int | None = None, fsync: bool | None = None):
+        self.base_path = os.path.abspath(base_path)
+        self.journal_root = os.path.join(self.base_path, settings.ASSISTANT_DATA_DIR, "journal")
+        self.workers = settings.APPLY_WORKERS if workers is None else workers
+        self.fsync = settings.APPLY_FSYNC if fsync is None else fsync
+        self._lock = threading.Lock()  # one batch at a time
+        self._pool = None
+
+    def _map(self, fn, items):
+        items = list(items)
+        if len(items) <= 1 or self.workers <= 1:
+            return [fn(item) for item in items]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="apply")
+        futures = [self._pool.submit(fn, item) for item in items]
+        # Let every task finish before raising, so no temp file is still being written during cleanup.
+        wait(futures)
+        return [future.result() for future in futures]
+
+    # --- Staging ---
+
+    def _fold(self, op: _Op):
+        """Works out the final content of one file from the actions of the batch that touch it."""
+        exists = os.path.exists(op.target)
+        op.existed = exists
+        content = _UNREAD
+        for action in op.actions:
+            action_type = action['action_type']
+            if action_type == "CREATE":
+                content, op.newline, exists = action['code'], None, True
+            elif action_type == "UPDATE":
+                if not exists:
+                    raise ApplyError(f"Cannot update non-existent file: {op.rel_path}")
+                content, op.newline = action['code'], None
+            elif action_type == "PATCH":
+                if not exists:
+                    raise ApplyError(f"Cannot patch non-existent file: {op.rel_path}")
+                if content is _UNREAD:
+                    with open(op.target, 'r', encoding='utf-8', newline='') as f:
+                        content = f.read()
+                    op.newline = ""
+                elif isinstance(content, bytes):
+                    content, op.newline = content.decode('utf-8'), ""
+                try:
+                    content = apply_patch(content, action['code'])
+                except PatchConflict as e:
+                    raise ApplyError(f"Patch conflict in {op.rel_path}: {e}") from None
+            elif action_type == "RESTORE":
+                # Internal (undo): put back the exact bytes a file had before.
+                content, exists = action['code'], True
+            elif action_type == "DELETE":
+                if not exists:
+                    raise ApplyError(f"Cannot delete non-existent file: {op.rel_path}")
+                content, exists = None, False
+            else:
+                raise ApplyError(f"Unknown action type '{action_type}'")
+        op.content = content if exists else None
+
+    def _stage(self, args):
+        op, txid, index = args
+        start = time.perf_counter()
+        self._fold(op)
+        if op.content is not None:
+            os.makedirs(os.path.dirname(op.target), exist_ok=True)
+            op.tmp = f"{op.target}.{txid}.tmp"
+            if isinstance(op.content, bytes):
+                with open(op.tmp, 'wb') as f:
+                    f.write(op.content)
+            else:
+                with open(op.tmp, 'w', encoding='utf-8', newline=op.newline) as f:
+                    f.write(op.content)
+            if op.existed:
+                shutil.copymode(op.target, op.tmp)
+        if op.existed:
+            op.backup = os.path.join(self.journal_root, txid, f"{index}.bak")
+            try:
+                os.link(op.target, op.backup)
+            except OSError:
+                shutil.copy2(op.target, op.backup)
+        op.seconds = time.perf_counter() - start
+
+    # --- Journal ---
+
+    def _write_journal(self, txid: str, state: str, ops: list[_Op]):
+        # "staging" only tells recovery which temp files and directories to delete, so it isn't worth an fsync.
+        durable = self.fsync and state != "staging"
+        directory = os.path.join(self.journal_root, txid)
+        path = os.path.join(directory, "journal.json")
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({"txid": txid, "state": state, "ops": [op.record() for op in ops]}, f)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        if durable:
+            _fsync_path(directory, directory=True)
+
+    def _discard(self, txid: str):
+        shutil.rmtree(os.path.join(self.journal_root, txid), ignore_errors=True)
+
+    # --- Commit ---
+
+    def apply(self, entries: list[tuple[str, str, dict]]) -> BatchResult:
+        """
+        Applies `(rel_path, absolute_target, action)` entries as one transaction.
+        Raises nothing: failures (invalid actions, patch conflicts, I/O errors while journaling,
+        staging or committing) come back as BatchResult(ok=False, ...), after the project has
+        been put back as it was, directories created for the batch included.
+        """
+        actions = [action for _, _, action in entries]
+        ops: dict[str, _Op] = {}
+        for rel_path, target, action in entries:
+            key = os.path.normcase(target)
+            if key not in ops:
+                ops[key] = _Op(rel_path, target)
+            ops[key].actions.append(action)
+        ops = list(ops.values())
+        if not ops:
+            return BatchResult(True, [], None)
+
+        with self._lock:
+            txid = uuid.uuid4().hex[:12]
+            try:
+                # Phase 1: stage every file in parallel. The targets are not touched yet.
+                try:
+                    with tracer.span("apply.stage", files=len(ops)):
+                        # Known before the staging journal is written, so recovery can remove them too.
+                        for op in ops:
+                            op.dirs = _missing_dirs(os.path.dirname(op.target))
+                        os.makedirs(os.path.join(self.journal_root, txid), exist_ok=True)
+                        self._write_journal(txid, "staging", ops)
+                        self._map(self._stage, [(op, txid, i) for i, op in enumerate(ops)])
+                    for op in ops:
+                        tracer.record("apply.file", op.seconds, path=op.rel_path, actions=len(op.actions),
+                                      chars=len(op.content) if op.content is not None else 0)
+                    if self.fsync:
+                        with tracer.span("apply.fsync", files=len(ops)):
+                            self._map(_fsync_path, [op.tmp for op in ops if op.tmp])
+                    self._write_journal(txid, "prepared", ops)
+                except (ApplyError, OSError, UnicodeError) as e:
+                    self._cleanup_staged(ops)
+                    return BatchResult(False, [], str(e))
+
+                # Phase 2: swap the staged files in. From here on a failure is rolled back.
+                done = []
+                try:
+                    with tracer.span("apply.commit", files=len(ops)):
+                        for op in ops:
+                            if op.tmp:
+                                os.replace(op.tmp, op.target)
+                            else:
+                                os.remove(op.target)
+                            done.append(op)
+                except OSError as e:
+                    failed = self._rollback([op.record() for op in done])
+                    self._cleanup_staged(ops)
+                    if failed:
+                        return BatchResult(False, [], f"{e} (could not roll back: {', '.join(failed)})")
+                    return BatchResult(False, [], f"{e} (all changes were rolled back)")
+                if self.fsync:
+                    self._map(lambda d: _fsync_path(d, directory=True), {os.path.dirname(op.target) for op in ops})
+                return BatchResult(True, actions, None)
+            finally:
+                self._discard(txid)
+
+    def _cleanup_staged(self, ops: list[_Op]):
+        """Removes the temp files and the directories created for them (never raises)."""
+        for op in ops:
+            if op.tmp and os.path.exists(op.tmp):
+                try:
+                    os.remove(op.tmp)
+                except OSError as e:
+                    print(f"Warning: could not remove the staged file {op.tmp}: {e}")
+        _remove_dirs(d for op in ops for d in op.dirs)
+
+    @staticmethod
+    def _rollback(records: list[dict]) -> list[str]:
+        """Puts the replaced files back and removes the created ones. Returns the paths it couldn't restore."""
+        failed = []
+        for record in reversed(records):
+            target = record["target"]
+            try:
+                if record["backup"] and os.path.exists(record["backup"]):
+                    os.replace(record["backup"], target)
+                elif not record["existed"] and os.path.exists(target):
+                    os.remove(target)
+            except OSError as e:
+                print(f"Error: could not roll back {target}: {e}")
+                failed.append(record["path"])
+        _remove_dirs(d for record in records for d in record.get("dirs", ()))
+        return failed
+
+    # --- Crash recovery ---
+
+    def recover(self, mode: str | None = None) -> int:
+        """
+        Finishes batches left behind by a crash: "rollback" restores the files they had already
+        replaced, "replay" completes them from the staged files. Returns how many were found.
+        A batch that can't be finished keeps its journal (and backups), and is tried again on the
+        next start.
+        """
+        mode = mode or settings.APPLY_RECOVERY_MODE
+        if not os.path.isdir(self.journal_root):
+            return 0
+        found = 0
+        with self._lock:
+            for entry in os.scandir(self.journal_root):
+                if not entry.is_dir():
+                    continue
+                path = os.path.join(entry.path, "journal.json")
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        journal = json.load(f)
+                except (OSError, ValueError):
+                    journal = None
+                failed = []
+                if journal is not None and journal["state"] == "staging":
+                    # Died while staging: the targets were never touched, only the temp files are left.
+                    failed = self._recover_staging(journal)
+                elif journal is not None:
+                    found += 1
+                    records = journal["ops"]
+                    if mode == "replay":
+                        failed = self._replay(records) + self._remove_tmps(records)
+                    else:
+                        # Temp files first: the directories created for them are only removed once empty.
+                        failed = self._remove_tmps(records) + self._rollback(records)
+                    if not failed:
+                        print(f"Recovered an interrupted batch of {len(records)} file(s) ({mode}).")
+                if failed:
+                    print(f"Error: Could not finish the interrupted batch {entry.name} ({', '.join(failed)}). "
+                          f"Its journal is kept in {entry.path}; recovery is tried again on the next start.")
+                    continue
+                shutil.rmtree(entry.path, ignore_errors=True)
+        return found
+
+    @staticmethod
+    def _remove_tmps(records: list[dict], txid: str | None = None) -> list[str]:
+        """Removes the temp files of a batch. Returns the paths it couldn't remove."""
+        failed = []
+        for record in records:
+            tmp = f"{record['target']}.{txid}.tmp" if txid else record["tmp"]
+            try:
+                if tmp and os.path.exists(tmp):
+                    os.remove(tmp)
+            except OSError as e:
+                print(f"Warning: could not remove the staged file {tmp}: {e}")
+                failed.append(record["path"])
+        return failed
+
+    def _recover_staging(self, journal: dict) -> list[str]:
+        records = journal["ops"]
+        failed = self._remove_tmps(records, journal["txid"])
+        _remove_dirs(d for record in records for d in record.get("dirs", ()))
+        return failed
+
+    @staticmethod
+    def _replay(records: list[dict]) -> list[str]:
+        """Moves the staged files of a prepared batch into place. Returns the paths it couldn't finish."""
+        failed = []
+        for record in records:
+            try:
+                if record["tmp"] and os.path.exists(record["tmp"]):
+                    os.replace(record["tmp"], record["target"])
+                elif record["delete"] and os.path.exists(record["target"]):
+                    os.remove(record["target"])
+            except OSError as e:
+                print(f"Error: could not replay {record['target']}: {e}")
+                failed.append(record["path"])
+        return failed
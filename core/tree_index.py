@@ -0,0 +1,393 @@
+# core/tree_index.py
+import os
+import sys
+import threading
+from config import settings
+from core.tree_walker import TreeNode, TreeWalker, render_tree
+
+
+class TreeIndex:
+    """
+    A persistent, in-memory snapshot of the project tree.
+
+    The tree is walked once, then kept current by `add_path`/`remove_path`/`refresh_dir`
+    (called by FileSystemManager and by the filesystem watcher). Each directory caches its
+    rendered subtree, so a change only re-renders the directories on the path to the root.
+    """
+
+    def __init__(self, base_path: str, ignored: set[str] | None = None):
+        self.base_path = os.path.abspath(base_path)
+        self.ignored = ignored if ignored is not None else settings.IGNORED_PATH
+        # The index holds the full tree; the budgets are only applied when rendering.
+        self.walker = TreeWalker(self.base_path, self.ignored)
+        self._root: TreeNode | None = None
+        self._rendered: str | None = None
+        # Bumped on every change to the set of files, so users of `iter_files` know when to list again.
+        self.version = 0
+        self._lock = threading.RLock()
+        self._watcher = None
+
+    # --- Building ---
+
+    def _ensure_built(self) -> TreeNode:
+        if self._root is None:
+            self._root = self.walker.walk()
+            self._rendered = None
+            self.version += 1
+        return self._root
+
+    def rebuild(self):
+        """Drops the snapshot and walks the whole tree again (e.g. after an inotify overflow)."""
+        with self._lock:
+            self._root = None
+            self._ensure_built()
+
+    def _walk_child(self, parent: TreeNode, name: str, rel: str) -> TreeNode:
+        child = self.walker.walk(rel, parent.ignore, name)
+        child.parent = parent
+        return child
+
+    def _rewalk(self, node: TreeNode, rel: str):
+        """Re-reads a whole subtree, e.g. because its .gitignore changed."""
+        parent_ctx = node.parent.ignore if node.parent is not None else None
+        fresh = self.walker.walk(rel, parent_ctx, node.name) if rel else self.walker.walk()
+        node.children = fresh.children
+        node.ignore = fresh.ignore
+        for child in node.children.values():
+            if child is not None:
+                child.parent = node
+        self._mark_dirty(node)
+
+    # --- Rendering ---
+
+    def render(self) -> str:
+        """Returns the project tree as a string, re-rendering only the dirty subtrees."""
+        with self._lock:
+            if self._rendered is None:
+                self._rendered = render_tree(self._ensure_built(),
+                                             max_depth=settings.TREE_MAX_DEPTH,
+                                             max_entries_per_dir=settings.TREE_MAX_ENTRIES_PER_DIR,
+                                             max_total_entries=settings.TREE_MAX_TOTAL_ENTRIES)
+            return self._rendered
+
+    # --- Incremental updates ---
+
+    def _split(self, rel_path: str) -> list[str]:
+        rel_path = os.path.relpath(os.path.join(self.base_path, rel_path), self.base_path)
+        if rel_path == os.curdir:
+            return []
+        return [p for p in rel_path.replace("\\", "/").split("/") if p]
+
+    def _find_dir(self, parts: list[str], create: bool = False) -> TreeNode | None:
+        node = self._ensure_built()
+        for depth, part in enumerate(parts):
+            child = node.children.get(part)
+            if child is None:
+                rel = "/".join(parts[:depth + 1])
+                if not create or self.walker.is_ignored(rel, True, node.ignore):
+                    return None
+                child = TreeNode(part, node)
+                child.ignore = node.ignore
+                node.children[part] = child
+                self._mark_dirty(node)
+            node = child
+        return node
+
+    def _mark_dirty(self, node: TreeNode | None):
+        # Always go up to the root: nodes past the depth budget never get a cached block,
+        # so stopping at the first dirty node could leave a stale ancestor behind.
+        while node is not None:
+            node.block = None
+            node = node.parent
+        self._rendered = None
+        self.version += 1
+
+    def add_path(self, rel_path: str, is_dir: bool = False):
+        """Registers a created file or directory (and the directories leading to it)."""
+        parts = self._split(rel_path)
+        if not parts or parts[0] == os.pardir:
+            return
+        with self._lock:
+            parent = self._find_dir(parts[:-1], create=True)
+            if parent is None:
+                return
+            name = parts[-1]
+            rel = "/".join(parts)
+            if name == ".gitignore":
+                self._rewalk(parent, "/".join(parts[:-1]))
+                return
+            if self.walker.is_ignored(rel, is_dir, parent.ignore):
+                return
+            existing = parent.children.get(name, False)
+            if is_dir:
+                if isinstance(existing, TreeNode):
+                    return
+                parent.children[name] = self._walk_child(parent, name, rel)
+            else:
+                if existing is None:
+                    return
+                parent.children[name] = None
+            self._mark_dirty(parent)
+
+    def remove_path(self, rel_path: str):
+        """Forgets a deleted file or directory."""
+        parts = self._split(rel_path)
+        if not parts:
+            return
+        with self._lock:
+            parent = self._find_dir(parts[:-1])
+            if parent is None or parts[-1] not in parent.children:
+                return
+            del parent.children[parts[-1]]
+            if parts[-1] == ".gitignore":
+                self._rewalk(parent, "/".join(parts[:-1]))
+            self._mark_dirty(parent)
+
+    def refresh_dir(self, rel_dir: str):
+        """Re-reads the direct entries of one directory and reconciles them with the snapshot."""
+        parts = self._split(rel_dir)
+        full_path = os.path.join(self.base_path, *parts)
+        with self._lock:
+            node = self._find_dir(parts)
+            if node is None:
+                return
+            if not os.path.isdir(full_path):
+                if parts:
+                    self.remove_path(rel_dir)
+                return
+
+            entries = self.walker._list(full_path)
+            if entries is None:
+                return
+            if (".gitignore" in node.children) != any(n == ".gitignore" for n, _ in entries):
+                self._rewalk(node, "/".join(parts))
+                return
+
+            prefix = "/".join(parts)
+            fresh: dict[str, bool] = {}
+            for name, is_dir in entries:
+                rel = f"{prefix}/{name}" if prefix else name
+                if not self.walker.is_ignored(rel, is_dir, node.ignore):
+                    fresh[name] = is_dir
+
+            changed = False
+            for name in list(node.children):
+                if name not in fresh:
+                    del node.children[name]
+                    changed = True
+            for name, is_dir in fresh.items():
+                current = node.children.get(name, False)
+                if is_dir and not isinstance(current, TreeNode):
+                    node.children[name] = self._walk_child(node, name, f"{prefix}/{name}" if prefix else name)
+                    changed = True
+                elif not is_dir and current is not None:
+                    node.children[name] = None
+                    changed = True
+            if changed:
+                self._mark_dirty(node)
+
+    def iter_dirs(self, rel_dir: str = ""):
+        """Returns the relative paths of all known directories under `rel_dir` (inclusive)."""
+        with self._lock:
+            start = self._find_dir(self._split(rel_dir))
+            if start is None:
+                return []
+            result = []
+            stack = [(start, "/".join(self._split(rel_dir)))]
+            while stack:
+                node, rel = stack.pop()
+                result.append(rel)
+                for name, child in node.children.items():
+                    if child is not None:
+                        stack.append((child, f"{rel}/{name}" if rel else name))
+            return result
+
+    def iter_files(self) -> list[str]:
+        """Returns the relative paths of all known files (ignore rules already applied)."""
+        with self._lock:
+            result = []
+            stack = [(self._ensure_built(), "")]
+            while stack:
+                node, rel = stack.pop()
+                for name, child in node.children.items():
+                    child_rel = f"{rel}/{name}" if rel else name
+                    if child is None:
+                        result.append(child_rel)
+                    else:
+                        stack.append((child, child_rel))
+            return result
+
+    # --- Watching ---
+
+    def start_watching(self, poll_interval: float | None = None):
+        """Starts a background watcher: inotify on Linux, mtime polling everywhere else."""
+        if self._watcher is not None:
+            return
+        self._ensure_built()
+        watcher = None
+        if sys.platform.startswith("linux"):
+            try:
+                watcher = _InotifyWatcher(self)
+            except OSError as e:
+                print(f"inotify unavailable ({e}), falling back to polling.")
+        if watcher is None:
+            interval = poll_interval if poll_interval is not None else settings.TREE_POLL_INTERVAL
+            watcher = _PollingWatcher(self, interval)
+        self._watcher = watcher
+        watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+
+class _PollingWatcher(threading.Thread):
+    """Detects changes by comparing directory mtimes; adding or removing an entry bumps its parent."""
+
+    def __init__(self, index: TreeIndex, interval: float):
+        super().__init__(name="tree-index-poller", daemon=True)
+        self.index = index
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._mtimes: dict[str, int] = {}
+
+    def _stat_all(self) -> dict[str, int]:
+        mtimes = {}
+        for rel in self.index.iter_dirs():
+            try:
+                mtimes[rel] = os.stat(os.path.join(self.index.base_path, rel)).st_mtime_ns
+            except OSError:
+                mtimes[rel] = -1
+        return mtimes
+
+    def run(self):
+        self._mtimes = self._stat_all()
+        while not self._stop_event.wait(self.interval):
+            current = self._stat_all()
+            # Shallow directories first, so a parent refresh picks up whole new subtrees.
+            for rel in sorted(current, key=lambda r: r.count("/")):
+                if self._mtimes.get(rel) != current[rel]:
+                    self.index.refresh_dir(rel)
+            # Compare against the snapshot the refresh was based on: re-statting here would mark
+            # changes made during the refresh as seen. Directories the refresh discovered have no
+            # entry yet, so they are refreshed (and picked up) on the next round.
+            self._mtimes = current
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class _InotifyWatcher(threading.Thread):
+    """Linux inotify watcher, talking to libc through ctypes (no extra dependency)."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = (IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+                  | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+    def __init__(self, index: TreeIndex):
+        super().__init__(name="tree-index-inotify", daemon=True)
+        import ctypes
+        import ctypes.util
+
+        self.index = index
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._ctypes = ctypes
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wd_to_rel: dict[int, str] = {}
+        self._stop_event = threading.Event()
+        try:
+            for rel in index.iter_dirs():
+                self._add_watch(rel)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _add_watch(self, rel: str):
+        path = os.path.join(self.index.base_path, rel).encode(sys.getfilesystemencoding())
+        wd = self._libc.inotify_add_watch(self._fd, path, self.WATCH_MASK)
+        if wd < 0:
+            err = self._ctypes.get_errno()
+            # ENOSPC means we ran out of fs.inotify.max_user_watches; that's fatal for this watcher.
+            if err == 28:
+                raise OSError(err, "inotify watch limit reached")
+            return
+        self._wd_to_rel[wd] = rel
+
+    def _handle(self, wd: int, mask: int, name: str):
+        if mask & self.IN_Q_OVERFLOW:
+            self.index.rebuild()
+            try:
+                for rel in self.index.iter_dirs():
+                    self._add_watch(rel)
+            except OSError as e:
+                print(f"Tree watcher: cannot re-watch the project after an overflow: {e}")
+            return
+        if mask & self.IN_IGNORED:
+            self._wd_to_rel.pop(wd, None)
+            return
+        rel_dir = self._wd_to_rel.get(wd)
+        if rel_dir is None:
+            return
+        if mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+            if rel_dir:
+                self.index.remove_path(rel_dir)
+            return
+
+        rel = f"{rel_dir}/{name}" if rel_dir else name
+        is_dir = bool(mask & self.IN_ISDIR)
+        if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+            self.index.add_path(rel, is_dir=is_dir)
+            if is_dir:
+                try:
+                    for sub in self.index.iter_dirs(rel):
+                        self._add_watch(sub)
+                except OSError as e:
+                    print(f"Tree watcher: cannot watch new directory '{rel}': {e}")
+        elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+            self.index.remove_path(rel)
+        elif mask & self.IN_CLOSE_WRITE and name == ".gitignore":
+            # Edited ignore rules: re-walk the folder that holds them.
+            self.index.add_path(rel)
+
+    def run(self):
+        import select
+        import struct
+
+        header = struct.Struct("iIII")
+        try:
+            while not self._stop_event.is_set():
+                ready, _, _ = select.select([self._fd], [], [], 0.5)
+                if not ready:
+                    continue
+                try:
+                    data = os.read(self._fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                offset = 0
+                while offset + header.size <= len(data):
+                    wd, mask, _cookie, length = header.unpack_from(data, offset)
+                    offset += header.size
+                    raw_name = data[offset:offset + length].rstrip(b"\0")
+                    offset += length
+                    self._handle(wd, mask, raw_name.decode(sys.getfilesystemencoding(), "surrogateescape"))
+        finally:
+            os.close(self._fd)
+
+    def stop(self):
+        self._stop_event.set()
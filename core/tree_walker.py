@@ -0,0 +1,373 @@
+# core/tree_walker.py
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from config import settings
+
+# Marker for "work the .gitignore chain out from disk" (None is a valid, empty chain).
+_FROM_DISK = object()
+# A directory holding this file is a virtualenv.
+_VENV_MARKER = "pyvenv.cfg"
+
+
+class GitIgnore:
+    """The patterns of one .gitignore file, matched against paths relative to the folder holding it."""
+
+    def __init__(self, lines):
+        # Each rule: (compiled regex, negated, dir_only, anchored)
+        self.rules = []
+        for raw in lines:
+            line = raw.rstrip("\n").rstrip("\r")
+            if not line.strip() or line.startswith("#"):
+                continue
+            line = line.rstrip(" ")
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            if line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            line = line.lstrip("/")
+            self.rules.append((re.compile(self._translate(line)), negated, dir_only, anchored))
+
+    @classmethod
+    def from_file(cls, path: str) -> "GitIgnore | None":
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                ignore = cls(f)
+        except OSError:
+            return None
+        return ignore if ignore.rules else None
+
+    @staticmethod
+    def _translate(pattern: str) -> str:
+        """Converts a gitignore glob into a regex (supports `*`, `?`, `[...]` and `**`)."""
+        out = []
+        i, n = 0, len(pattern)
+        while i < n:
+            c = pattern[i]
+            if pattern.startswith("**/", i):
+                out.append("(?:.*/)?")
+                i += 3
+            elif pattern.startswith("/**", i) and i + 3 == n:
+                out.append("/.*")
+                i += 3
+            elif pattern.startswith("**", i):
+                out.append(".*")
+                i += 2
+            elif c == "*":
+                out.append("[^/]*")
+                i += 1
+            elif c == "?":
+                out.append("[^/]")
+                i += 1
+            elif c == "[":
+                j = pattern.find("]", i + 1)
+                if j == -1:
+                    out.append(re.escape(c))
+                    i += 1
+                else:
+                    body = pattern[i + 1:j]
+                    if body.startswith("!"):
+                        body = "^" + body[1:]
+                    out.append(f"[{body}]")
+                    i = j + 1
+            else:
+                out.append(re.escape(c))
+                i += 1
+        return "".join(out) + r"\Z"
+
+    def match(self, rel_path: str, name: str, is_dir: bool) -> bool | None:
+        """True if ignored, False if explicitly re-included with `!`, None if no rule applies."""
+        for regex, negated, dir_only, anchored in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path if anchored else name):
+                return not negated
+        return None
+
+
+class IgnoreContext:
+    """The chain of .gitignore files that apply inside one directory (deepest first wins)."""
+    __slots__ = ("parent", "base_rel", "gitignore")
+
+    def __init__(self, parent: "IgnoreContext | None", base_rel: str, gitignore: GitIgnore | None):
+        self.parent = parent
+        self.base_rel = base_rel
+        self.gitignore = gitignore
+
+    def is_ignored(self, rel_path: str, name: str, is_dir: bool) -> bool:
+        ctx = self
+        while ctx is not None:
+            if ctx.gitignore is not None:
+                sub_path = rel_path[len(ctx.base_rel) + 1:] if ctx.base_rel else rel_path
+                verdict = ctx.gitignore.match(sub_path, name, is_dir)
+                if verdict is not None:
+                    return verdict
+            ctx = ctx.parent
+        return False
+
+
+class TreeNode:
+    """A directory in a walked tree. Files are stored as `None` children."""
+    __slots__ = ("name", "parent", "children", "ignore", "elided_dirs", "elided_files", "explored", "block")
+
+    def __init__(self, name: str, parent: "TreeNode | None" = None):
+        self.name = name
+        self.parent = parent
+        self.children: dict[str, "TreeNode | None"] = {}
+        self.ignore: IgnoreContext | None = None
+        # Entries dropped by the walk-time budgets; they are only summarised when rendering.
+        self.elided_dirs = 0
+        self.elided_files = 0
+        # False for directories past the depth budget, which were never listed.
+        self.explored = True
+        # Cached rendering of everything *below* this directory (None means dirty).
+        self.block: str | None = None
+
+
+def _elision_line(dirs: int, files: int) -> str:
+    if dirs and files:
+        return f"... ({dirs} more directories, {files} more files)"
+    if dirs:
+        return f"... ({dirs} more directories)"
+    return f"... ({files} more files)"
+
+
+def _render_block(node: TreeNode, depth: int, max_depth: int | None, max_entries: int | None) -> str:
+    if node.block is not None:
+        return node.block
+
+    names = sorted(node.children)
+    elided_dirs, elided_files = node.elided_dirs, node.elided_files
+    if max_entries is not None and len(names) > max_entries:
+        for name in names[max_entries:]:
+            if node.children[name] is None:
+                elided_files += 1
+            else:
+                elided_dirs += 1
+        names = names[:max_entries]
+
+    lines = []
+    has_elision = bool(elided_dirs or elided_files)
+    for index, name in enumerate(names):
+        is_last = index == len(names) - 1 and not has_elision
+        connector = "└── " if is_last else "├── "
+        child = node.children[name]
+        if child is None:
+            lines.append(f"{connector}{name}")
+            continue
+        lines.append(f"{connector}{name}/")
+        if max_depth is not None and depth + 1 >= max_depth:
+            if child.children or child.elided_dirs or child.elided_files or not child.explored:
+                sub_block = "└── ..." if not child.explored else "└── " + _elision_line(
+                    sum(1 for c in child.children.values() if c is not None) + child.elided_dirs,
+                    sum(1 for c in child.children.values() if c is None) + child.elided_files)
+            else:
+                sub_block = ""
+        else:
+            sub_block = _render_block(child, depth + 1, max_depth, max_entries)
+        if sub_block:
+            pad = "    " if is_last else "│   "
+            # Prefixing a cached block is a couple of C-level string operations.
+            lines.append(pad + sub_block.replace("\n", "\n" + pad))
+    if has_elision:
+        lines.append("└── " + _elision_line(elided_dirs, elided_files))
+
+    node.block = "\n".join(lines)
+    return node.block
+
+
+def render_tree(root: TreeNode, max_depth: int | None = None, max_entries_per_dir: int | None = None,
+                max_total_entries: int | None = None) -> str:
+    """
+    Renders a walked tree in the `├──`/`└──` format used in prompts.
+    Per-directory blocks are cached on the nodes, so re-rendering after a change is cheap.
+    """
+    block = _render_block(root, 0, max_depth, max_entries_per_dir)
+    result = f"{root.name}/\n{block}" if block else f"{root.name}/"
+    if max_total_entries is not None and block:
+        total = block.count("\n") + 1
+        if total > max_total_entries:
+            cut = -1
+            for _ in range(max_total_entries + 1):
+                cut = result.index("\n", cut + 1)
+            result = f"{result[:cut]}\n... ({total - max_total_entries} more entries)"
+    return result
+
+
+def to_nested(node: TreeNode) -> list:
+    """Converts a tree into the legacy `['folder', [...]]` / `['file']` list format."""
+    items = []
+    for name in sorted(node.children):
+        child = node.children[name]
+        items.append([name, to_nested(child)[1]] if child is not None else [name])
+    return [node.name, items]
+
+
+class TreeWalker:
+    """
+    The one directory walker of the project.
+
+    Built on `os.scandir` (so `DirEntry` type info is reused instead of extra stat calls),
+    honours `IGNORED_PATH`, `.gitignore` files and virtualenvs of any name, enforces depth and
+    entry budgets, and walks large trees level by level on a thread pool.
+    """
+
+    # Below this many directories in a level the pool costs more than it saves.
+    PARALLEL_THRESHOLD = 16
+
+    def __init__(self, base_path: str, ignored: set[str] | None = None, use_gitignore: bool | None = None,
+                 max_depth: int | None = None, max_entries_per_dir: int | None = None,
+                 max_total_entries: int | None = None, workers: int | None = None):
+        self.base_path = os.path.abspath(base_path)
+        self.ignored = ignored if ignored is not None else settings.IGNORED_PATH
+        self.use_gitignore = settings.TREE_USE_GITIGNORE if use_gitignore is None else use_gitignore
+        self.max_depth = max_depth
+        self.max_entries_per_dir = max_entries_per_dir
+        self.max_total_entries = max_total_entries
+        self.workers = settings.TREE_WALK_WORKERS if workers is None else workers
+
+    # --- Ignore rules ---
+
+    def _load_context(self, parent: IgnoreContext | None, rel_dir: str, names) -> IgnoreContext | None:
+        if not self.use_gitignore or ".gitignore" not in names:
+            return parent
+        gitignore = GitIgnore.from_file(os.path.join(self.base_path, rel_dir, ".gitignore"))
+        return IgnoreContext(parent, rel_dir, gitignore) if gitignore else parent
+
+    def ignore_context_for(self, rel_dir: str) -> IgnoreContext | None:
+        """Builds the .gitignore chain that applies inside `rel_dir` (relative to the base path)."""
+        ctx = None
+        parts = [p for p in rel_dir.replace("\\", "/").split("/") if p]
+        for depth in range(len(parts) + 1):
+            current = "/".join(parts[:depth])
+            if self.use_gitignore and os.path.isfile(os.path.join(self.base_path, current, ".gitignore")):
+                ctx = self._load_context(ctx, current, (".gitignore",))
+        return ctx
+
+    def is_virtualenv(self, rel_dir: str, names=None) -> bool:
+        """A directory with a pyvenv.cfg is a virtualenv, whatever it is called; such directories are left out."""
+        if names is not None:
+            return _VENV_MARKER in names
+        return os.path.isfile(os.path.join(self.base_path, rel_dir, _VENV_MARKER))
+
+    def is_ignored(self, rel_path: str, is_dir: bool, ctx: IgnoreContext | None = None) -> bool:
+        name = rel_path.rsplit("/", 1)[-1]
+        if name in self.ignored:
+            return True
+        return ctx is not None and ctx.is_ignored(rel_path, name, is_dir)
+
+    # --- Walking ---
+
+    def _list(self, full_path: str) -> list[tuple[str, bool]] | None:
+        try:
+            with os.scandir(full_path) as it:
+                entries = []
+                for entry in it:
+                    try:
+                        entries.append((entry.name, entry.is_dir(follow_symlinks=False)))
+                    except OSError:
+                        entries.append((entry.name, False))
+                return entries
+        except OSError:
+            return None
+
+    def walk(self, rel_dir: str = "", ignore_ctx=_FROM_DISK, name: str | None = None) -> TreeNode:
+        """
+        Walks `rel_dir` (relative to the base path) and returns its TreeNode.
+        `ignore_ctx` is the .gitignore chain of the parent; it is rebuilt from disk when omitted.
+        """
+        rel_dir = "/".join(p for p in rel_dir.replace("\\", "/").split("/") if p)
+        if name is None:
+            name = os.path.basename(os.path.realpath(os.path.join(self.base_path, rel_dir)))
+        if ignore_ctx is _FROM_DISK:
+            ignore_ctx = self.ignore_context_for(os.path.dirname(rel_dir)) if rel_dir else None
+
+        root = TreeNode(name)
+        budget = [self.max_total_entries]
+        # Each frontier item: (node, relative path, depth, ignore context of its parent)
+        frontier = [(root, rel_dir, 0, ignore_ctx)]
+        pool = None
+        try:
+            while frontier:
+                paths = [os.path.join(self.base_path, rel) for _, rel, _, _ in frontier]
+                if self.workers > 1 and len(frontier) >= self.PARALLEL_THRESHOLD:
+                    if pool is None:
+                        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tree-walker")
+                    listings = list(pool.map(self._list, paths))
+                else:
+                    listings = [self._list(p) for p in paths]
+
+                next_frontier = []
+                for (node, rel, depth, parent_ctx), entries in zip(frontier, listings):
+                    next_frontier.extend(self._fill(node, rel, depth, parent_ctx, entries, budget))
+                frontier = next_frontier
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False)
+        return root
+
+    def _fill(self, node: TreeNode, rel: str, depth: int, parent_ctx, entries, budget) -> list:
+        if entries is None:
+            return []
+        names = {n for n, _ in entries}
+        # Dropped before its entries are queued or charged to the budgets; its own slot is refunded.
+        if node.parent is not None and self.is_virtualenv(rel, names):
+            del node.parent.children[node.name]
+            if budget[0] is not None:
+                budget[0] += 1
+            return []
+        ctx = self._load_context(parent_ctx, rel, names)
+        node.ignore = ctx
+
+        kept = []
+        for entry_name, is_dir in entries:
+            child_rel = f"{rel}/{entry_name}" if rel else entry_name
+            if not self.is_ignored(child_rel, is_dir, ctx):
+                kept.append((entry_name, is_dir, child_rel))
+        kept.sort()
+
+        limit = len(kept)
+        if self.max_entries_per_dir is not None:
+            limit = min(limit, self.max_entries_per_dir)
+        if budget[0] is not None:
+            limit = min(limit, max(budget[0], 0))
+            budget[0] -= limit
+
+        children = []
+        for index, (entry_name, is_dir, child_rel) in enumerate(kept):
+            if index >= limit:
+                if is_dir:
+                    node.elided_dirs += 1
+                else:
+                    node.elided_files += 1
+                continue
+            if not is_dir:
+                node.children[entry_name] = None
+                continue
+            child = TreeNode(entry_name, node)
+            node.children[entry_name] = child
+            if self.max_depth is not None and depth + 1 >= self.max_depth:
+                child.explored = False
+            else:
+                children.append((child, child_rel, depth + 1, ctx))
+        return children
+
+    def render(self, root: TreeNode | None = None) -> str:
+        """Walks (unless a tree is given) and renders the project tree string."""
+        if root is None:
+            root = self.walk()
+        return render_tree(root, self.max_depth, self.max_entries_per_dir, self.max_total_entries)
+
+
+def walker_from_settings(base_path: str, ignored: set[str] | None = None) -> TreeWalker:
+    """A TreeWalker configured with the budgets from config/settings.py."""
+    return TreeWalker(base_path, ignored,
+                      max_depth=settings.TREE_MAX_DEPTH,
+                      max_entries_per_dir=settings.TREE_MAX_ENTRIES_PER_DIR,
+                      max_total_entries=settings.TREE_MAX_TOTAL_ENTRIES)
@@ -0,0 +1,186 @@
+# core/workspace.py
+import contextlib
+import os
+import threading
+import time
+from config import settings
+from core.file_system_manager import FileSystemManager
+from core.project_manager import ProjectManager
+
+
+class WorkspaceRoot:
+    """
+    One loaded project folder of a Workspace: its ProjectManager (tree, indexes, file cache),
+    the FileSystemManager that writes inside it and, on first use, its conversation.
+    """
+
+    def __init__(self, name: str, path: str, watch: bool):
+        self.name = name
+        self.path = path
+        self.project_manager = ProjectManager(path)
+        self.fs_manager = FileSystemManager(path, tree_index=self.project_manager.tree_index)
+        self.fs_manager.add_change_listener(self.project_manager.retrieval_index.mark_dirty)
+        self.fs_manager.add_change_listener(self.project_manager.symbol_index.mark_dirty)
+        self.fs_manager.add_change_listener(self.project_manager.dependency_graph.mark_dirty)
+        self.fs_manager.add_change_listener(self.project_manager.invalidate_file)
+        if watch:
+            self.project_manager.tree_index.start_watching()
+        self.project_manager.start_indexing()
+        self.last_used = time.monotonic()
+        # How many requests (or windows) are using the root right now; it is never evicted while in use.
+        self.users = 0
+        self._chat_manager = None
+
+    @property
+    def chat_manager(self):
+        if self._chat_manager is None:
+            from core.chat_manager import ChatManager
+            self._chat_manager = ChatManager(self.path)
+        return self._chat_manager
+
+    def close(self):
+        self.project_manager.close()
+        if self._chat_manager is not None:
+            self._chat_manager.close()
+
+
+class Workspace:
+    """
+    Several project folders ("roots") the assistant works on side by side, by name.
+
+    Roots are loaded on first use (`get`, `acquire`) and then stay loaded, so switching between
+    them is instant. Each has its own tree, indexes, file cache and path-safety boundary: a root
+    never reads or writes outside its own folder. To bound memory, at most `max_loaded` roots
+    stay loaded, and roots unused for `idle_seconds` are closed by `evict_idle`; roots in use
+    (between `acquire` and `release`) are never closed. Evicted roots reload on their next use.
+    """
+
+    def __init__(self, roots: list[str] | dict[str, str] | None = None, max_loaded: int | None = None,
+                 idle_seconds: float | None = None, watch: bool = False):
+        self.max_loaded = settings.WORKSPACE_MAX_LOADED_ROOTS if max_loaded is None else max_loaded
+        self.idle_seconds = settings.WORKSPACE_IDLE_SECONDS if idle_seconds is None else idle_seconds
+        self.watch = watch
+        self._paths: dict[str, str] = {}
+        self._loaded: dict[str, WorkspaceRoot] = {}
+        self._evict_listeners = []
+        self._lock = threading.RLock()
+        roots = settings.WORKSPACE_ROOTS if roots is None else roots
+        for name, path in (roots.items() if isinstance(roots, dict) else ((None, path) for path in roots)):
+            try:
+                self.add_root(path, name)
+            except ValueError as e:
+                print(f"Warning: skipping workspace root: {e}")
+
+    # --- Roots ---
+
+    def names(self) -> list[str]:
+        with self._lock:
+            return list(self._paths)
+
+    def path_of(self, name: str) -> str:
+        with self._lock:
+            return self._paths[name]
+
+    def is_loaded(self, name: str) -> bool:
+        with self._lock:
+            return name in self._loaded
+
+    def add_root(self, path: str, name: str | None = None) -> str:
+        """Adds a folder (if it isn't a root already) and returns its root name."""
+        path = os.path.abspath(os.path.expanduser(path))
+        if not os.path.isdir(path):
+            raise ValueError(f"The provided path '{path}' is not a valid directory.")
+        with self._lock:
+            for existing, existing_path in self._paths.items():
+                if existing_path == path:
+                    return existing
+            base = name or os.path.basename(path.rstrip(os.sep)) or path
+            name, n = base, 1
+            while name in self._paths:
+                n += 1
+                name = f"{base}-{n}"
+            self._paths[name] = path
+            return name
+
+    def remove_root(self, name: str):
+        with self._lock:
+            root = self._loaded.get(name)
+            if root is not None and root.users:
+                raise RuntimeError(f"The root '{name}' is in use.")
+            self._paths.pop(name, None)
+            if root is not None:
+                self._unload(name)
+
+    def root_of(self, path: str) -> str | None:
+        """The name of the root containing the absolute `path` (the innermost one), if any."""
+        path = os.path.abspath(path)
+        with self._lock:
+            containing = [(len(p), n) for n, p in self._paths.items() if path == p or path.startswith(p + os.sep)]
+        return max(containing)[1] if containing else None
+
+    # --- Loading and eviction ---
+
+    def get(self, name: str) -> WorkspaceRoot:
+        """The loaded root `name`, loading it if needed."""
+        with self._lock:
+            root = self._loaded.get(name)
+            if root is None:
+                root = self._loaded[name] = WorkspaceRoot(name, self._paths[name], self.watch)
+                self._evict_over_limit(keep=name)
+            root.last_used = time.monotonic()
+            return root
+
+    def acquire(self, name: str) -> WorkspaceRoot:
+        """Like `get`, and keeps the root loaded until `release`."""
+        with self._lock:
+            root = self.get(name)
+            root.users += 1
+            return root
+
+    def release(self, root: WorkspaceRoot):
+        with self._lock:
+            root.users = max(root.users - 1, 0)
+            root.last_used = time.monotonic()
+
+    @contextlib.contextmanager
+    def use(self, name: str):
+        root = self.acquire(name)
+        try:
+            yield root
+        finally:
+            self.release(root)
+
+    def add_evict_listener(self, callback):
+        """Registers `callback(name)`, told whenever a root is closed (e.g. to drop its views)."""
+        self._evict_listeners.append(callback)
+
+    def evict_idle(self, now: float | None = None) -> list[str]:
+        """Closes the roots not in use and unused for `idle_seconds`. Returns their names."""
+        if not self.idle_seconds:
+            return []
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [name for name, root in self._loaded.items()
+                    if not root.users and now - root.last_used >= self.idle_seconds]
+            for name in idle:
+                self._unload(name)
+        return idle
+
+    def _evict_over_limit(self, keep: str):
+        idle = sorted((root.last_used, name) for name, root in self._loaded.items() if not root.users and name != keep)
+        while len(self._loaded) > max(self.max_loaded, 1) and idle:
+            self._unload(idle.pop(0)[1])
+
+    def _unload(self, name: str):
+        root = self._loaded.pop(name)
+        try:
+            root.close()
+        except Exception as e:
+            print(f"Warning: could not close the root '{name}': {e}")
+        for callback in self._evict_listeners:
+            callback(name)
+
+    def close(self):
+        with self._lock:
+            for name in list(self._loaded):
+                self._unload(name)
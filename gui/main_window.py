@@ -1,141 +1,490 @@
 # gui/main_window.py
 import sys
 import os
-from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QLineEdit, QPushButton, QTextEdit
-from PyQt6.QtCore import Qt, QThread
+import itertools
+import queue
+from collections import deque
+from functools import partial
+from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QCheckBox,
+                             QSplitter, QListWidget, QListWidgetItem, QComboBox, QStackedWidget, QFileDialog)
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
 import json
 from config import settings
-from core.project_manager import ProjectManager
-from core.file_system_manager import FileSystemManager
-from core.chat_manager import ChatManager  # <-- IMPORT NEW MANAGER
-from ai_client.gemini_client import GeminiClient
+from core.workspace import Workspace
+from ai_client.backends import create_backend
+from ai_client.response_cache import CachedClient
+from ai_client.resilient_client import ResilientClient
 from ai_client.prompt_builder import build_prompt
 from ai_client.response_parser import parse_gemini_response
+from ai_client.scheduler import BACKGROUND, INTERACTIVE, RequestScheduler
 from schemas.ai_schemas import GeminiResponse
-from gui.threads import AiWorker
+from gui.threads import AiWorker, ApplyWorker
+from gui.widgets.chat_view import ChatView
+from gui.widgets.file_tree import FileTreeView
+from gui.widgets.diff_view import DiffView
+
+
+class _Request:
+    """What the window tracks about one request, from queueing until its last batch is written."""
+    __slots__ = ("no", "label", "root", "worker", "handle", "item", "streamed_count", "failed", "done", "pending_batches")
+
+    def __init__(self, label: str, root, worker: AiWorker):
+        self.no = 0
+        self.label = label
+        # The workspace root the request works in (held in use until the request is finished).
+        self.root = root
+        self.worker = worker
+        self.handle = None
+        self.item = None
+        # Streaming: how many actions of the response were already handled, and whether one failed
+        self.streamed_count = 0
+        self.failed = False
+        # The response has been handled and its actions queued; the request ends when they are written.
+        self.done = False
+        self.pending_batches = 0
+
 
 class MainWindow(QMainWindow):
+    apply_requested = pyqtSignal(int, list, str, object)  # request number, actions, label, FileSystemManager
+    undo_requested = pyqtSignal(int, object)  # how many requests to undo, in which FileSystemManager
+    _request_state_changed = pyqtSignal(object)  # RequestHandle, from the scheduler's threads
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("AI Code Assistant")
-        self.setGeometry(100, 100, 800, 600)
+        self.setGeometry(100, 100, 1100, 650)
 
         # Initialize core components
-        self.project_manager = ProjectManager(settings.BASE_PROJECT_PATH)
-        self.fs_manager = FileSystemManager(settings.BASE_PROJECT_PATH)
-        self.ai_client = GeminiClient()
-        self.chat_manager = ChatManager()  # <-- INSTANTIATE CHAT MANAGER
-        # Threading components
-        self.ai_thread = None
-        self.ai_worker = None
-
-        # Main widget and layout
+        # The project folders. The one shown (`self.root`) gets new requests and undo; every root
+        # keeps its own tree, indexes and conversation, and idle ones are closed by a timer.
+        self.workspace = Workspace(watch=True)
+        if not self.workspace.names():
+            raise ValueError("None of the WORKSPACE_ROOTS is a valid directory.")
+        self.workspace.add_evict_listener(self._on_root_evicted)
+        self.root = None
+        self._trees: dict[str, FileTreeView] = {}
+        self._evict_timer = QTimer(self)
+        self._evict_timer.timeout.connect(self.workspace.evict_idle)
+        self._evict_timer.start(60 * 1000)
+        # Roots build their search index in the background when loaded; its progress goes to the status line.
+        self._index_timer = QTimer(self)
+        self._index_timer.timeout.connect(self._show_indexing)
+        self._index_timer.start(1000)
+        self._indexing_shown = False
+        # One client (and its connection) serves every request; the backend is chosen in settings.
+        self.ai_client = ResilientClient(create_backend())
+        if settings.RESPONSE_CACHE_ENABLED:
+            self.ai_client = CachedClient(self.ai_client)
+        # Requests run on the scheduler's threads, several at a time; they are numbered by the scheduler.
+        self.scheduler = RequestScheduler(listener=self._request_state_changed.emit)
+        self._request_state_changed.connect(self.on_request_state_changed)
+        self._requests: dict[int, _Request] = {}
+        self._request_numbers = itertools.count(1)
+        # Responses waiting for the diff preview, which shows one at a time.
+        self._review_queue: deque = deque()
+        self._reviewing = None
+        # Actions are written by an ApplyWorker on its own thread; batches are numbered by request.
+        self.apply_thread = QThread()
+        self.apply_worker = ApplyWorker()
+        self.apply_worker.moveToThread(self.apply_thread)
+        self.apply_requested.connect(self.apply_worker.apply)
+        self.apply_worker.applied.connect(self.on_actions_applied)
+        self.undo_requested.connect(self.apply_worker.undo)
+        self.apply_worker.undone.connect(self.on_undo_finished)
+        self.apply_thread.start()
+
+        # Main widget and layout: the project browser on the left, the chat on the right
+        splitter = QSplitter(Qt.Orientation.Horizontal)
+        self.setCentralWidget(splitter)
+        # The roots, and a project browser per loaded root (created when it is first shown).
+        browser = QWidget()
+        browser_layout = QVBoxLayout(browser)
+        browser_layout.setContentsMargins(0, 0, 0, 0)
+        root_row = QHBoxLayout()
+        self.root_box = QComboBox()
+        self.root_box.addItems(self.workspace.names())
+        self.root_box.currentTextChanged.connect(self.switch_root)
+        root_row.addWidget(self.root_box, 1)
+        add_root_button = QPushButton("Add Folder...")
+        add_root_button.clicked.connect(self.handle_add_root)
+        root_row.addWidget(add_root_button)
+        browser_layout.addLayout(root_row)
+        self.tree_stack = QStackedWidget()
+        browser_layout.addWidget(self.tree_stack)
+        self.file_tree = None
+        splitter.addWidget(browser)
         central_widget = QWidget()
-        self.setCentralWidget(central_widget)
+        splitter.addWidget(central_widget)
+        splitter.setStretchFactor(1, 3)
+        # Proposed changes are reviewed here before they are written (hidden until there is something to review).
+        self.diff_view = DiffView()
+        self.diff_view.decided.connect(self.on_diff_decided)
+        self.diff_view.discarded.connect(self.on_diff_discarded)
+        self.diff_view.hide()
+        splitter.addWidget(self.diff_view)
+        splitter.setStretchFactor(2, 3)
         layout = QVBoxLayout(central_widget)
 
         # Chat display area (replaces the old log_display)
-        self.chat_display = QTextEdit()
-        self.chat_display.setReadOnly(True)
-        layout.addWidget(self.chat_display)
+        self.chat_view = ChatView()
+        layout.addWidget(self.chat_view)
+
+        # Requests that are queued, running or waiting for their changes to be written.
+        self.request_list = QListWidget()
+        self.request_list.setMaximumHeight(90)
+        self.request_list.setSelectionMode(QListWidget.SelectionMode.ExtendedSelection)
+        self.request_list.hide()
+        layout.addWidget(self.request_list)
 
         self.input_box = QLineEdit()
         self.input_box.setPlaceholderText("Enter your code request here...")
         self.input_box.returnPressed.connect(self.handle_send_request)  # Allow pressing Enter
         layout.addWidget(self.input_box)
 
+        send_row = QHBoxLayout()
         self.send_button = QPushButton("Send Request")
         self.send_button.clicked.connect(self.handle_send_request)
-        layout.addWidget(self.send_button)
+        send_row.addWidget(self.send_button)
+        self.background_box = QCheckBox("Background")
+        self.background_box.setToolTip("Run after the interactive requests that are waiting.")
+        send_row.addWidget(self.background_box)
+        self.bypass_cache_box = QCheckBox("Skip response cache")
+        self.bypass_cache_box.setVisible(settings.RESPONSE_CACHE_ENABLED)
+        send_row.addWidget(self.bypass_cache_box)
+        self.plan_box = QCheckBox("Plan per file")
+        self.plan_box.setToolTip("For large changes: plan them file by file, then request every file at once.")
+        send_row.addWidget(self.plan_box)
+        self.profile_box = QCheckBox("Profile")
+        self.profile_box.setToolTip(f"Run the request under cProfile and tracemalloc (saved in {settings.TRACE_PROFILE_DIR}).")
+        self.profile_box.setVisible(settings.TRACE_ENABLED)
+        send_row.addWidget(self.profile_box)
+        self.cancel_button = QPushButton("Cancel Request")
+        self.cancel_button.setToolTip("Cancel the selected requests (the newest one if none is selected).")
+        self.cancel_button.clicked.connect(self.handle_cancel)
+        send_row.addWidget(self.cancel_button)
+        self.undo_button = QPushButton("Undo Last Request")
+        self.undo_button.clicked.connect(self.handle_undo)
+        send_row.addWidget(self.undo_button)
+        layout.addLayout(send_row)
+
+        self.switch_root(self.root_box.currentText())
+        self.update_chat_display_system_message("Application started. Ready for requests.")
+
+    def closeEvent(self, event):
+        """Stops the requests and background watchers before the window goes away."""
+        # Requests still read and write the workspace roots: let them stop before the roots are closed.
+        if not self.scheduler.shutdown(cancel_pending=True, wait=True, timeout=settings.SCHEDULER_SHUTDOWN_SECONDS):
+            print(f"Warning: Some requests were still running after {settings.SCHEDULER_SHUTDOWN_SECONDS}s; "
+                  "closing anyway.")
+        self.apply_thread.quit()
+        self.apply_thread.wait()
+        self._evict_timer.stop()
+        self._index_timer.stop()
+        self.workspace.close()
+        self.diff_view.shutdown()
+        super().closeEvent(event)
 
-        self.update_chat_display("Application started. Ready for requests.")
+    # --- Workspace roots ---
+
+    def switch_root(self, name: str):
+        """Shows another root: its files and its conversation. New requests and undo go to it."""
+        if not name or (self.root is not None and self.root.name == name):
+            return
+        try:
+            root = self.workspace.acquire(name)
+        except (OSError, ValueError) as e:
+            self.update_chat_display_system_message(f"Could not open {name}: {e}")
+            if self.root is not None:
+                self.root_box.setCurrentText(self.root.name)
+            return
+        if self.root is not None:
+            self.workspace.release(self.root)
+        self.root = root
+        tree = self._trees.get(name)
+        if tree is None:
+            tree = self._trees[name] = FileTreeView(root.path)
+            root.fs_manager.add_change_listener(tree.tree_model.on_file_changed)
+            self.tree_stack.addWidget(tree)
+        self.tree_stack.setCurrentWidget(tree)
+        self.file_tree = tree
+        self.chat_view.set_messages(root.chat_manager.recent_messages(settings.CHAT_VIEW_MAX_RENDERED))
+        self.setWindowTitle(f"AI Code Assistant - {name}")
+
+    def handle_add_root(self):
+        path = QFileDialog.getExistingDirectory(self, "Add a project folder")
+        if not path:
+            return
+        try:
+            name = self.workspace.add_root(path)
+        except ValueError as e:
+            self.update_chat_display_system_message(str(e))
+            return
+        if self.root_box.findText(name) < 0:
+            self.root_box.addItem(name)
+        self.root_box.setCurrentText(name)
+
+    def _show_indexing(self):
+        progress = self.root.project_manager.indexing_progress() if self.root is not None else None
+        if progress is not None:
+            self.chat_view.show_status(f"Indexing {self.root.name}: {progress[0]}/{progress[1]} files...")
+            self._indexing_shown = True
+        elif self._indexing_shown:
+            self._indexing_shown = False
+            if not self._requests:
+                self.chat_view.show_status("")
+
+    def _on_root_evicted(self, name: str):
+        """The workspace closed an idle root: its project browser goes too (and comes back with the root)."""
+        tree = self._trees.pop(name, None)
+        if tree is not None:
+            tree.tree_model.shutdown()
+            self.tree_stack.removeWidget(tree)
+            tree.deleteLater()
+
+    # --- Requests ---
 
     def handle_send_request(self):
-        """Starts the AI request process on a background thread."""
+        """Queues the request; it runs on the scheduler as soon as a worker is free."""
         user_query = self.input_box.text().strip()
         if not user_query:
             return
 
-        self.send_button.setEnabled(False)
+        root = self.workspace.acquire(self.root.name)
+        worker = AiWorker(self.ai_client, root.project_manager, root.chat_manager, user_query,
+                          bypass_cache=self.bypass_cache_box.isChecked(),
+                          pinned_files=self.file_tree.tree_model.pinned_files(),
+                          profile=self.profile_box.isChecked(), plan=self.plan_box.isChecked())
+        request = _Request(user_query, root, worker)
+        request.no = next(self._request_numbers)
+        priority = BACKGROUND if self.background_box.isChecked() else INTERACTIVE
+
+        # Everything the request reports must find it: the worker may finish before submit returns.
+        # The worker lives in this thread, so its signals arrive here as queued calls.
+        worker.finished.connect(partial(self.on_ai_finished, request.no))
+        worker.error.connect(partial(self.on_ai_error, request.no))
+        worker.cancelled.connect(partial(self.on_ai_cancelled, request.no))
+        worker.progress.connect(partial(self._request_message, request.no, transient=True))
+        worker.action_ready.connect(partial(self.on_action_ready, request.no))
+        self._requests[request.no] = request
+        # Add user message to history first, so the request always sees the same conversation.
+        message_id = root.chat_manager.add_message('user', user_query)
+        try:
+            request.handle = self.scheduler.submit(worker.run, name=user_query, priority=priority)
+        except (queue.Full, RuntimeError) as e:
+            root.chat_manager.remove_message(message_id)
+            del self._requests[request.no]
+            worker.deleteLater()
+            self.workspace.release(root)
+            self.update_chat_display_system_message(f"Request not queued: {e}")
+            return
         self.input_box.clear()
+        self.chat_view.add_message('user', user_query)
 
-        # Add user message to history and update display
-        self.chat_manager.add_message('user', user_query)
-        self.update_chat_display()
+        request.item = QListWidgetItem()
+        request.item.setData(Qt.ItemDataRole.UserRole, request.no)
+        self.request_list.addItem(request.item)
+        self.request_list.show()
+        self._update_request_item(request)
 
-        # Setup and start the background worker thread
-        self.ai_thread = QThread()
-        self.ai_worker = AiWorker(self.ai_client, self.project_manager, self.chat_manager)
-        self.ai_worker.moveToThread(self.ai_thread)
+    def _update_request_item(self, request: _Request):
+        if request.item is None:
+            return
+        # The handle is "done" once the response is in; after that the request waits for review or the writes.
+        state = "writing" if request.done else "review" if request.handle.state == "done" else request.handle.state
+        if request.handle.priority == BACKGROUND:
+            state += ", background"
+        request.item.setText(f"#{request.no} [{state}] {request.label[:80]}")
+
+    def on_request_state_changed(self, handle):
+        request = next((r for r in self._requests.values() if r.handle is handle), None)
+        if request is None:
+            return
+        if handle.state == "cancelled":
+            # Also covers requests cancelled before they started, whose worker never runs.
+            self.on_ai_cancelled(request.no)
+        else:
+            self._update_request_item(request)
 
-        # Connect signals from the worker to slots in this main window
-        self.ai_thread.started.connect(self.ai_worker.run)
-        self.ai_worker.finished.connect(self.on_ai_finished)
-        self.ai_worker.error.connect(self.on_ai_error)
-        self.ai_worker.progress.connect(self.update_chat_display_system_message)
+    def _finish_request(self, request: _Request, message: str):
+        """Forgets a request once nothing more will happen for it."""
+        self._requests.pop(request.no, None)
+        if request.item is not None:
+            self.request_list.takeItem(self.request_list.row(request.item))
+            request.item = None
+        self.request_list.setVisible(self.request_list.count() > 0)
+        request.worker.deleteLater()
+        self._request_message(request.no, message, request.root)
+        if not self._requests:
+            self.chat_view.show_status("")
+        self.workspace.release(request.root)
 
-        # Clean up the thread and worker when they are done
-        self.ai_worker.finished.connect(self.ai_thread.quit)
-        self.ai_worker.error.connect(self.ai_thread.quit)
-        self.ai_thread.finished.connect(self.ai_thread.deleteLater)
-        self.ai_worker.finished.connect(self.ai_worker.deleteLater)
-        self.ai_worker.error.connect(self.ai_worker.deleteLater)
+    def _request_message(self, request_no: int, message: str, root=None, transient: bool = False):
+        request = self._requests.get(request_no)
+        root = root or (request.root if request is not None else None)
+        if root is not None and root is not self.root:
+            message = f"#{request_no} ({root.name}): {message}"
+        elif len(self._requests) > 1 or request is None:
+            message = f"#{request_no}: {message}"
+        if transient:
+            self.show_progress(message)
+        else:
+            self.update_chat_display_system_message(message)
 
-        self.ai_thread.start()
+    def handle_cancel(self):
+        """Cancels the selected requests: queued ones never start, running ones stop at their next step."""
+        selected = [item.data(Qt.ItemDataRole.UserRole) for item in self.request_list.selectedItems()]
+        if not selected and self._requests:
+            selected = [max(self._requests)]
+        for request_no in selected:
+            request = self._requests.get(request_no)
+            if request is None:
+                continue
+            if request.handle.cancel():
+                self._request_message(request_no, "Cancelling...", transient=True)
+            elif any(no == request_no for no, _ in self._review_queue):
+                self._review_queue = deque(entry for entry in self._review_queue if entry[0] != request_no)
+                self._finish_request(request, "Cancelled before review.")
+            else:
+                self._request_message(request_no, "Too late to cancel: its changes are being reviewed or written.")
 
     def update_chat_display_system_message(self, message: str):
-        """Slot to display progress updates from the worker."""
-        self.update_chat_display(f"[System]: {message}")
+        """Appends a system message (a result or an error) to the chat log."""
+        self.chat_view.add_message("System", message)
 
-    def on_ai_error(self, error_message: str):
+    def show_progress(self, message: str):
+        """Shows transient progress in the status line under the log; the next update replaces it."""
+        self.chat_view.show_status(f"[System]: {message}")
+
+    def on_ai_error(self, request_no: int, error_message: str):
         """Slot to handle errors from the worker."""
-        self.update_chat_display_system_message(f"ERROR: {error_message}")
-        self.send_button.setEnabled(True)
+        request = self._requests.get(request_no)
+        if request is None:
+            return
+        request.done = True
+        if request.pending_batches == 0:
+            self._finish_request(request, f"ERROR: {error_message}")
+        else:
+            self._request_message(request_no, f"ERROR: {error_message}")
         self.input_box.setFocus()
 
-    def on_ai_finished(self, parsed_response: dict):
+    def on_ai_cancelled(self, request_no: int):
+        request = self._requests.get(request_no)
+        if request is None:
+            return
+        request.done = True
+        if request.pending_batches == 0:
+            self._finish_request(request, "Cancelled.")
+        else:
+            self._update_request_item(request)
+
+    def _normalize_action_path(self, request: _Request, action: dict):
+        """Strips a leading project folder name the model sometimes adds to paths."""
+        root_folder_name = os.path.basename(request.root.path)
+        if action['file_path'].replace('\\', '/').startswith(f"{root_folder_name}/"):
+            action['file_path'] = action['file_path'][len(root_folder_name) + 1:]
+
+    def on_action_ready(self, request_no: int, action: dict):
+        """Slot for actions completed while the response is still streaming."""
+        request = self._requests.get(request_no)
+        if request is None:
+            return
+        self._normalize_action_path(request, action)
+        if not settings.STREAM_AUTO_APPLY or settings.DIFF_PREVIEW_ENABLED:
+            self._request_message(request_no,
+                                  f"Planned: {action['action_type']} {action['file_path']} - {action['explanation']}")
+            return
+        if request.failed:
+            return
+        request.streamed_count += 1
+        self._queue_actions(request, [action])
+
+    def _queue_actions(self, request: _Request, actions: list):
+        request.pending_batches += 1
+        self.apply_requested.emit(request.no, actions, request.label, request.root.fs_manager)
+
+    def on_actions_applied(self, request_no: int, actions: list, ok: bool, error: str):
+        """Slot for batches written by the ApplyWorker."""
+        request = self._requests.get(request_no)
+        if request is None:
+            return
+        request.pending_batches -= 1
+        if ok:
+            for action in actions:
+                self._request_message(request_no, f"Applied {action['action_type']} {action['file_path']}")
+        elif not request.failed:
+            request.failed = True
+            self._request_message(request_no, f"Stopped due to error applying changes: {error}")
+        if request.done and request.pending_batches == 0:
+            self._finish_request(request, "Done." if not request.failed else "Finished with errors.")
+            self.input_box.setFocus()
+
+    def handle_undo(self):
+        """Restores the files changed by the last request in the shown root (on the apply thread)."""
+        self.undo_button.setEnabled(False)
+        self.undo_requested.emit(1, self.root.fs_manager)
+
+    def on_undo_finished(self, ok: bool, error: str):
+        if ok:
+            self.update_chat_display_system_message("Undid the changes of the last request.")
+        else:
+            self.update_chat_display_system_message(f"Undo failed: {error}")
+        self.undo_button.setEnabled(True)
+
+    def on_ai_finished(self, request_no: int, parsed_response: dict):
         """Slot to handle the successful completion of the AI task."""
-        self.update_chat_display_system_message("AI task complete. Applying changes...")
+        request = self._requests.get(request_no)
+        if request is None:
+            return
+        self._request_message(request_no, "AI task complete. Applying changes...", transient=True)
 
         # Add AI's JSON response to history (as a string)
-        self.chat_manager.add_message('model', parsed_response['overall_explanation'])
-
-        self.update_chat_display()  # Redraw chat with the new AI message
+        request.root.chat_manager.add_message('model', parsed_response['overall_explanation'])
+        if request.root is self.root:
+            self.chat_view.add_message('model', parsed_response['overall_explanation'])
 
-        # Clean paths (same logic as before)
-        root_folder_name = os.path.basename(self.project_manager.base_path)
         for action in parsed_response['actions']:
-            path_to_check = action['file_path']
-            if path_to_check.replace('\\', '/').startswith(f"{root_folder_name}/"):
-                action['file_path'] = action['file_path'][len(root_folder_name) + 1:]
+            self._normalize_action_path(request, action)
 
-        # Execute actions
-        for action in parsed_response['actions']:
-            success = self.fs_manager.apply_action(action)
-            if not success:
-                self.update_chat_display_system_message(
-                    f"Stopped due to error applying action on {action['file_path']}")
-                break
-
-        self.update_chat_display_system_message("Done. Ready for next request.")
-        self.send_button.setEnabled(True)
-        self.input_box.setFocus()
+        if settings.DIFF_PREVIEW_ENABLED and parsed_response['actions']:
+            # Nothing is written until the user has reviewed the diffs, one response at a time.
+            self._review_queue.append((request_no, parsed_response['actions']))
+            self._update_request_item(request)
+            self._review_next()
+            return
 
-    def update_chat_display(self, system_message: str = None):
-        """Clears and redraws the chat display from the now-clean history."""
-        self.chat_display.clear()
+        # Execute the remaining actions as one all-or-nothing batch (the ones applied while streaming are skipped)
+        request.done = True
+        self._update_request_item(request)
+        self._queue_actions(request, parsed_response['actions'][request.streamed_count:])
 
-        for message in self.chat_manager.history:
-            role = message['role']
-            content = message['content'].replace('\n', '<br>')
-            if role == 'user':
-                self.chat_display.append(f"<b>You:</b> {content}")
-            else:  # role == 'model'
-                self.chat_display.append(f"<b>AI:</b> {content}")
-            self.chat_display.append("")
+    # --- Diff preview ---
 
-        if system_message:
-            self.chat_display.append(f"<i>{system_message}</i>")
+    def _review_next(self):
+        if self._reviewing is not None or not self._review_queue:
+            return
+        self._reviewing, actions = self._review_queue.popleft()
+        request = self._requests.get(self._reviewing)
+        self.diff_view.show_actions(actions, request.root.fs_manager)
+        self.diff_view.show()
+        waiting = f" ({len(self._review_queue)} more waiting)" if self._review_queue else ""
+        self._request_message(self._reviewing, f"Review the proposed changes, then apply or discard them{waiting}.")
 
-        self.chat_display.verticalScrollBar().setValue(self.chat_display.verticalScrollBar().maximum())
-        QApplication.processEvents()
\ No newline at end of file
+    def on_diff_decided(self, actions: list):
+        """Slot for the actions the user kept in the diff preview."""
+        request = self._requests.get(self._reviewing)
+        self._reviewing = None
+        self.diff_view.hide()
+        if request is not None:
+            request.done = True
+            self._update_request_item(request)
+            self._queue_actions(request, actions)
+        self._review_next()
+
+    def on_diff_discarded(self):
+        request = self._requests.get(self._reviewing)
+        self._reviewing = None
+        self.diff_view.hide()
+        if request is not None:
+            self._finish_request(request, "Discarded the proposed changes.")
+        self.input_box.setFocus()
+        self._review_next()
@@ -1,68 +1,109 @@
 # gui/threads.py
-from PyQt6.QtCore import QObject, pyqtSignal
-from ai_client.prompt_builder import build_prompt
-from ai_client.response_parser import parse_gemini_response
-from schemas.ai_schemas import GeminiResponse
+import uuid
+from types import MappingProxyType
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+from ai_client.errors import Deadline
+from ai_client.pipeline import RequestPipeline
+from ai_client.scheduler import RequestCancelled
+from config import settings
+from core.tracing import tracer
 
 
 class AiWorker(QObject):
+    """
+    One request to the model, through any ModelBackend (ai_client/backends.py) and its wrappers.
+    `run(handle)` is executed by the RequestScheduler on one of its threads; the steps themselves
+    are a RequestPipeline (ai_client/pipeline.py), whose progress reaches the GUI as signals
+    through queued connections. Several workers may run at once against the same client, so
+    everything request-specific (the query, generation overrides) lives on the worker, and
+    `handle.check()` between steps lets the request be cancelled.
+    """
     progress = pyqtSignal(str)
+    action_ready = pyqtSignal(dict)  # a CodeAction, as soon as it has been fully streamed
     finished = pyqtSignal(dict)
     error = pyqtSignal(str)
+    cancelled = pyqtSignal()
 
-    def __init__(self, ai_client, project_manager, chat_manager):
+    def __init__(self, ai_client, project_manager, chat_manager, query: str, bypass_cache: bool = False,
+                 pinned_files: list[str] | None = None, overrides: dict | None = None, profile: bool = False,
+                 plan: bool = False):
         super().__init__()
         self.ai_client = ai_client
         self.project_manager = project_manager
         self.chat_manager = chat_manager
+        self.query = query
+        self.bypass_cache = bypass_cache
+        self.pinned_files = list(pinned_files or [])
+        self.overrides = MappingProxyType(dict(overrides or {}))
+        # Run this request under cProfile/tracemalloc (see core/tracing.py).
+        self.profile = profile
+        # Plan the change per file first, then request every file concurrently (ai_client/planner.py).
+        self.plan = plan
+        self._handle = None
+        self._deadline = None
 
-    def find_relevant_files(self, query: str) -> dict[str, str]:
-        """
-        !!! INTELLIGENCE PLACEHOLDER !!!
-        This is where the app will get smart. It should parse the query
-        for filenames and read them.
+    def _check(self):
+        if self._handle is not None:
+            self._handle.check()
+        if self._deadline is not None:
+            self._deadline.check()
 
-        For now, we will keep it simple and not read any files.
-        In a future version, you could use another LLM call or regex to find filenames.
-        """
-        # Example of what this *could* do later:
-        # import re
-        # filenames = re.findall(r'(\w+\.py)', query)
-        # relevant_files = {}
-        # for filename in filenames:
-        #     content = self.project_manager.read_file(filename)
-        #     if content:
-        #         relevant_files[filename] = content
-        # return relevant_files
-        return {}
+    def run(self, handle=None):
+        self._handle = handle
+        # One deadline for the whole request; the client's waits, retries and calls all count against it.
+        self._deadline = Deadline(settings.MODEL_REQUEST_DEADLINE)
+        trace_id = f"request-{handle.request_id}" if handle is not None else f"request-{uuid.uuid4().hex[:8]}"
+        with tracer.trace(trace_id, profile=self.profile, query_chars=len(self.query)):
+            self._run()
 
-    def run(self):
+    def _run(self):
+        pipeline = RequestPipeline(self.ai_client, self.project_manager, self.chat_manager,
+                                   bypass_cache=self.bypass_cache, pinned_files=self.pinned_files,
+                                   overrides=self.overrides, deadline=self._deadline, check=self._check,
+                                   progress=self.progress.emit, on_action=self.action_ready.emit, plan=self.plan)
         try:
-            user_query = self.chat_manager.history[-1]['content']
-
-            self.progress.emit("Analyzing request...")
-            structure_str = self.project_manager.get_structure_string()
-            history_str = self.chat_manager.get_formatted_history()
-
-            # --- The "Ground Truth" Step ---
-            # Find and read any files mentioned in the query.
-            relevant_files = self.find_relevant_files(user_query)
-            if relevant_files:
-                self.progress.emit(f"Reading relevant files: {', '.join(relevant_files.keys())}")
+            parsed_response = pipeline.run(self.query)
+            self.finished.emit(parsed_response)
+        except RequestCancelled:
+            self.cancelled.emit()
+            raise
+        except Exception as e:
+            self.error.emit(f"An error occurred in the AI worker thread: {e}")
 
-            self.progress.emit("Building prompt for AI...")
-            prompt = build_prompt(structure_str, user_query, history_str, relevant_files)
+class ApplyWorker(QObject):
+    """
+    Applies batches of actions on its own thread, in the order they were queued, so writing a
+    large change never blocks the GUI. Each batch names the FileSystemManager of the workspace
+    root its request works in. Once a batch of a request fails, the later batches of the same
+    request are skipped.
+    """
+    applied = pyqtSignal(int, list, bool, str)  # request number, actions, ok, error message
+    undone = pyqtSignal(bool, str)  # ok, error message
 
-            self.progress.emit("Sending request to Gemini (this may take a moment)...")
-            ai_response_str = self.ai_client.generate_response(prompt, schema=GeminiResponse)
-            if not ai_response_str:
-                raise ValueError("Received an empty response from the API.")
+    def __init__(self):
+        super().__init__()
+        self._failed_requests: set[int] = set()
+        # Request numbers restart with the app; this keeps their snapshot ids apart.
+        self._session = uuid.uuid4().hex[:8]
 
-            self.progress.emit("Parsing AI response...")
-            parsed_response = parse_gemini_response(ai_response_str)
-            if not parsed_response:
-                raise ValueError("Failed to parse a valid JSON object from the AI's response.")
+    @pyqtSlot(int, list, str, object)
+    def apply(self, request_no: int, actions: list, label: str, fs_manager):
+        if request_no in self._failed_requests:
+            self.applied.emit(request_no, actions, False, "skipped after an earlier error")
+            return
+        try:
+            result = fs_manager.apply_actions(actions, request_id=f"{self._session}-{request_no}", label=label)
+            ok, error = result.ok, result.error or ""
+        except Exception as e:
+            ok, error = False, str(e)
+        if not ok:
+            self._failed_requests.add(request_no)
+        self.applied.emit(request_no, actions, ok, error)
 
-            self.finished.emit(parsed_response)
+    @pyqtSlot(int, object)
+    def undo(self, count: int, fs_manager):
+        try:
+            result = fs_manager.undo(count)
+            self.undone.emit(result.ok, result.error or "")
         except Exception as e:
-            self.error.emit(f"An error occurred in the AI worker thread: {e}")
\ No newline at end of file
+            self.undone.emit(False, str(e))
@@ -0,0 +1,139 @@
+# gui/widgets/chat_view.py
+import html
+from PyQt6.QtCore import QTimer
+from PyQt6.QtGui import QTextBlockFormat, QTextCursor
+from PyQt6.QtWidgets import QLabel, QTextEdit, QVBoxLayout, QWidget
+from config import settings
+
+_ROLE_LABELS = {"user": "You", "model": "AI"}
+
+
+def _message_html(role: str, content: str) -> str:
+    label = _ROLE_LABELS.get(role, role)
+    return f"<b>{label}:</b> {html.escape(content).replace(chr(10), '<br>')}"
+
+
+class ChatView(QWidget):
+    """
+    An append-only chat log.
+
+    Each message is rendered once, as one block at the end of the document, so adding a message
+    costs the same however long the session is. Only the last CHAT_VIEW_MAX_RENDERED messages are
+    kept in the document; scrolling to the top brings back older ones a page at a time. Status
+    updates go to a separate line under the log and are coalesced: a burst of them causes a
+    single repaint every CHAT_VIEW_FLUSH_MS.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._messages: list[str] = []  # rendered html of every message, oldest first
+        self._first = 0  # index of the oldest message in the document
+        self._pending: list[str] = []
+        self._pending_status: str | None = None
+
+        self._text = QTextEdit()
+        self._text.setReadOnly(True)
+        self._text.verticalScrollBar().valueChanged.connect(self._on_scroll)
+        self._status = QLabel()
+        self._status.setWordWrap(True)
+        self._status.setStyleSheet("font-style: italic;")
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self._text)
+        layout.addWidget(self._status)
+
+        self._block_format = QTextBlockFormat()
+        self._block_format.setBottomMargin(8)
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(settings.CHAT_VIEW_FLUSH_MS)
+        self._flush_timer.timeout.connect(self._flush)
+
+    # --- Public API ---
+
+    def add_message(self, role: str, content: str):
+        """Appends a chat message (shown on the next flush)."""
+        self._pending.append(_message_html(role, content))
+        self._schedule()
+
+    def set_messages(self, messages: list[dict]):
+        """Replaces the whole log, e.g. with a history loaded from disk."""
+        self._pending.clear()
+        self._messages = [_message_html(m['role'], m['content']) for m in messages]
+        self._first = max(len(self._messages) - settings.CHAT_VIEW_MAX_RENDERED, 0)
+        self._text.clear()
+        cursor = QTextCursor(self._text.document())
+        cursor.beginEditBlock()
+        for i, message in enumerate(self._messages[self._first:]):
+            self._insert(cursor, message, first=(i == 0))
+        cursor.endEditBlock()
+        self._scroll_to_bottom()
+
+    def show_status(self, text: str):
+        """Shows a transient status line under the log; only the latest one of a burst is drawn."""
+        self._pending_status = text
+        self._schedule()
+
+    # --- Rendering ---
+
+    def _schedule(self):
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def _insert(self, cursor: QTextCursor, message: str, first: bool):
+        if not first:
+            cursor.insertBlock(self._block_format)
+        else:
+            cursor.setBlockFormat(self._block_format)
+        cursor.insertHtml(message)
+
+    def _at_bottom(self) -> bool:
+        bar = self._text.verticalScrollBar()
+        return bar.value() >= bar.maximum() - 4
+
+    def _scroll_to_bottom(self):
+        bar = self._text.verticalScrollBar()
+        bar.setValue(bar.maximum())
+
+    def _flush(self):
+        if self._pending_status is not None:
+            self._status.setText(self._pending_status)
+            self._pending_status = None
+        if not self._pending:
+            return
+        follow = self._at_bottom()
+        pending, self._pending = self._pending, []
+        document = self._text.document()
+        cursor = QTextCursor(document)
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.beginEditBlock()
+        for message in pending:
+            self._insert(cursor, message, first=(len(self._messages) == self._first))
+            self._messages.append(message)
+        # Keep the document bounded while the user is following the conversation.
+        if follow:
+            excess = len(self._messages) - self._first - settings.CHAT_VIEW_MAX_RENDERED
+            if excess > 0:
+                top = QTextCursor(document)
+                top.movePosition(QTextCursor.MoveOperation.NextBlock, QTextCursor.MoveMode.KeepAnchor, excess)
+                top.removeSelectedText()
+                self._first += excess
+        cursor.endEditBlock()
+        if follow:
+            self._scroll_to_bottom()
+
+    def _on_scroll(self, value: int):
+        if value != self._text.verticalScrollBar().minimum() or self._first == 0:
+            return
+        # At the top: bring back the previous page of messages without moving what is on screen.
+        bar = self._text.verticalScrollBar()
+        old_max = bar.maximum()
+        start = max(self._first - settings.CHAT_VIEW_PAGE, 0)
+        cursor = QTextCursor(self._text.document())
+        cursor.beginEditBlock()
+        for message in self._messages[start:self._first]:
+            cursor.insertHtml(message)
+            cursor.insertBlock(self._block_format)
+        cursor.endEditBlock()
+        self._first = start
+        bar.setValue(bar.maximum() - old_max)
@@ -0,0 +1,250 @@
+# gui/widgets/diff_view.py
+import bisect
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QObject, Qt, QThread, pyqtSignal, pyqtSlot
+from PyQt6.QtGui import QColor, QFontDatabase
+from PyQt6.QtWidgets import (QHBoxLayout, QLabel, QListView, QListWidget, QListWidgetItem, QPushButton,
+                             QSplitter, QVBoxLayout, QWidget)
+from config import settings
+from core.diffing import diff_opcodes, hunks_to_unified, make_hunks
+
+_ADDED = QColor(220, 255, 220)
+_REMOVED = QColor(255, 225, 225)
+_HEADER = QColor(230, 235, 250)
+
+
+class ActionPreview:
+    """One proposed action with its diff, and which of its hunks the user keeps."""
+    __slots__ = ("action", "before", "after", "hunks", "accepted", "error")
+
+    def __init__(self, action: dict, before: list[str], after: list[str], hunks: list, error: str | None = None):
+        self.action = action
+        self.before = before
+        self.after = after
+        self.hunks = hunks
+        self.accepted = [True] * len(hunks)
+        self.error = error
+
+    def summary(self) -> str:
+        added = removed = 0
+        for hunk in self.hunks:
+            for tag, i1, i2, j1, j2 in hunk.ops:
+                if tag != "equal":
+                    removed += i2 - i1
+                    added += j2 - j1
+        text = f"{self.action['action_type']} {self.action['file_path']}  (+{added} -{removed})"
+        return f"{text}  CONFLICT" if self.error else text
+
+    def selected_action(self) -> dict | None:
+        """The action to apply for the hunks kept: itself, a PATCH with some of its hunks, or None."""
+        if self.error or not any(self.accepted):
+            return None
+        if all(self.accepted) or self.action['action_type'] in ("CREATE", "DELETE"):
+            return self.action
+        kept = [hunk for hunk, keep in zip(self.hunks, self.accepted) if keep]
+        return dict(self.action, action_type="PATCH", code=hunks_to_unified(self.before, self.after, kept))
+
+
+class _DiffWorker(QObject):
+    """Computes the previews of a response on a background thread, one action at a time."""
+    ready = pyqtSignal(int, int, object)  # generation, action index, ActionPreview
+
+    @pyqtSlot(int, list, object)
+    def compute(self, generation: int, actions: list, fs_manager):
+        contents: dict[str, str] = {}  # what earlier actions of the response leave in each file
+        for i, action in enumerate(actions):
+            path = action['file_path'].replace("\\", "/")
+            try:
+                before, after = fs_manager.preview(action, contents.get(path))
+                error = None
+            except Exception as e:
+                before, after, error = contents.get(path, ""), contents.get(path, ""), str(e)
+            contents[path] = after
+            a = before.splitlines(keepends=True)
+            b = after.splitlines(keepends=True)
+            hunks = make_hunks(diff_opcodes(a, b), settings.DIFF_CONTEXT_LINES)
+            self.ready.emit(generation, i, ActionPreview(action, a, b, hunks, error))
+
+
+class DiffLinesModel(QAbstractListModel):
+    """
+    The lines of one action's diff. Rows are produced on demand from the hunks (a header row per
+    hunk, then its lines), so a hunk of ten thousand lines costs nothing until it is scrolled into view.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._preview: ActionPreview | None = None
+        self._starts: list[int] = []  # first row of each hunk
+        self._op_starts: dict[int, list[int]] = {}  # per hunk: first row of each op, relative to the hunk
+        self._rows = 0
+
+    def set_preview(self, preview: ActionPreview | None):
+        self.beginResetModel()
+        self._preview = preview
+        self._starts, self._op_starts, self._rows = [], {}, 0
+        for hunk in preview.hunks if preview else []:
+            self._starts.append(self._rows)
+            self._rows += 1 + hunk.row_count()
+        self.endResetModel()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else self._rows
+
+    def _ops_of(self, h: int) -> list[int]:
+        if h not in self._op_starts:
+            starts, row = [], 1
+            for tag, i1, i2, j1, j2 in self._preview.hunks[h].ops:
+                starts.append(row)
+                row += (i2 - i1) if tag in ("equal", "delete") else (j2 - j1) if tag == "insert" else (i2 - i1) + (j2 - j1)
+            self._op_starts[h] = starts
+        return self._op_starts[h]
+
+    def _line(self, row: int) -> tuple[int, str, str | None]:
+        """(hunk index, kind, text) of a row; kind is "header", " ", "+" or "-"."""
+        h = bisect.bisect_right(self._starts, row) - 1
+        offset = row - self._starts[h]
+        hunk = self._preview.hunks[h]
+        if offset == 0:
+            return h, "header", f"@@ -{hunk.a_start + 1},{hunk.a_end - hunk.a_start} +{hunk.b_start + 1},{hunk.b_end - hunk.b_start} @@"
+        starts = self._ops_of(h)
+        k = bisect.bisect_right(starts, offset) - 1
+        tag, i1, i2, j1, j2 = hunk.ops[k]
+        pos = offset - starts[k]
+        if tag == "equal":
+            return h, " ", self._preview.before[i1 + pos]
+        if tag == "insert":
+            return h, "+", self._preview.after[j1 + pos]
+        if tag == "delete" or pos < i2 - i1:
+            return h, "-", self._preview.before[i1 + pos]
+        return h, "+", self._preview.after[j1 + pos - (i2 - i1)]
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or self._preview is None:
+            return None
+        h, kind, text = self._line(index.row())
+        if role == Qt.ItemDataRole.DisplayRole:
+            return text if kind == "header" else f"{kind} {text.rstrip(chr(13) + chr(10))}"
+        if role == Qt.ItemDataRole.CheckStateRole and kind == "header":
+            return Qt.CheckState.Checked if self._preview.accepted[h] else Qt.CheckState.Unchecked
+        if role == Qt.ItemDataRole.BackgroundRole:
+            return {"header": _HEADER, "+": _ADDED, "-": _REMOVED}.get(kind)
+        return None
+
+    def flags(self, index: QModelIndex):
+        flags = Qt.ItemFlag.ItemIsEnabled
+        if index.isValid() and self._preview is not None and index.row() in self._starts:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index: QModelIndex, value, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        if role != Qt.ItemDataRole.CheckStateRole or index.row() not in self._starts:
+            return False
+        h = self._starts.index(index.row())
+        self._preview.accepted[h] = Qt.CheckState(value) == Qt.CheckState.Checked
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.CheckStateRole])
+        return True
+
+
+class DiffView(QWidget):
+    """
+    Shows the actions of a response as diffs before anything is written. Actions (list on the
+    left) and hunks (header rows on the right) can be unchecked; "Apply Selected" emits the actions
+    to run, with partly kept UPDATE/PATCH actions turned into PATCHes of the kept hunks.
+    """
+    decided = pyqtSignal(list)  # the actions to apply
+    discarded = pyqtSignal()
+    _compute_requested = pyqtSignal(int, list, object)
+
+    def __init__(self, fs_manager=None, parent=None):
+        super().__init__(parent)
+        # The project the previews are computed against, unless show_actions names another one.
+        self.fs_manager = fs_manager
+        self._previews: list[ActionPreview | None] = []
+        self._generation = 0
+
+        self._actions = QListWidget()
+        self._actions.currentRowChanged.connect(self._show_action)
+        self._lines_model = DiffLinesModel(self)
+        self._lines = QListView()
+        self._lines.setModel(self._lines_model)
+        self._lines.setUniformItemSizes(True)
+        self._lines.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        self._status = QLabel()
+
+        splitter = QSplitter(Qt.Orientation.Vertical)
+        splitter.addWidget(self._actions)
+        splitter.addWidget(self._lines)
+        splitter.setStretchFactor(1, 4)
+        self._apply_button = QPushButton("Apply Selected")
+        self._apply_button.clicked.connect(self._on_apply)
+        discard_button = QPushButton("Discard All")
+        discard_button.clicked.connect(self._on_discard)
+        buttons = QHBoxLayout()
+        buttons.addWidget(self._status, 1)
+        buttons.addWidget(self._apply_button)
+        buttons.addWidget(discard_button)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(splitter)
+        layout.addLayout(buttons)
+
+        self._thread = QThread()
+        self._worker = _DiffWorker()
+        self._worker.moveToThread(self._thread)
+        self._compute_requested.connect(self._worker.compute)
+        self._worker.ready.connect(self._on_ready)
+        self._thread.start()
+
+    def shutdown(self):
+        self._thread.quit()
+        self._thread.wait()
+
+    def show_actions(self, actions: list, fs_manager=None):
+        """Starts previewing a response (in `fs_manager`'s project); its diffs appear as the worker finishes them."""
+        self._generation += 1
+        self._previews = [None] * len(actions)
+        self._actions.clear()
+        for action in actions:
+            item = QListWidgetItem(f"{action['action_type']} {action['file_path']}  (computing diff...)")
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Checked)
+            self._actions.addItem(item)
+        self._lines_model.set_preview(None)
+        self._apply_button.setEnabled(False)
+        self._status.setText(f"Computing {len(actions)} diff(s)...")
+        self._compute_requested.emit(self._generation, actions, fs_manager or self.fs_manager)
+
+    def _on_ready(self, generation: int, i: int, preview: ActionPreview):
+        if generation != self._generation:
+            return
+        self._previews[i] = preview
+        item = self._actions.item(i)
+        item.setText(preview.summary())
+        if preview.error:
+            item.setCheckState(Qt.CheckState.Unchecked)
+            item.setToolTip(preview.error)
+        if self._actions.currentRow() in (-1, i):
+            self._actions.setCurrentRow(i)
+            self._show_action(i)
+        if all(p is not None for p in self._previews):
+            self._apply_button.setEnabled(True)
+            self._status.setText("Uncheck actions or hunks to leave them out.")
+
+    def _show_action(self, row: int):
+        preview = self._previews[row] if 0 <= row < len(self._previews) else None
+        self._lines_model.set_preview(preview)
+
+    def _on_apply(self):
+        actions = []
+        for i, preview in enumerate(self._previews):
+            if preview is None or self._actions.item(i).checkState() != Qt.CheckState.Checked:
+                continue
+            action = preview.selected_action()
+            if action is not None:
+                actions.append(action)
+        self._generation += 1
+        self.decided.emit(actions)
+
+    def _on_discard(self):
+        self._generation += 1
+        self.discarded.emit()
@@ -0,0 +1,338 @@
+# gui/widgets/file_tree.py
+import bisect
+import os
+from PyQt6.QtCore import QAbstractItemModel, QModelIndex, QObject, Qt, QThread, pyqtSignal, pyqtSlot
+from PyQt6.QtWidgets import QAbstractItemView, QTreeView
+from config import settings
+from core.tree_walker import walker_from_settings
+
+
+class _Node:
+    __slots__ = ("name", "parent", "is_dir", "row", "children", "pending", "by_name", "loading")
+
+    def __init__(self, name: str, parent: "_Node | None", is_dir: bool, row: int = 0):
+        self.name = name
+        self.parent = parent
+        self.is_dir = is_dir
+        self.row = row
+        self.children: list[_Node] | None = None  # None until the directory has been listed
+        self.pending: list[_Node] = []  # listed but not handed to the view yet (rows of huge directories)
+        self.by_name: dict[str, _Node] = {}
+        self.loading = False
+
+    def rel_path(self) -> str:
+        parts = []
+        node = self
+        while node.parent is not None:
+            parts.append(node.name)
+            node = node.parent
+        return "/".join(reversed(parts))
+
+
+# Not cached yet (None is a valid, empty .gitignore chain).
+_UNKNOWN = object()
+
+
+def _sort_key(node: _Node):
+    return (not node.is_dir, node.name.lower(), node.name)
+
+
+class _DirectoryScanner(QObject):
+    """Lists directories on a background thread, applying the same ignore rules as the project tree."""
+    listed = pyqtSignal(object, object)  # directory _Node, sorted list of child _Nodes (None if unreadable)
+
+    def __init__(self, base_path: str, ignored: set[str]):
+        super().__init__()
+        self.base_path = base_path
+        self.walker = walker_from_settings(base_path, ignored)
+        self._contexts = {}
+
+    def forget_ignore_rules(self):
+        self._contexts.clear()
+
+    def context_for(self, rel_dir: str):
+        """The .gitignore chain inside `rel_dir`, read from disk only the first time (or after a .gitignore changed)."""
+        ctx = self._contexts.get(rel_dir, _UNKNOWN)
+        if ctx is _UNKNOWN:
+            ctx = self._contexts[rel_dir] = self.walker.ignore_context_for(rel_dir)
+        return ctx
+
+    def is_hidden(self, rel_path: str, is_dir: bool, ctx) -> bool:
+        """Ignored entries and virtualenvs are hidden, as in the project tree sent to the model."""
+        return self.walker.is_ignored(rel_path, is_dir, ctx) or (is_dir and self.walker.is_virtualenv(rel_path))
+
+    @pyqtSlot(object)
+    def scan(self, node: _Node):
+        rel_dir = node.rel_path()
+        ctx = self.context_for(rel_dir)
+        entries = self.walker._list(os.path.join(self.base_path, rel_dir))
+        if entries is None:
+            self.listed.emit(node, None)
+            return
+        children = []
+        for name, is_dir in entries:
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            if not self.is_hidden(rel, is_dir, ctx):
+                children.append(_Node(name, node, is_dir))
+        children.sort(key=_sort_key)
+        self.listed.emit(node, children)
+
+
+class ProjectTreeModel(QAbstractItemModel):
+    """
+    The project as a Qt item model, loaded lazily.
+
+    A directory is listed only when the view expands it (canFetchMore/fetchMore), on a background
+    thread, so opening the project costs one directory listing whatever its size. Files written by
+    the FileSystemManager are inserted or removed in place (`on_file_changed` is safe to call from
+    any thread). Files can be checked to pin them as context for the next requests.
+    """
+    pinned_changed = pyqtSignal()
+    _scan_requested = pyqtSignal(object)
+    _file_changed = pyqtSignal(str, str)
+
+    def __init__(self, base_path: str, ignored: set[str] | None = None, parent=None):
+        super().__init__(parent)
+        self.base_path = os.path.abspath(base_path)
+        self._root = _Node(os.path.basename(self.base_path), None, True)
+        self._pinned: set[str] = set()
+
+        self._thread = QThread()
+        self._scanner = _DirectoryScanner(self.base_path, settings.IGNORED_PATH if ignored is None else ignored)
+        self._scanner.moveToThread(self._thread)
+        self._scan_requested.connect(self._scanner.scan)
+        self._scanner.listed.connect(self._on_listed)
+        self._file_changed.connect(self._apply_file_change)
+        self._thread.start()
+
+    def shutdown(self):
+        self._thread.quit()
+        self._thread.wait()
+
+    # --- Qt model interface ---
+
+    def _node(self, index: QModelIndex) -> _Node:
+        return index.internalPointer() if index.isValid() else self._root
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        node = self._node(parent)
+        if column != 0 or node.children is None or not 0 <= row < len(node.children):
+            return QModelIndex()
+        return self.createIndex(row, 0, node.children[row])
+
+    def parent(self, index: QModelIndex) -> QModelIndex:
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self._root:
+            return QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        node = self._node(parent)
+        return len(node.children) if node.children is not None else 0
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 1
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        node = self._node(parent)
+        if not node.is_dir:
+            return False
+        return node.children is None or bool(node.children) or bool(node.pending)
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        node = self._node(parent)
+        return node.is_dir and ((node.children is None and not node.loading) or bool(node.pending))
+
+    def fetchMore(self, parent: QModelIndex):
+        node = self._node(parent)
+        if node.pending:
+            self._show_next_rows(node)
+        elif node.is_dir and node.children is None and not node.loading:
+            node.loading = True
+            self._scan_requested.emit(node)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return node.name + ("/" if node.is_dir else "")
+        if role == Qt.ItemDataRole.CheckStateRole and not node.is_dir:
+            pinned = node.rel_path() in self._pinned
+            return Qt.CheckState.Checked if pinned else Qt.CheckState.Unchecked
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return node.rel_path()
+        return None
+
+    def setData(self, index: QModelIndex, value, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        if not index.isValid() or role != Qt.ItemDataRole.CheckStateRole:
+            return False
+        node = index.internalPointer()
+        if node.is_dir:
+            return False
+        self.set_pinned(node.rel_path(), Qt.CheckState(value) == Qt.CheckState.Checked)
+        return True
+
+    def flags(self, index: QModelIndex):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if not index.internalPointer().is_dir:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    # --- Loading ---
+
+    def load_root(self):
+        self.fetchMore(QModelIndex())
+
+    def _index_of(self, node: _Node) -> QModelIndex:
+        return QModelIndex() if node is self._root else self.createIndex(node.row, 0, node)
+
+    def _attached(self, node: _Node) -> bool:
+        while node.parent is not None:
+            if node.parent.by_name.get(node.name) is not node:
+                return False
+            node = node.parent
+        return node is self._root
+
+    def _on_listed(self, node: _Node, children):
+        node.loading = False
+        if node.children is not None or not self._attached(node):
+            return  # listed twice, or removed while it was being listed
+        children = children or []
+        node.children = []
+        node.pending = children
+        node.by_name = {child.name: child for child in children}
+        for child in children:
+            child.row = -1
+        if children:
+            self._show_next_rows(node)
+        elif node is not self._root:
+            # No rows to insert, but the expand arrow must go away.
+            self.layoutAboutToBeChanged.emit()
+            self.layoutChanged.emit()
+
+    def _show_next_rows(self, node: _Node):
+        """Hands the view the next FILE_TREE_BATCH rows; it asks for more as the user scrolls down."""
+        batch = node.pending[:settings.FILE_TREE_BATCH]
+        del node.pending[:len(batch)]
+        first = len(node.children)
+        self.beginInsertRows(self._index_of(node), first, first + len(batch) - 1)
+        for row, child in enumerate(batch, start=first):
+            child.row = row
+        node.children.extend(batch)
+        self.endInsertRows()
+
+    # --- Live updates ---
+
+    def on_file_changed(self, rel_path: str, action_type: str):
+        """FileSystemManager change listener; may be called from any thread."""
+        self._file_changed.emit(rel_path.replace("\\", "/"), action_type)
+
+    def _loaded_dir(self, parts: list[str]) -> _Node | None:
+        node = self._root
+        for part in parts:
+            if node.children is None:
+                return None
+            node = node.by_name.get(part)
+            if node is None or not node.is_dir:
+                return None
+        return node if node.children is not None else None
+
+    def _apply_file_change(self, rel_path: str, action_type: str):
+        parts = [p for p in rel_path.split("/") if p]
+        if not parts:
+            return
+        if parts[-1] == ".gitignore":
+            self._scanner.forget_ignore_rules()
+        if action_type == "DELETE":
+            parent = self._loaded_dir(parts[:-1])
+            if parent is not None and parts[-1] in parent.by_name:
+                self._remove_child(parent, parent.by_name[parts[-1]])
+            return
+        # A new file may also bring new directories with it; only directories already listed are touched.
+        node = self._root
+        for depth, part in enumerate(parts):
+            if node.children is None:
+                return
+            child = node.by_name.get(part)
+            if child is None:
+                is_dir = depth < len(parts) - 1
+                rel = "/".join(parts[:depth + 1])
+                # The parent has been listed, so its ignore rules are cached by the scanner.
+                if self._scanner.is_hidden(rel, is_dir, self._scanner.context_for("/".join(parts[:depth]))):
+                    return
+                child = self._insert_child(node, _Node(part, node, is_dir))
+            node = child
+
+    def _insert_child(self, parent: _Node, child: _Node) -> _Node:
+        key = _sort_key(child)
+        if parent.pending and (not parent.children or key > _sort_key(parent.children[-1])):
+            # Sorts among the rows the view hasn't asked for yet.
+            child.row = -1
+            parent.pending.insert(bisect.bisect_left(parent.pending, key, key=_sort_key), child)
+            parent.by_name[child.name] = child
+            return child
+        row = bisect.bisect_left(parent.children, key, key=_sort_key)
+        self.beginInsertRows(self._index_of(parent), row, row)
+        parent.children.insert(row, child)
+        parent.by_name[child.name] = child
+        for i in range(row, len(parent.children)):
+            parent.children[i].row = i
+        self.endInsertRows()
+        return child
+
+    def _remove_child(self, parent: _Node, child: _Node):
+        del parent.by_name[child.name]
+        if child.row == -1:
+            parent.pending.remove(child)
+        else:
+            row = child.row
+            self.beginRemoveRows(self._index_of(parent), row, row)
+            del parent.children[row]
+            for i in range(row, len(parent.children)):
+                parent.children[i].row = i
+            self.endRemoveRows()
+        prefix = child.rel_path()
+        self._set_pins({p for p in self._pinned if p != prefix and not p.startswith(prefix + "/")})
+
+    # --- Pinned files ---
+
+    def pinned_files(self) -> list[str]:
+        return sorted(self._pinned)
+
+    def set_pinned(self, rel_path: str, pinned: bool):
+        pins = set(self._pinned)
+        (pins.add if pinned else pins.discard)(rel_path)
+        self._set_pins(pins)
+        node = self._root
+        for part in rel_path.split("/"):
+            node = node.by_name.get(part) if node.children is not None else None
+            if node is None:
+                return
+        if node.row == -1:
+            return  # not shown yet
+        index = self._index_of(node)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.CheckStateRole])
+
+    def _set_pins(self, pins: set[str]):
+        if pins != self._pinned:
+            self._pinned = pins
+            self.pinned_changed.emit()
+
+
+class FileTreeView(QTreeView):
+    """The project browser: a QTreeView over a ProjectTreeModel, tuned for very large trees."""
+
+    def __init__(self, base_path: str, ignored: set[str] | None = None, parent=None):
+        super().__init__(parent)
+        self.tree_model = ProjectTreeModel(base_path, ignored, self)
+        self.setModel(self.tree_model)
+        self.setHeaderHidden(True)
+        # All rows have the same height, so the view never has to measure rows it doesn't show.
+        self.setUniformRowHeights(True)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.tree_model.load_root()
@@ -1,11 +1,20 @@
 from typing import TypedDict, Literal, List
 
 class CodeAction(TypedDict):
-    action_type: Literal["CREATE", "UPDATE", "DELETE"]
+    action_type: Literal["CREATE", "UPDATE", "PATCH", "DELETE"]
     file_path: str
-    code: str  # For CREATE/UPDATE, empty for DELETE
+    code: str  # Full content for CREATE/UPDATE, SEARCH/REPLACE blocks (or a unified diff) for PATCH, empty for DELETE
     explanation: str # The model's reasoning for this specific action
 
 class GeminiResponse(TypedDict):
     overall_explanation: str # A high-level summary of the plan
-    actions: List[CodeAction]
\ No newline at end of file
+    actions: List[CodeAction]
+
+class FilePlan(TypedDict):
+    file_path: str
+    action_type: Literal["CREATE", "UPDATE", "PATCH", "DELETE"]
+    instructions: str  # What to do in this file, self-contained: its editor only sees this and the request
+
+class Plan(TypedDict):
+    overall_explanation: str # A high-level summary of the plan
+    files: List[FilePlan]
@@ -0,0 +1,25 @@
+# tests/test_patching.py
+import pytest
+from core.patching import PatchConflict, apply_patch
+
+
+def _patch(search: str, replace: str) -> str:
+    return f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE"
+
+
+def test_search_does_not_match_inside_a_line():
+    content = "max = 1\ny = 3\n"
+    with pytest.raises(PatchConflict):
+        apply_patch(content, _patch("x = 1", "x = 2"))
+
+
+def test_only_whole_line_matches_count_as_ambiguous():
+    content = "max = 1\nx = 1\n"
+    assert apply_patch(content, _patch("x = 1", "x = 2")) == "max = 1\nx = 2\n"
+
+
+def test_several_whole_line_matches_conflict():
+    content = "x = 1\ny = 2\nx = 1\n"
+    with pytest.raises(PatchConflict):
+        apply_patch(content, _patch("x = 1", "x = 2"))
+
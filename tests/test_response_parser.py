@@ -0,0 +1,77 @@
+# tests/test_response_parser.py
+import json
+import pytest
+from ai_client.response_parser import IncrementalResponseParser, parse_gemini_response
+
+
+def _action(path: str, code: str, action_type: str = "UPDATE") -> dict:
+    return {"action_type": action_type, "file_path": path, "code": code, "explanation": "why"}
+
+
+def _response(*actions, explanation: str = "done") -> str:
+    return json.dumps({"overall_explanation": explanation, "actions": list(actions)})
+
+
+def _feed_in(text: str, size: int) -> tuple[IncrementalResponseParser, list]:
+    parser = IncrementalResponseParser()
+    streamed = []
+    for start in range(0, len(text), size):
+        streamed += parser.feed(text[start:start + size])
+    return parser, streamed
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_strings_and_escapes_split_across_chunks(size):
+    code = 'print("a\\\\b")\n\ttab é \U0001f600 \\u0041 end'
+    text = _response(_action("a.py", code), _action("b.py", "x = 1"))
+    parser, streamed = _feed_in(text, size)
+    response = parser.close()
+    assert parser.is_complete()
+    assert [a["code"] for a in streamed] == [code, "x = 1"]
+    assert response == json.loads(text)
+
+
+def test_markdown_fence_falls_back_to_the_incremental_parser():
+    text = _response(_action("a.py", "x = 1"))
+    assert parse_gemini_response(f"Here it is:\n```json\n{text}\n```") == json.loads(text)
+
+
+def test_truncated_response_keeps_complete_actions():
+    text = _response(_action("a.py", "x = 1"), _action("b.py", "y = 2"))
+    cut = text[:text.index("y = 2")]
+    parser, streamed = _feed_in(cut, 5)
+    response = parser.close()
+    assert parser.truncated and not parser.is_complete()
+    assert [a["file_path"] for a in response["actions"]] == ["a.py"]
+    assert [a["file_path"] for a in parse_gemini_response(cut)["actions"]] == ["a.py"]
+
+
+def test_nothing_recoverable_is_none():
+    assert parse_gemini_response('{"overall_explanation": "do') is None
+    assert parse_gemini_response("no json here") is None
+
+
+@pytest.mark.parametrize("data", [
+    {"overall_explanation": 5, "actions": []},
+    {"overall_explanation": "ok", "actions": 5},
+    {"overall_explanation": "ok", "actions": {"file_path": "a.py"}},
+    {"actions": []},
+    ["not", "an", "object"],
+])
+def test_invalid_top_level_fields_are_errors(data, capsys):
+    text = json.dumps(data)
+    assert parse_gemini_response(text) is None
+    assert "Error:" in capsys.readouterr().out
+    # The same response arriving as a stream, or wrapped in text, is rejected too.
+    parser, _ = _feed_in(text, 4)
+    assert parser.close() is None and not parser.is_complete()
+    assert parse_gemini_response(f"Answer: {text}") is None
+
+
+def test_invalid_actions_are_skipped_with_a_warning(capsys):
+    text = _response(_action("a.py", "x", action_type="RENAME"), _action("b.py", 3),
+                     {"file_path": "c.py"}, "d.py", _action("e.py", "ok"))
+    for response in (parse_gemini_response(text), _feed_in(text, 3)[0].close()):
+        assert [a["file_path"] for a in response["actions"]] == ["e.py"]
+    out = capsys.readouterr().out
+    assert "Unknown action type 'RENAME'" in out and "must be a string" in out and "missing required keys" in out
@@ -0,0 +1,137 @@
+# tests/test_transaction.py
+import os
+import pytest
+from core import transaction
+from core.transaction import ApplyTransaction
+
+
+class _Crash(BaseException):
+    """Stands in for the process dying: nothing after it runs, not even the journal cleanup."""
+
+
+def _action(action_type: str, path: str, code: str = "") -> dict:
+    return {"action_type": action_type, "file_path": path, "code": code, "explanation": ""}
+
+
+def _entries(base, *actions) -> list:
+    return [(a["file_path"], os.path.join(base, a["file_path"]), a) for a in actions]
+
+
+def _read(base, path: str) -> str | None:
+    full = os.path.join(base, path)
+    if not os.path.exists(full):
+        return None
+    with open(full, encoding="utf-8") as f:
+        return f.read()
+
+
+def _leftovers(base) -> list[str]:
+    """Temp files and journals left in the project."""
+    found = []
+    for directory, _, files in os.walk(base):
+        found += [os.path.join(directory, name) for name in files if name.endswith(".tmp")]
+    journal = os.path.join(base, ".code_assistant", "journal")
+    if os.path.isdir(journal):
+        found += os.listdir(journal)
+    return found
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "a.py").write_text("a = 1\n")
+    (tmp_path / "b.py").write_text("b = 1\n")
+    return str(tmp_path)
+
+
+def _batch(base):
+    return _entries(base, _action("UPDATE", "a.py", "a = 2\n"), _action("UPDATE", "b.py", "b = 2\n"),
+                    _action("CREATE", "new/pkg/c.py", "c = 2\n"))
+
+
+def _fail_on(monkeypatch, fail, exception=OSError):
+    """Makes os.replace (as used by the transaction) raise for the calls `fail(src, dst)` picks."""
+    real = os.replace
+
+    def replace(src, dst):
+        if fail(src, dst):
+            raise exception(f"cannot replace {dst}")
+        return real(src, dst)
+    monkeypatch.setattr(transaction.os, "replace", replace)
+
+
+def test_failing_replace_during_commit_rolls_back(project, monkeypatch):
+    _fail_on(monkeypatch, lambda src, dst: dst.endswith("b.py") and src.endswith(".tmp"))
+    result = ApplyTransaction(project, fsync=False).apply(_batch(project))
+    assert not result.ok and "rolled back" in result.error
+    assert (_read(project, "a.py"), _read(project, "b.py")) == ("a = 1\n", "b = 1\n")
+    assert not os.path.exists(os.path.join(project, "new"))
+    assert _leftovers(project) == []
+
+
+def test_failing_replace_during_rollback_is_reported(project, monkeypatch):
+    # b.py can't be committed, and a.py's backup can't be put back either.
+    _fail_on(monkeypatch, lambda src, dst: dst.endswith("b.py") or src.endswith(".bak"))
+    result = ApplyTransaction(project, fsync=False).apply(_batch(project))
+    assert not result.ok and "could not roll back: a.py" in result.error
+    assert _read(project, "b.py") == "b = 1\n"
+
+
+def _crash_after(monkeypatch, replaced: int):
+    """The process dies after `replaced` targets were swapped in; the journal stays behind."""
+    calls = []
+
+    def fail(src, dst):
+        if src.endswith(".tmp") and not dst.endswith(".json"):
+            calls.append(dst)
+            return len(calls) > replaced
+        return False
+    _fail_on(monkeypatch, fail, _Crash)
+    monkeypatch.setattr(ApplyTransaction, "_discard", lambda self, txid: None)
+
+
+@pytest.mark.parametrize("mode, expected", [("rollback", ("a = 1\n", "b = 1\n", None)),
+                                            ("replay", ("a = 2\n", "b = 2\n", "c = 2\n"))])
+def test_crash_in_prepared_state_is_recovered(project, monkeypatch, mode, expected):
+    _crash_after(monkeypatch, replaced=1)
+    with pytest.raises(_Crash):
+        ApplyTransaction(project, fsync=False).apply(_batch(project))
+    assert _read(project, "a.py") == "a = 2\n"
+    monkeypatch.undo()
+
+    assert ApplyTransaction(project, fsync=False).recover(mode) == 1
+    assert (_read(project, "a.py"), _read(project, "b.py"), _read(project, "new/pkg/c.py")) == expected
+    assert os.path.exists(os.path.join(project, "new")) == (mode == "replay")
+    assert _leftovers(project) == []
+
+
+def test_recovery_keeps_the_journal_until_it_succeeds(project, monkeypatch, capsys):
+    _crash_after(monkeypatch, replaced=2)
+    with pytest.raises(_Crash):
+        ApplyTransaction(project, fsync=False).apply(_batch(project))
+    monkeypatch.undo()
+
+    _fail_on(monkeypatch, lambda src, dst: dst.endswith("b.py"))
+    ApplyTransaction(project, fsync=False).recover("rollback")
+    assert "journal is kept" in capsys.readouterr().out
+    assert _read(project, "b.py") == "b = 2\n"
+    monkeypatch.undo()
+
+    ApplyTransaction(project, fsync=False).recover("rollback")
+    assert (_read(project, "a.py"), _read(project, "b.py")) == ("a = 1\n", "b = 1\n")
+    assert _leftovers(project) == []
+
+
+def test_crash_while_staging_removes_created_directories(project, monkeypatch):
+    def crash(*args, **kwargs):
+        raise _Crash()
+    monkeypatch.setattr(transaction, "_fsync_path", crash)
+    monkeypatch.setattr(ApplyTransaction, "_discard", lambda self, txid: None)
+    with pytest.raises(_Crash):
+        ApplyTransaction(project, fsync=True).apply(_batch(project))
+    assert os.path.isdir(os.path.join(project, "new", "pkg"))
+    monkeypatch.undo()
+
+    assert ApplyTransaction(project, fsync=False).recover() == 0
+    assert (_read(project, "a.py"), _read(project, "b.py")) == ("a = 1\n", "b = 1\n")
+    assert not os.path.exists(os.path.join(project, "new"))
+    assert _leftovers(project) == []